@@ -1,6 +1,6 @@
 from django.contrib.auth.models import AnonymousUser
-from users.models import UserBusiness 
-from qualifications.models import MessageRecipient 
+from AssessEEZ.middleware import UserBusinessMiddleware
+from qualifications.messaging import unread_message_count
 
 
 def user_context(request):
@@ -12,17 +12,12 @@ def user_context(request):
     
     if request.user.is_authenticated and not isinstance(request.user, AnonymousUser):
         context['full_name'] = request.user.full_name or request.user.email
-        business_id = request.session.get('business_id')
-        if business_id:
-            try:
-                user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-                context['business'] = user_business.business
-                context['unread_count'] = MessageRecipient.objects.filter(
-                    recipient=user_business,
-                    is_read=False,
-                    message__recipients__recipient__business__business_id=business_id
-                ).count()
-            except UserBusiness.DoesNotExist:
-                pass
+        if hasattr(request, 'user_business'):
+            user_business = request.user_business
+        else:
+            user_business = UserBusinessMiddleware.resolve_user_business(request)
+        if user_business:
+            context['business'] = user_business.business
+            context['unread_count'] = unread_message_count(user_business)
     
-    return context
\ No newline at end of file
+    return context
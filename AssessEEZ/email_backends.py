@@ -1,12 +1,60 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.mail import get_connection
 from django.core.mail.backends.base import BaseEmailBackend
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from decouple import config
 import logging
-import email
+import threading
 
 logger = logging.getLogger(__name__)
 
+# Outcome of one message in a batch: message_id is set on success, error on failure
+SendResult = namedtuple('SendResult', ['message', 'message_id', 'error'])
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def send_concurrency():
+    return getattr(settings, 'SES_SEND_CONCURRENCY', 8)
+
+
+def get_ses_client():
+    """
+    Return the process-wide SES client, creating it on first use.
+
+    boto3 clients are thread-safe and keep their own HTTPS connection pool, so every backend
+    instance and worker thread shares this one rather than paying for a new client (credential
+    lookup, endpoint resolution, TLS handshake) per email.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = boto3.client(
+                    'ses',
+                    region_name=config('AWS_SES_REGION', default='eu-west-2'),
+                    aws_access_key_id=config('AWS_SES_ACCESS_KEY_ID'),
+                    aws_secret_access_key=config('AWS_SES_SECRET_ACCESS_KEY'),
+                    config=Config(max_pool_connections=max(send_concurrency(), 10)),
+                )
+                logger.debug("SES client created.")
+    return _client
+
+
+def reset_ses_client():
+    """
+    Drop the shared client so the next send builds a new one (after credential rotation, in tests).
+    """
+    global _client
+    with _client_lock:
+        _client = None
+
+
 class SESEmailBackend(BaseEmailBackend):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -14,64 +62,96 @@ class SESEmailBackend(BaseEmailBackend):
         self.client = None
 
     def open(self):
-        logger.debug("Opening SES client connection...")
         if self.client is None:
             try:
-                self.client = boto3.client(
-                    'ses',
-                    region_name=config('AWS_SES_REGION', default='eu-west-2'),
-                    aws_access_key_id=config('AWS_SES_ACCESS_KEY_ID'),
-                    aws_secret_access_key=config('AWS_SES_SECRET_ACCESS_KEY')
-                )
-                logger.debug("SES client opened.")
-                return True
+                self.client = get_ses_client()
             except Exception as e:
                 logger.error("Failed to open SES client: %s", str(e))
                 return False
         return True
 
     def close(self):
-        logger.debug("Closing SES client connection...")
+        # The shared client outlives the backend; only release our reference to it
         self.client = None
-        logger.debug("SES client closed.")
+
+    def _send_one(self, message):
+        """
+        Send one EmailMessage as raw MIME and return the SES message id.
+        """
+        logger.debug("Sending email: subject=%s, to=%s", message.subject, message.to)
+        response = self.client.send_raw_email(
+            Source=message.from_email,
+            Destinations=message.recipients(),
+            RawMessage={'Data': message.message().as_string()}
+        )
+        logger.debug("Email sent, Message ID: %s", response['MessageId'])
+        return response['MessageId']
+
+    def _try_send(self, message):
+        try:
+            return SendResult(message, self._send_one(message), None)
+        except ClientError as e:
+            logger.error("SES API error: %s", e.response['Error']['Message'])
+            return SendResult(message, None, e)
+        except Exception as e:
+            logger.error("Unexpected error: %s", str(e))
+            return SendResult(message, None, e)
 
     def send_messages(self, email_messages):
-        logger.debug("Processing %d email messages...", len(email_messages))
         if not self.open():
             logger.error("Cannot send messages: SES client not initialized.")
             raise ValueError("SES client not initialized.")
 
         sent_count = 0
         for message in email_messages:
-            try:
-                logger.debug("Preprocessing email: subject=%s, to=%s", message.subject, message.to)
-                # Convert EmailMessage to raw MIME for SES raw sending
-                raw_message = message.message().as_string()
-                destinations = {'ToAddresses': message.to}
-                if getattr(message, 'cc', None):
-                    destinations['CcAddresses'] = message.cc
-                    logger.debug("CC: %s", message.cc)
-                if getattr(message, 'bcc', None):
-                    destinations['BccAddresses'] = message.bcc
-                    logger.debug("BCC: %s", message.bcc)
-
-                logger.debug("Sending SES API raw request...")
-                response = self.client.send_raw_email(
-                    Source=message.from_email,
-                    Destinations=message.to + (message.cc or []) + (message.bcc or []),
-                    RawMessage={'Data': raw_message}
-                )
-                logger.debug("Email sent, Message ID: %s", response['MessageId'])
-                sent_count += 1
-            except ClientError as e:
-                logger.error("SES API error: %s", e.response['Error']['Message'])
-                print(f"Error sending email: {e.response['Error']['Message']}")
-                if not self.fail_silently:
-                    raise e
-            except Exception as e:
-                logger.error("Unexpected error: %s", str(e))
-                print(f"Unexpected error: {str(e)}")
+            result = self._try_send(message)
+            if result.error is not None:
                 if not self.fail_silently:
-                    raise e
+                    raise result.error
+                continue
+            sent_count += 1
         logger.debug("Sent %d emails successfully.", sent_count)
         return sent_count
+
+    def send_batch(self, email_messages, max_workers=None):
+        """
+        Send many messages over this backend's shared client, at most `max_workers`
+        (SES_SEND_CONCURRENCY by default) at a time. Never raises for a single failed message;
+        returns one SendResult per message, in input order.
+        """
+        email_messages = list(email_messages)
+        if not email_messages:
+            return []
+        if not self.open():
+            raise ValueError("SES client not initialized.")
+        max_workers = min(max_workers or send_concurrency(), len(email_messages))
+        if max_workers == 1:
+            results = [self._try_send(message) for message in email_messages]
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ses-send') as pool:
+                results = list(pool.map(self._try_send, email_messages))
+        failed = sum(1 for result in results if result.error is not None)
+        logger.info("SES batch: %d sent, %d failed", len(results) - failed, failed)
+        return results
+
+
+def send_batch(email_messages, connection=None, max_workers=None):
+    """
+    Send many EmailMessages over one backend instance and return a SendResult per message.
+
+    Backends without a batch API of their own (console, locmem in tests) send the messages one
+    by one over a single open connection.
+    """
+    connection = connection or get_connection()
+    if hasattr(connection, 'send_batch'):
+        return connection.send_batch(email_messages, max_workers=max_workers)
+    results = []
+    with connection:
+        for message in email_messages:
+            try:
+                connection.send_messages([message])
+                results.append(SendResult(message, None, None))
+            except Exception as e:
+                logger.error("Email to %s failed: %s", message.to, str(e))
+                results.append(SendResult(message, None, e))
+    return results
@@ -0,0 +1,202 @@
+import logging
+import uuid
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from AssessEEZ import email_utils
+from AssessEEZ.email_backends import send_batch
+from qualifications.models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+# Seconds a claimed row stays locked before another worker may take it over
+LEASE_SECONDS = 300
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if set(value) == {'__datetime__'}:
+            return datetime.fromisoformat(value['__datetime__'])
+        return {key: _decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    return value
+
+
+def _check_helper(func):
+    if getattr(email_utils, func.__name__, None) is not func:
+        raise ValueError(f"{func.__name__} is not an email_utils helper")
+
+
+def _deliver_on_commit(rows):
+    if getattr(settings, 'EMAIL_QUEUE_EAGER', False):
+        now = timezone.now()
+        due = [outbox for outbox in rows if outbox.next_attempt_at <= now]
+        transaction.on_commit(lambda: [deliver(outbox) for outbox in due])
+
+
+def enqueue_email(func, *args, **kwargs):
+    """
+    Record a call to one of the send_* helpers in AssessEEZ.email_utils in the outbox.
+
+    The row is written on the current connection, so it commits or rolls back with the caller's
+    transaction; `manage.py send_queued_emails` sends it later. With EMAIL_QUEUE_EAGER = True the
+    row is delivered as soon as the transaction commits (handy in tests and local development).
+    """
+    return enqueue_email_at(None, func, *args, **kwargs)
+
+
+def enqueue_email_at(deliver_at, func, *args, **kwargs):
+    """
+    Like enqueue_email, but the worker leaves the row alone until `deliver_at` (now if None).
+    """
+    _check_helper(func)
+    outbox = OutboxEmail.objects.create(
+        kind=func.__name__,
+        payload={'args': _encode(list(args)), 'kwargs': _encode(kwargs)},
+        next_attempt_at=deliver_at or timezone.now(),
+    )
+    _deliver_on_commit([outbox])
+    return outbox
+
+
+def is_scheduled(func, **kwargs):
+    """
+    True if a call to `func` with these keyword arguments is still waiting in the outbox.
+    """
+    lookups = {f'payload__kwargs__{key}': _encode(value) for key, value in kwargs.items()}
+    return OutboxEmail.objects.filter(kind=func.__name__, status='PENDING', **lookups).exists()
+
+
+def enqueue_email_batch(func, calls):
+    """
+    Like enqueue_email for many calls of the same helper, written with a single insert.
+    `calls` is an iterable of keyword-argument dicts.
+    """
+    _check_helper(func)
+    rows = OutboxEmail.objects.bulk_create([
+        OutboxEmail(kind=func.__name__, payload={'args': [], 'kwargs': _encode(kwargs)})
+        for kwargs in calls
+    ])
+    _deliver_on_commit(rows)
+    return rows
+
+
+def backoff(attempts):
+    """
+    Delay before retry number `attempts`: EMAIL_QUEUE_RETRY_BASE seconds doubling each time,
+    capped at an hour.
+    """
+    base = getattr(settings, 'EMAIL_QUEUE_RETRY_BASE', 30)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 3600))
+
+
+def claim_batch(batch_size):
+    """
+    Lock up to `batch_size` due rows for this worker and return them.
+
+    Rows are leased rather than held under a row lock while sending, so a crashed worker's rows
+    become due again once the lease runs out. On databases with SKIP LOCKED, concurrent workers
+    never claim the same row.
+    """
+    now = timezone.now()
+    due = Q(status='PENDING', next_attempt_at__lte=now) | Q(status='SENDING', locked_until__lt=now)
+    with transaction.atomic():
+        queryset = OutboxEmail.objects.filter(due).order_by('next_attempt_at')
+        ids = list(queryset.select_for_update(skip_locked=True).values_list('id', flat=True)[:batch_size])
+        OutboxEmail.objects.filter(id__in=ids).update(
+            status='SENDING', locked_until=now + timedelta(seconds=LEASE_SECONDS)
+        )
+    return list(OutboxEmail.objects.filter(id__in=ids).order_by('next_attempt_at'))
+
+
+def _build(outbox):
+    """
+    Build the EmailMessage for one outbox row. Returns (message, error); message is None when
+    the helper has nothing left to send (a digest an earlier one already covered).
+    """
+    try:
+        build = email_utils.BUILDERS[outbox.kind]
+        args = _decode(outbox.payload.get('args', []))
+        kwargs = _decode(outbox.payload.get('kwargs', {}))
+        kwargs.pop('fail_silently', None)
+        return build(*args, **kwargs), None
+    except Exception as e:
+        return None, str(e) or e.__class__.__name__
+
+
+def _record(outbox, error):
+    now = timezone.now()
+    if error is None:
+        # The payload can hold one-off secrets (welcome passwords); drop it once delivered
+        OutboxEmail.objects.filter(id=outbox.id).update(
+            status='SENT', sent_at=now, locked_until=None, attempts=outbox.attempts + 1, payload={}, last_error=''
+        )
+        return True
+    attempts = outbox.attempts + 1
+    max_attempts = getattr(settings, 'EMAIL_QUEUE_MAX_ATTEMPTS', 5)
+    if attempts >= max_attempts:
+        logger.error(f"Giving up on outbox email {outbox.id} ({outbox.kind}) after {attempts} attempts: {error}")
+        # A row that will never be sent has no use for its payload either
+        OutboxEmail.objects.filter(id=outbox.id).update(
+            status='FAILED', attempts=attempts, next_attempt_at=now, locked_until=None, payload={}, last_error=error
+        )
+        return False
+    logger.warning(f"Outbox email {outbox.id} ({outbox.kind}) failed, retry {attempts}: {error}")
+    OutboxEmail.objects.filter(id=outbox.id).update(
+        status='PENDING', attempts=attempts, next_attempt_at=now + backoff(attempts), locked_until=None, last_error=error
+    )
+    return False
+
+
+def deliver_batch(rows, max_workers=None):
+    """
+    Build the messages for claimed outbox rows and send them in one email_backends.send_batch
+    call, at most `max_workers` at a time. Returns one success flag per row.
+    """
+    built = [_build(outbox) for outbox in rows]
+    messages = [message for message, error in built if message is not None]
+    results = iter(send_batch(messages, max_workers=max_workers) if messages else ())
+    delivered = []
+    for outbox, (message, error) in zip(rows, built):
+        if message is not None:
+            result = next(results)
+            error = None if result.error is None else (str(result.error) or result.error.__class__.__name__)
+            if error is None:
+                try:
+                    email_utils.after_send(message)
+                except Exception as e:
+                    logger.error(f"Outbox email {outbox.id} ({outbox.kind}) was sent but not recorded: {str(e)}")
+        delivered.append(_record(outbox, error))
+    return delivered
+
+
+def deliver(outbox):
+    return deliver_batch([outbox])[0]
+
+
+def drain(batch_size=50, concurrency=1):
+    """
+    Claim one batch and send it, at most `concurrency` emails at a time.
+    Returns (sent, failed) counts for the batch.
+    """
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0, 0
+    results = deliver_batch(batch, max_workers=concurrency)
+    sent = sum(results)
+    return sent, len(results) - sent
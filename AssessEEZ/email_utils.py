@@ -1,16 +1,95 @@
+import copy
+import functools
 import logging
 from django.core.mail import get_connection
 from django.core.mail.message import EmailMessage
 from django.conf import settings
-from django.utils.html import strip_tags
+from django.contrib.auth.tokens import default_token_generator
 from django.urls import reverse
-from django.template.loader import render_to_string
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from django.template.loader import get_template
 from email.mime.image import MIMEImage
 import os
 from users.models import UserBusiness, CustomUser
 
 logger = logging.getLogger(__name__)
 
+LOGO_FILENAME = 'assesseez_logo.png'
+
+# kind -> (template, subject); subjects are formatted with the compose() context
+EMAIL_KINDS = {
+    'welcome': ('welcome_email.html', 'Welcome to AssessEEZ'),
+    'role_notification': ('role_notification_email.html', 'AssessEEZ: {action} Notification'),
+    'non_conformance': ('non_conformance_email.html', 'AssessEEZ: Non-Conformance Notification'),
+    'message_notification': ('message_notification_email.html', 'New Message Received on AssessEEZ'),
+    'document_submission': ('document_submission_notification_email.html', 'AssessEEZ: New {submission_type} Submission Notification'),
+    'notification': ('notification_email.html', 'AssessEEZ: New Notification'),
+    'notification_digest': ('notification_digest_email.html', 'AssessEEZ: New Notifications'),
+    'password_reset': ('password_reset_email.html', 'Password Reset Request'),
+}
+
+
+def find_logo_path():
+    """
+    Return the path of the inline email logo, preferring STATICFILES_DIRS, or None if it is missing.
+    """
+    for static_dir in getattr(settings, 'STATICFILES_DIRS', None) or []:
+        possible_path = os.path.join(static_dir, 'images', LOGO_FILENAME)
+        if os.path.exists(possible_path):
+            return possible_path
+    base_path = settings.STATIC_ROOT if settings.STATIC_ROOT and not settings.DEBUG else settings.BASE_DIR
+    logo_path = os.path.join(base_path, 'static', 'images', LOGO_FILENAME)
+    return logo_path if os.path.exists(logo_path) else None
+
+
+@functools.lru_cache(maxsize=None)
+def _logo_part():
+    """
+    Read and base64-encode the logo once per process. Returns None if it cannot be loaded.
+    """
+    logo_path = find_logo_path()
+    if logo_path is None:
+        logger.warning("Email logo not found; emails are sent without it")
+        return None
+    try:
+        with open(logo_path, 'rb') as f:
+            logo = MIMEImage(f.read())
+    except Exception as e:
+        logger.error(f"Failed to load logo at {logo_path}: {str(e)}")
+        return None
+    logo.add_header('Content-ID', '<assesseez_logo>')
+    logo.add_header('Content-Disposition', 'inline', filename=LOGO_FILENAME)
+    logger.debug(f"Email logo loaded from {logo_path}")
+    return logo
+
+
+@functools.lru_cache(maxsize=None)
+def _template(name):
+    return get_template(name)
+
+
+def compose(kind, context, to, from_email=None):
+    """
+    Build the HTML EmailMessage for one of EMAIL_KINDS, addressed to the `to` list.
+
+    Templates are compiled once and the inline logo is read and encoded once per process; every
+    message gets its own copy of the encoded logo part, so composing is pure rendering.
+    """
+    template_name, subject = EMAIL_KINDS[kind]
+    logo = _logo_part()
+    html_message = _template(template_name).render({**context, 'logo_available': logo is not None})
+    email_message = EmailMessage(
+        subject=subject.format(**context),
+        body=html_message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=to,
+    )
+    email_message.content_subtype = 'html'
+    if logo is not None:
+        email_message.attach(copy.deepcopy(logo))
+    return email_message
+
 def send_email(subject, message, from_email, recipient_list, fail_silently=False, html_message=None):
     """
     Custom email sending function to replace send_mail, using SESEmailBackend.
@@ -42,103 +121,60 @@ def send_email(subject, message, from_email, recipient_list, fail_silently=False
             raise e
         return 0
 
-def send_welcome_email(email, business_name, password, portal_url, sender_name, role, qualification_title):
+def build_welcome_email(email, business_name, password, portal_url, sender_name, role, qualification_title, set_password=False):
     """
-    Send a welcome email to a new user after their first registration with a business.
-    Includes role, qualification details, and full name.
+    Build the EmailMessage send_welcome_email sends.
     """
-    subject = 'Welcome to AssessEEZ'
-    from_email = settings.DEFAULT_FROM_EMAIL
     recipient_list = [email]
 
     logger.debug(f"Starting send_welcome_email for {email}")
     password_to_send = password  # Use provided password or None
+    set_password_url = None
 
     # Retrieve full_name from CustomUser
     try:
         user = CustomUser.objects.get(email=email)
         full_name = user.full_name or "User"
+        if set_password:
+            uidb64 = urlsafe_base64_encode(force_bytes(user.pk))
+            token = default_token_generator.make_token(user)
+            set_password_url = f"{settings.SITE_URL}{reverse('users:password_reset_redirect', kwargs={'uidb64': uidb64, 'token': token})}"
     except CustomUser.DoesNotExist:
         full_name = "User"
         logger.warning(f"CustomUser not found for email: {email}")
 
-    # Define logo path
-    base_path = settings.STATIC_ROOT if settings.STATIC_ROOT and not settings.DEBUG else settings.BASE_DIR
-    logo_path = os.path.join(base_path, 'static', 'images', 'assesseez_logo.png')
-    
-    # Fallback to STATICFILES_DIRS if available
-    if hasattr(settings, 'STATICFILES_DIRS') and settings.STATICFILES_DIRS:
-        for static_dir in settings.STATICFILES_DIRS:
-            possible_path = os.path.join(static_dir, 'images', 'assesseez_logo.png')
-            if os.path.exists(possible_path):
-                logo_path = possible_path
-                break
-
-    logo_available = os.path.exists(logo_path)
-    logger.debug(f"Logo available: {logo_available} at {logo_path}")
-
-    # Render template with full_name
-    html_message = render_to_string('welcome_email.html', {
+    email_message = compose('welcome', {
         'business_name': business_name,
         'email': email,
         'password': password_to_send,
+        'set_password_url': set_password_url,
         'portal_url': portal_url,
         'sender_name': sender_name,
         'role': role,
         'qualification_title': qualification_title,
         'full_name': full_name,
-        'logo_available': logo_available
-    })
-    logger.debug(f"Template rendered for {email}")
+    }, recipient_list)
+    return email_message
 
-    # Create email
-    email_message = EmailMessage(
-        subject=subject,
-        body=html_message,
-        from_email=from_email,
-        to=recipient_list,
-    )
-    email_message.content_subtype = 'html'
-    logger.debug(f"EmailMessage created for {email}")
-
-    # Attach logo if available
-    if logo_available:
-        logger.debug(f"Attempting to attach logo from: {logo_path}")
-        try:
-            with open(logo_path, 'rb') as f:
-                logo_data = f.read()
-            logo = MIMEImage(logo_data)
-            logo.add_header('Content-ID', '<assesseez_logo>')
-            logo.add_header('Content-Disposition', 'inline', filename='assesseez_logo.png')
-            email_message.attach(logo)
-            logger.debug(f"Logo attached for {email}")
-        except Exception as e:
-            logger.error(f"Failed to attach logo at {logo_path}: {str(e)}")
-            html_message = render_to_string('welcome_email.html', {
-                'business_name': business_name,
-                'email': email,
-                'password': password_to_send,
-                'portal_url': portal_url,
-                'sender_name': sender_name,
-                'role': role,
-                'qualification_title': qualification_title,
-                'full_name': full_name,
-                'logo_available': False
-            })
-            email_message.body = html_message
-            email_message.content_subtype = 'html'
+def send_welcome_email(email, business_name, password, portal_url, sender_name, role, qualification_title, set_password=False):
+    """
+    Send a welcome email to a new user after their first registration with a business.
+    Includes role, qualification details, and full name.
+
+    Queued welcome emails pass set_password=True instead of a password, so the outbox never holds
+    a secret: the link to choose a password is made from a reset token when the email is sent.
+    """
+    email_message = build_welcome_email(email, business_name, password, portal_url, sender_name, role, qualification_title, set_password)
 
     logger.debug(f"Sending email to {email}")
     result = email_message.send(fail_silently=False)
     logger.debug(f"Welcome email sent to {email}: {result}")
     return result
 
-def send_role_notification_email(recipient_email, business_name, business_id, action, role, learner_name=None, qualification_titles=None):
+def build_role_notification_email(recipient_email, business_name, business_id, action, role, learner_name=None, qualification_titles=None):
     """
-    Send a notification email for role assignments, removals, or new qualifications.
+    Build the EmailMessage send_role_notification_email sends.
     """
-    subject = f'AssessEEZ: {action} Notification'
-    from_email = settings.DEFAULT_FROM_EMAIL
     recipient_list = [recipient_email]
     login_url = f"{settings.SITE_URL}{reverse('login')}"
 
@@ -161,23 +197,7 @@ def send_role_notification_email(recipient_email, business_name, business_id, ac
     # Ensure qualification_titles is a list
     qualification_titles = qualification_titles or []
 
-    # Define logo path
-    base_path = settings.STATIC_ROOT if settings.STATIC_ROOT and not settings.DEBUG else settings.BASE_DIR
-    logo_path = os.path.join(base_path, 'static', 'images', 'assesseez_logo.png')
-    
-    # Fallback to STATICFILES_DIRS if available
-    if hasattr(settings, 'STATICFILES_DIRS') and settings.STATICFILES_DIRS:
-        for static_dir in settings.STATICFILES_DIRS:
-            possible_path = os.path.join(static_dir, 'images', 'assesseez_logo.png')
-            if os.path.exists(possible_path):
-                logo_path = possible_path
-                break
-
-    logo_available = os.path.exists(logo_path)
-    logger.debug(f"Logo available: {logo_available} at {logo_path}")
-
-    # Render template
-    html_message = render_to_string('role_notification_email.html', {
+    email_message = compose('role_notification', {
         'business_name': business_name,
         'business_id': business_id,
         'action': action,
@@ -187,77 +207,29 @@ def send_role_notification_email(recipient_email, business_name, business_id, ac
         'qualification_titles': qualification_titles,
         'login_url': login_url,
         'admin_email': admin_email,
-        'logo_available': logo_available
-    })
-    plain_message = strip_tags(html_message)
+    }, recipient_list)
+    return email_message
 
-    # Create email
-    email_message = EmailMessage(
-        subject=subject,
-        body=html_message,
-        from_email=from_email,
-        to=recipient_list,
-    )
-    email_message.content_subtype = 'html'
-
-    # Attach logo if available
-    if logo_available:
-        try:
-            with open(logo_path, 'rb') as f:
-                logo_data = f.read()
-            logo = MIMEImage(logo_data)
-            logo.add_header('Content-ID', '<assesseez_logo>')
-            logo.add_header('Content-Disposition', 'inline', filename='assesseez_logo.png')
-            email_message.attach(logo)
-        except Exception as e:
-            logger.error(f"Failed to attach logo at {logo_path}: {str(e)}")
-            html_message = render_to_string('role_notification_email.html', {
-                'business_name': business_name,
-                'business_id': business_id,
-                'action': action,
-                'role': role,
-                'recipient_name': recipient_name,
-                'learner_name': learner_name,
-                'qualification_titles': qualification_titles,
-                'login_url': login_url,
-                'admin_email': admin_email,
-                'logo_available': False
-            })
-            email_message.body = html_message
-            email_message.content_subtype = 'html'
+def send_role_notification_email(recipient_email, business_name, business_id, action, role, learner_name=None, qualification_titles=None):
+    """
+    Send a notification email for role assignments, removals, or new qualifications.
+    """
+    email_message = build_role_notification_email(recipient_email, business_name, business_id, action, role, learner_name, qualification_titles)
 
     logger.debug(f"Sending role notification to {recipient_email} for {action}")
     result = email_message.send(fail_silently=False)
     logger.debug(f"Role notification email sent to {recipient_email}: {result}")
     return result
 
-def send_non_conformance_email(recipient_email, iqa_name, learner_name, qualification_title, unit_title, business_name, business_id):
+def build_non_conformance_email(recipient_email, iqa_name, learner_name, qualification_title, unit_title, business_name, business_id):
     """
-    Send a notification email to an assessor when an IQA marks a sampling as non-conformance.
+    Build the EmailMessage send_non_conformance_email sends.
     """
-    subject = 'AssessEEZ: Non-Conformance Notification'
-    from_email = settings.DEFAULT_FROM_EMAIL
     recipient_list = [recipient_email]
     login_url = f"{settings.SITE_URL}{reverse('login')}"
     support_email = settings.SUPPORT_EMAIL or 'support@assesseez.co.uk'
 
-    # Define logo path
-    base_path = settings.STATIC_ROOT if settings.STATIC_ROOT and not settings.DEBUG else settings.BASE_DIR
-    logo_path = os.path.join(base_path, 'static', 'images', 'assesseez_logo.png')
-    
-    # Fallback to STATICFILES_DIRS if available
-    if hasattr(settings, 'STATICFILES_DIRS') and settings.STATICFILES_DIRS:
-        for static_dir in settings.STATICFILES_DIRS:
-            possible_path = os.path.join(static_dir, 'images', 'assesseez_logo.png')
-            if os.path.exists(possible_path):
-                logo_path = possible_path
-                break
-
-    logo_available = os.path.exists(logo_path)
-    logger.debug(f"Logo available: {logo_available} at {logo_path}")
-
-    # Render template
-    html_message = render_to_string('non_conformance_email.html', {
+    email_message = compose('non_conformance', {
         'iqa_name': iqa_name,
         'learner_name': learner_name,
         'qualification_title': qualification_title,
@@ -266,76 +238,29 @@ def send_non_conformance_email(recipient_email, iqa_name, learner_name, qualific
         'business_id': business_id,
         'login_url': login_url,
         'support_email': support_email,
-        'logo_available': logo_available
-    })
-    plain_message = strip_tags(html_message)
-
-    # Create email
-    email_message = EmailMessage(
-        subject=subject,
-        body=html_message,
-        from_email=from_email,
-        to=recipient_list,
-    )
-    email_message.content_subtype = 'html'
+    }, recipient_list)
+    return email_message
 
-    # Attach logo if available
-    if logo_available:
-        try:
-            with open(logo_path, 'rb') as f:
-                logo_data = f.read()
-            logo = MIMEImage(logo_data)
-            logo.add_header('Content-ID', '<assesseez_logo>')
-            logo.add_header('Content-Disposition', 'inline', filename='assesseez_logo.png')
-            email_message.attach(logo)
-        except Exception as e:
-            logger.error(f"Failed to attach logo at {logo_path}: {str(e)}")
-            html_message = render_to_string('non_conformance_email.html', {
-                'iqa_name': iqa_name,
-                'learner_name': learner_name,
-                'qualification_title': qualification_title,
-                'unit_title': unit_title,
-                'business_name': business_name,
-                'business_id': business_id,
-                'login_url': login_url,
-                'support_email': support_email,
-                'logo_available': False
-            })
-            email_message.body = html_message
-            email_message.content_subtype = 'html'
+def send_non_conformance_email(recipient_email, iqa_name, learner_name, qualification_title, unit_title, business_name, business_id):
+    """
+    Send a notification email to an assessor when an IQA marks a sampling as non-conformance.
+    """
+    email_message = build_non_conformance_email(recipient_email, iqa_name, learner_name, qualification_title, unit_title, business_name, business_id)
 
     logger.debug(f"Sending non-conformance notification to {recipient_email} for learner {learner_name}")
     result = email_message.send(fail_silently=False)
     logger.debug(f"Non-conformance email sent to {recipient_email}: {result}")
     return result
 
-def send_message_notification_email(recipient_email, recipient_name, sender_name, sender_role, business_name, message_subject, message_sent_at, fail_silently=False):
+def build_message_notification_email(recipient_email, recipient_name, sender_name, sender_role, business_name, message_subject, message_sent_at):
     """
-    Send a notification email to a user when they receive a new message on AssessEEZ.
+    Build the EmailMessage send_message_notification_email sends.
     """
-    subject = 'New Message Received on AssessEEZ'
-    from_email = settings.DEFAULT_FROM_EMAIL
     recipient_list = [recipient_email]
     login_url = f"{settings.SITE_URL}{reverse('login')}"
     support_email = settings.SUPPORT_EMAIL or 'support@assesseez.co.uk'
 
-    # Define logo path
-    base_path = settings.STATIC_ROOT if settings.STATIC_ROOT and not settings.DEBUG else settings.BASE_DIR
-    logo_path = os.path.join(base_path, 'static', 'images', 'assesseez_logo.png')
-    
-    # Fallback to STATICFILES_DIRS if available
-    if hasattr(settings, 'STATICFILES_DIRS') and settings.STATICFILES_DIRS:
-        for static_dir in settings.STATICFILES_DIRS:
-            possible_path = os.path.join(static_dir, 'images', 'assesseez_logo.png')
-            if os.path.exists(possible_path):
-                logo_path = possible_path
-                break
-
-    logo_available = os.path.exists(logo_path)
-    logger.debug(f"Logo available: {logo_available} at {logo_path}")
-
-    # Render template
-    html_message = render_to_string('message_notification_email.html', {
+    email_message = compose('message_notification', {
         'recipient_name': recipient_name,
         'sender_name': sender_name,
         'sender_role': sender_role,
@@ -344,55 +269,24 @@ def send_message_notification_email(recipient_email, recipient_name, sender_name
         'message_sent_at': message_sent_at.strftime('%Y-%m-%d %H:%M'),
         'login_url': login_url,
         'support_email': support_email,
-        'logo_available': logo_available
-    })
-    plain_message = strip_tags(html_message)
+    }, recipient_list)
+    return email_message
 
-    # Create email
-    email_message = EmailMessage(
-        subject=subject,
-        body=html_message,
-        from_email=from_email,
-        to=recipient_list,
-    )
-    email_message.content_subtype = 'html'
-
-    # Attach logo if available
-    if logo_available:
-        try:
-            with open(logo_path, 'rb') as f:
-                logo_data = f.read()
-            logo = MIMEImage(logo_data)
-            logo.add_header('Content-ID', '<assesseez_logo>')
-            logo.add_header('Content-Disposition', 'inline', filename='assesseez_logo.png')
-            email_message.attach(logo)
-        except Exception as e:
-            logger.error(f"Failed to attach logo at {logo_path}: {str(e)}")
-            html_message = render_to_string('message_notification_email.html', {
-                'recipient_name': recipient_name,
-                'sender_name': sender_name,
-                'sender_role': sender_role,
-                'business_name': business_name,
-                'message_subject': message_subject,
-                'message_sent_at': message_sent_at.strftime('%Y-%m-%d %H:%M'),
-                'login_url': login_url,
-                'support_email': support_email,
-                'logo_available': False
-            })
-            email_message.body = html_message
-            email_message.content_subtype = 'html'
+def send_message_notification_email(recipient_email, recipient_name, sender_name, sender_role, business_name, message_subject, message_sent_at, fail_silently=False):
+    """
+    Send a notification email to a user when they receive a new message on AssessEEZ.
+    """
+    email_message = build_message_notification_email(recipient_email, recipient_name, sender_name, sender_role, business_name, message_subject, message_sent_at)
 
     logger.debug(f"Sending message notification to {recipient_email} from {sender_name} ({sender_role}) at {business_name}")
     result = email_message.send(fail_silently=fail_silently)
     logger.debug(f"Message notification email sent to {recipient_email}: {result}")
     return result
 
-def send_document_submission_notification_email(assessor_email, assessor_name, learner_name, qualification_title, business_name, business_id, submission_type):
+def build_document_submission_notification_email(assessor_email, assessor_name, learner_name, qualification_title, business_name, business_id, submission_type):
     """
-    Send a notification email to an assessor when a learner submits a document or evidence.
+    Build the EmailMessage send_document_submission_notification_email sends.
     """
-    subject = f'AssessEEZ: New {submission_type} Submission Notification'
-    from_email = settings.DEFAULT_FROM_EMAIL
     recipient_list = [assessor_email]
     login_url = f"{settings.SITE_URL}{reverse('login')}"
 
@@ -404,23 +298,7 @@ def send_document_submission_notification_email(assessor_email, assessor_name, l
         admin_email = 'support@assesseez.co.uk'
         logger.warning(f"No admin found for business ID: {business_id}")
 
-    # Define logo path
-    base_path = settings.STATIC_ROOT if settings.STATIC_ROOT and not settings.DEBUG else settings.BASE_DIR
-    logo_path = os.path.join(base_path, 'static', 'images', 'assesseez_logo.png')
-    
-    # Fallback to STATICFILES_DIRS if available
-    if hasattr(settings, 'STATICFILES_DIRS') and settings.STATICFILES_DIRS:
-        for static_dir in settings.STATICFILES_DIRS:
-            possible_path = os.path.join(static_dir, 'images', 'assesseez_logo.png')
-            if os.path.exists(possible_path):
-                logo_path = possible_path
-                break
-
-    logo_available = os.path.exists(logo_path)
-    logger.debug(f"Logo available: {logo_available} at {logo_path}")
-
-    # Render template
-    html_message = render_to_string('document_submission_notification_email.html', {
+    email_message = compose('document_submission', {
         'assessor_name': assessor_name,
         'learner_name': learner_name,
         'qualification_title': qualification_title,
@@ -429,119 +307,115 @@ def send_document_submission_notification_email(assessor_email, assessor_name, l
         'submission_type': submission_type,
         'login_url': login_url,
         'admin_email': admin_email,
-        'logo_available': logo_available
-    })
-    plain_message = strip_tags(html_message)
+    }, recipient_list)
+    return email_message
 
-    # Create email
-    email_message = EmailMessage(
-        subject=subject,
-        body=html_message,
-        from_email=from_email,
-        to=recipient_list,
-    )
-    email_message.content_subtype = 'html'
-
-    # Attach logo if available
-    if logo_available:
-        try:
-            with open(logo_path, 'rb') as f:
-                logo_data = f.read()
-            logo = MIMEImage(logo_data)
-            logo.add_header('Content-ID', '<assesseez_logo>')
-            logo.add_header('Content-Disposition', 'inline', filename='assesseez_logo.png')
-            email_message.attach(logo)
-        except Exception as e:
-            logger.error(f"Failed to attach logo at {logo_path}: {str(e)}")
-            html_message = render_to_string('document_submission_notification_email.html', {
-                'assessor_name': assessor_name,
-                'learner_name': learner_name,
-                'qualification_title': qualification_title,
-                'business_name': business_name,
-                'business_id': business_id,
-                'submission_type': submission_type,
-                'login_url': login_url,
-                'admin_email': admin_email,
-                'logo_available': False
-            })
-            email_message.body = html_message
-            email_message.content_subtype = 'html'
+def send_document_submission_notification_email(assessor_email, assessor_name, learner_name, qualification_title, business_name, business_id, submission_type):
+    """
+    Send a notification email to an assessor when a learner submits a document or evidence.
+    """
+    email_message = build_document_submission_notification_email(assessor_email, assessor_name, learner_name, qualification_title, business_name, business_id, submission_type)
 
     logger.debug(f"Sending {submission_type} submission notification to {assessor_email} for learner {learner_name}")
     result = email_message.send(fail_silently=False)
     logger.debug(f"{submission_type} submission notification email sent to {assessor_email}: {result}")
     return result
 
-def send_notification_email(recipient_email, learner_name, business_name, notification_message, notification_date):
+def build_notification_email(recipient_email, learner_name, business_name, notification_message, notification_date):
     """
-    Send a notification email to a learner when a new notification is generated.
+    Build the EmailMessage send_notification_email sends.
     """
-    subject = 'AssessEEZ: New Notification'
-    from_email = settings.DEFAULT_FROM_EMAIL
     recipient_list = [recipient_email]
     login_url = f"{settings.SITE_URL}{reverse('login')}"
     support_email = settings.SUPPORT_EMAIL or 'support@assesseez.co.uk'
 
-    # Define logo path
-    base_path = settings.STATIC_ROOT if settings.STATIC_ROOT and not settings.DEBUG else settings.BASE_DIR
-    logo_path = os.path.join(base_path, 'static', 'images', 'assesseez_logo.png')
-    
-    # Fallback to STATICFILES_DIRS if available
-    if hasattr(settings, 'STATICFILES_DIRS') and settings.STATICFILES_DIRS:
-        for static_dir in settings.STATICFILES_DIRS:
-            possible_path = os.path.join(static_dir, 'images', 'assesseez_logo.png')
-            if os.path.exists(possible_path):
-                logo_path = possible_path
-                break
-
-    logo_available = os.path.exists(logo_path)
-    logger.debug(f"Logo available: {logo_available} at {logo_path}")
-
-    # Render template
-    html_message = render_to_string('notification_email.html', {
+    email_message = compose('notification', {
         'learner_name': learner_name,
         'business_name': business_name,
         'notification_message': notification_message,
         'notification_date': notification_date.strftime('%Y-%m-%d %H:%M'),
         'login_url': login_url,
         'support_email': support_email,
-        'logo_available': logo_available
-    })
-    plain_message = strip_tags(html_message)
-
-    # Create email
-    email_message = EmailMessage(
-        subject=subject,
-        body=html_message,
-        from_email=from_email,
-        to=recipient_list,
-    )
-    email_message.content_subtype = 'html'
+    }, recipient_list)
+    return email_message
 
-    # Attach logo if available
-    if logo_available:
-        try:
-            with open(logo_path, 'rb') as f:
-                logo_data = f.read()
-            logo = MIMEImage(logo_data)
-            logo.add_header('Content-ID', '<assesseez_logo>')
-            logo.add_header('Content-Disposition', 'inline', filename='assesseez_logo.png')
-            email_message.attach(logo)
-        except Exception as e:
-            logger.error(f"Failed to attach logo at {logo_path}: {str(e)}")
-            html_message = render_to_string('notification_email.html', {
-                'learner_name': learner_name,
-                'business_name': business_name,
-                'notification_message': notification_message,
-                'notification_date': notification_date.strftime('%Y-%m-%d %H:%M'),
-                'login_url': login_url,
-                'support_email': support_email,
-                'logo_available': False
-            })
-            email_message.body = html_message
-            email_message.content_subtype = 'html'
+def send_notification_email(recipient_email, learner_name, business_name, notification_message, notification_date):
+    """
+    Send a notification email to a learner when a new notification is generated.
+    """
+    email_message = build_notification_email(recipient_email, learner_name, business_name, notification_message, notification_date)
 
     logger.debug(f"Sending notification email to {recipient_email} for notification: {notification_message}")
     result = email_message.send(fail_silently=False)
     logger.debug(f"Notification email sent to {recipient_email}: {result}")
-    return result
\ No newline at end of file
+    return result
+
+def build_notification_digest_email(user_business_id, business_name):
+    """
+    Build the digest of every notification waiting for the recipient, or None if an earlier
+    digest already covered them. The message carries the notification ids for after_send().
+    """
+    # Imported here: qualifications.models imports this module (via qualifications.utils)
+    from qualifications.models import Notification
+
+    notifications = list(
+        Notification.objects.filter(user_id=user_business_id, digest_pending=True).order_by('created_at')
+    )
+    if not notifications:
+        logger.debug(f"No pending notifications for digest to {user_business_id}")
+        return None
+    recipient = UserBusiness.objects.select_related('user').get(id=user_business_id).user
+    login_url = f"{settings.SITE_URL}{reverse('login')}"
+    support_email = settings.SUPPORT_EMAIL or 'support@assesseez.co.uk'
+
+    email_message = compose('notification_digest', {
+        'learner_name': recipient.full_name or recipient.email,
+        'business_name': business_name,
+        'count': len(notifications),
+        'notifications': [
+            {'message': notification.message, 'date': notification.created_at.strftime('%Y-%m-%d %H:%M')}
+            for notification in notifications
+        ],
+        'login_url': login_url,
+        'support_email': support_email,
+    }, [recipient.email])
+    email_message.notification_ids = [notification.id for notification in notifications]
+    return email_message
+
+def send_notification_digest_email(user_business_id, business_name):
+    """
+    Send one email listing every notification waiting in the recipient's digest, then mark them sent.
+    """
+    email_message = build_notification_digest_email(user_business_id, business_name)
+    if email_message is None:
+        return True  # An earlier digest already covered them
+
+    logger.debug(f"Sending digest of {len(email_message.notification_ids)} notifications to {email_message.to[0]}")
+    result = email_message.send(fail_silently=False)
+    if result:
+        after_send(email_message)
+    logger.debug(f"Notification digest sent to {email_message.to[0]}: {result}")
+    return result
+
+def after_send(message):
+    """
+    Record what a delivered message covered: notifications sent in a digest leave the digest.
+    """
+    notification_ids = getattr(message, 'notification_ids', None)
+    if notification_ids:
+        # Imported here: qualifications.models imports this module (via qualifications.utils)
+        from qualifications.models import Notification
+        Notification.objects.filter(id__in=notification_ids).update(digest_pending=False)
+
+
+# send_* helper name -> function building its EmailMessage, so the outbox worker can send a
+# whole batch of queued calls through email_backends.send_batch
+BUILDERS = {
+    'send_welcome_email': build_welcome_email,
+    'send_role_notification_email': build_role_notification_email,
+    'send_non_conformance_email': build_non_conformance_email,
+    'send_message_notification_email': build_message_notification_email,
+    'send_document_submission_notification_email': build_document_submission_notification_email,
+    'send_notification_email': build_notification_email,
+    'send_notification_digest_email': build_notification_digest_email,
+}
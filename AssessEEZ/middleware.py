@@ -0,0 +1,42 @@
+import logging
+from django.utils.functional import SimpleLazyObject
+from users.models import UserBusiness
+from qualifications.roles import load_role_map
+
+logger = logging.getLogger('qualifications')
+
+
+class UserBusinessMiddleware:
+    """
+    Resolve the logged-in user's UserBusiness for the business selected in the session once per
+    request and attach it to the request:
+
+    - request.user_business: the UserBusiness (with user and business loaded) or None
+    - request.business: the selected Business or None
+    - request.roles: a RoleMap {qualification_id: roles}, loaded lazily on first use
+
+    Must run after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.user_business = self.resolve_user_business(request)
+        request.business = request.user_business.business if request.user_business else None
+        request.roles = SimpleLazyObject(lambda: load_role_map(request.user_business))
+        return self.get_response(request)
+
+    @staticmethod
+    def resolve_user_business(request):
+        if not request.user.is_authenticated:
+            return None
+        business_id = request.session.get('business_id')
+        if not business_id:
+            return None
+        user_business = UserBusiness.objects.select_related('user', 'business').filter(
+            user=request.user, business__business_id=business_id
+        ).first()
+        if user_business is None:
+            logger.debug(f"No UserBusiness for user {request.user.email} and business {business_id}")
+        return user_business
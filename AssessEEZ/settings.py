@@ -77,6 +77,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'AssessEEZ.middleware.UserBusinessMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -122,6 +123,32 @@ except:
         }
     }
 
+# Cache shared by every web and worker process: role maps, unread counts, presigned URLs and
+# qualification structure snapshots are invalidated by version bumps all processes must see.
+# Redis when REDIS_URL is set, else a table in the main database; the per-process locmem
+# cache is only used with the local SQLite database (development and tests).
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+elif DATABASES['default']['ENGINE'] != 'django.db.backends.sqlite3':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -283,6 +310,20 @@ except:
 
 SUPPORT_EMAIL = 'support@assesseez.co.uk'
 
+# Parallel sends per SESEmailBackend.send_batch call; the shared SES client pools this many connections
+SES_SEND_CONCURRENCY = config('SES_SEND_CONCURRENCY', default=8, cast=int)
+
+# Email outbox (AssessEEZ.email_queue), drained by `manage.py send_queued_emails`
+EMAIL_QUEUE_MAX_ATTEMPTS = 5
+EMAIL_QUEUE_RETRY_BASE = 30  # seconds, doubled on each retry
+EMAIL_QUEUE_EAGER = False
+
+# Qualification copy jobs (qualifications.copy_jobs), run by `manage.py run_qualification_copies`
+QUALIFICATION_COPY_EAGER = False
+
+# Seconds to collect a user's notifications into one digest email; 0 emails each notification
+NOTIFICATION_DIGEST_WINDOW = config('NOTIFICATION_DIGEST_WINDOW', default=0, cast=int)
+
 # Site URL and Login URL
 try:
     SITE_URL = config('SITE_URL')
@@ -302,7 +343,9 @@ try:
     AWS_S3_OBJECT_PARAMETERS = {
         'CacheControl': 'max-age=86400',
     }
-    AWS_DEFAULT_ACL = 'public-read'  # Media files are publicly accessible
+    # Shared media (resources, templates, logos) is public; learners' evidence, workbooks and
+    # documents use AssessEEZ.storage_backends.PrivateMediaStorage and stay private
+    AWS_DEFAULT_ACL = 'public-read'
     AWS_S3_FILE_OVERWRITE = False  # Prevent overwriting files with the same name
     AWS_S3_SIGNATURE_VERSION = 's3v4'
 
@@ -317,6 +360,21 @@ except:
     MEDIA_URL = '/media/'
     MEDIA_ROOT = BASE_DIR / 'media'
 
+# How downloads reach the browser after the permission check: 'stream' proxies the bytes
+# through Django, 'redirect' sends a presigned S3 URL valid for PRESIGNED_URL_EXPIRY seconds
+FILE_DOWNLOAD_MODE = config('FILE_DOWNLOAD_MODE', default='stream')
+PRESIGNED_URL_EXPIRY = config('PRESIGNED_URL_EXPIRY', default=900, cast=int)
+
+# Evidence and workbook files go from the browser straight to the bucket via presigned POSTs
+DIRECT_UPLOADS = config('DIRECT_UPLOADS', default=False, cast=bool)
+DIRECT_UPLOAD_EXPIRY = config('DIRECT_UPLOAD_EXPIRY', default=3600, cast=int)
+
+# Chunk size for resumable evidence uploads (qualifications.chunked_uploads)
+CHUNKED_UPLOAD_CHUNK_SIZE = config('CHUNKED_UPLOAD_CHUNK_SIZE', default=5 * 1024 * 1024, cast=int)
+
+# Storage reads kept in flight while streaming a learner's portfolio ZIP
+PORTFOLIO_EXPORT_CONCURRENCY = config('PORTFOLIO_EXPORT_CONCURRENCY', default=4, cast=int)
+
 try:
     RECAPTCHA_PUBLIC_KEY = config('RECAPTCHA_SITE_KEY')
     RECAPTCHA_PRIVATE_KEY = config('RECAPTCHA_SECRET_KEY')
@@ -0,0 +1,14 @@
+from storages.backends.s3boto3 import S3Boto3Storage
+
+
+class PrivateMediaStorage(S3Boto3Storage):
+    """
+    Media bucket storage for learners' evidence, workbooks and documents.
+
+    Objects are written with a private ACL whatever AWS_DEFAULT_ACL says, and their URLs are
+    signed against the bucket rather than built on the public custom domain, so the files are
+    only reachable through the permission-checked download view (qualifications.file_serving).
+    """
+    default_acl = 'private'
+    querystring_auth = True
+    custom_domain = None
@@ -36,4 +36,8 @@ fi
 echo "Running migrations..."
 python manage.py migrate
 
+# Table behind the shared DatabaseCache (no-op when REDIS_URL is set or the table exists)
+echo "Creating cache table..."
+python manage.py createcachetable
+
 echo "=== BUILD COMPLETED ==="
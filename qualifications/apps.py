@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class QualificationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'qualifications'
+
+    def ready(self):
+        from qualifications import signals  # noqa: F401
@@ -0,0 +1,234 @@
+import io
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Max, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from qualifications.direct_uploads import check_upload
+from qualifications.models import ChunkedUpload, ChunkedUploadPart, EvidenceFile, EvidenceSubmission
+from qualifications.notifications import queue_submission_email
+from qualifications.progress import rebuild_learner_progress
+
+logger = logging.getLogger('qualifications')
+
+DEFAULT_CHUNK_SIZE = 5 * 1024 * 1024
+
+# Read buffer while copying the assembled file into its final storage
+ASSEMBLY_BUFFER_SIZE = 1024 * 1024
+
+# Seconds an upload stays ASSEMBLING before another completion request may take it over, so a
+# request killed in the middle of a large copy does not lock the upload forever
+ASSEMBLY_LEASE_SECONDS = 30 * 60
+
+
+def chunk_size():
+    return getattr(settings, 'CHUNKED_UPLOAD_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+
+def start_chunked_upload(learner, assessment_criterion, filename, total_size):
+    """
+    Open a resumable upload of one evidence file for an active learner.
+    """
+    check_upload(filename, total_size)
+    latest = EvidenceSubmission.objects.filter(
+        user=learner.user, assessment_criterion=assessment_criterion
+    ).order_by('-submitted_at').first()
+    if latest and latest.status == 'ACCEPTED':
+        raise ValidationError("Evidence for this criterion has already been accepted.")
+    return ChunkedUpload.objects.create(
+        user=learner.user,
+        assessment_criterion=assessment_criterion,
+        filename=filename,
+        total_size=total_size,
+        chunk_size=chunk_size(),
+    )
+
+
+def chunk_storage():
+    """
+    Storage holding received chunks: the private media bucket the assembled evidence goes to, so
+    every web instance sees the chunks whichever instance received them.
+    """
+    return EvidenceFile._meta.get_field('evidence_file').storage
+
+
+def part_path(upload, index):
+    return f"chunks/{upload.id}/{index:06d}"
+
+
+def store_chunk(upload, index, content):
+    """
+    Save chunk `index` to chunk storage. Chunks may arrive in any order; sending a chunk
+    again (after a dropped connection) replaces the earlier copy.
+    """
+    if upload.status != 'UPLOADING':
+        raise ValidationError("This upload is no longer accepting chunks.")
+    if not 0 <= index < upload.chunk_count:
+        raise ValidationError("Chunk index out of range.")
+    expected = upload.expected_chunk_size(index)
+    if content.size != expected:
+        raise ValidationError(f"Chunk {index} must be {expected} bytes, got {content.size}.")
+    storage = chunk_storage()
+    path = part_path(upload, index)
+    if storage.exists(path):
+        storage.delete(path)
+    saved_path = storage.save(path, content)
+    ChunkedUploadPart.objects.update_or_create(
+        upload=upload, index=index, defaults={'size': content.size, 'path': saved_path}
+    )
+
+
+def received_chunks(upload):
+    return list(upload.parts.order_by('index').values_list('index', flat=True))
+
+
+class ChunkStream(io.RawIOBase):
+    """
+    Read stored chunks back to back as one file, keeping only one chunk open at a time.
+    """
+    def __init__(self, paths, storage):
+        self._paths = iter(paths)
+        self._storage = storage
+        self._current = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while True:
+            if self._current is None:
+                path = next(self._paths, None)
+                if path is None:
+                    return 0
+                self._current = self._storage.open(path, 'rb')
+            data = self._current.read(len(buffer))
+            if data:
+                buffer[:len(data)] = data
+                return len(data)
+            self._current.close()
+            self._current = None
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+        super().close()
+
+
+def _attach(upload, evidence, evidence_detail):
+    submission = EvidenceSubmission.objects.filter(
+        user=upload.user, assessment_criterion=upload.assessment_criterion
+    ).order_by('-submitted_at').first()
+    created = not (submission and submission.status == 'SUBMITTED')
+    if created:
+        submission = EvidenceSubmission.objects.create(
+            user=upload.user,
+            assessment_criterion=upload.assessment_criterion,
+            evidence_detail=evidence_detail,
+            status='SUBMITTED'
+        )
+    elif evidence_detail:
+        submission.evidence_detail = evidence_detail
+        submission.save()
+    evidence.evidence_submission = submission
+    evidence.save()
+    return submission, created
+
+
+def complete_chunked_upload(upload, learner, evidence_detail=''):
+    """
+    Assemble a fully received upload into an EvidenceFile on the learner's open submission for
+    the criterion, creating a new submission if none is open.
+
+    The chunks are streamed into the evidence file's storage without loading the file into
+    memory. Completing an already completed upload returns its EvidenceFile again. Assembly holds
+    a lease on the upload; if it fails the assembled file is deleted and the upload accepts
+    chunks and completion requests again.
+    """
+    lease = timezone.now()
+    claimable = Q(status='UPLOADING') | Q(
+        status='ASSEMBLING', assembling_since__lt=lease - timedelta(seconds=ASSEMBLY_LEASE_SECONDS)
+    )
+    if not ChunkedUpload.objects.filter(claimable, id=upload.id).update(status='ASSEMBLING', assembling_since=lease):
+        upload.refresh_from_db()
+        if upload.status == 'COMPLETE':
+            return upload.evidence_file
+        raise ValidationError("This upload is already being assembled.")
+
+    evidence = EvidenceFile()
+    try:
+        parts = list(upload.parts.order_by('index').values_list('index', 'size', 'path'))
+        missing = sorted(set(range(upload.chunk_count)) - {index for index, _, _ in parts})
+        if missing:
+            raise ValidationError(f"Missing chunks: {', '.join(str(index) for index in missing[:20])}.")
+        if sum(size for _, size, _ in parts) != upload.total_size:
+            raise ValidationError("Received chunks do not add up to the file size.")
+
+        content = File(
+            io.BufferedReader(ChunkStream([path for _, _, path in parts], chunk_storage()), buffer_size=ASSEMBLY_BUFFER_SIZE),
+            name=upload.filename
+        )
+        content.size = upload.total_size
+        try:
+            evidence.evidence_file.save(upload.filename, content, save=False)
+        finally:
+            content.close()
+
+        with transaction.atomic():
+            # Another request took the upload over after our lease ran out
+            if not ChunkedUpload.objects.select_for_update().filter(
+                id=upload.id, status='ASSEMBLING', assembling_since=lease
+            ).exists():
+                raise ValidationError("This upload is already being assembled.")
+            submission, created = _attach(upload, evidence, evidence_detail)
+            ChunkedUpload.objects.filter(id=upload.id).update(
+                status='COMPLETE', evidence_file=evidence, assembling_since=None, updated_at=timezone.now()
+            )
+            rebuild_learner_progress([learner], activity_at=timezone.now())
+            if created:
+                try:
+                    queue_submission_email(learner, upload.user.business, 'Evidence')
+                except Exception as e:
+                    logger.error(f"Failed to queue evidence submission notification for upload {upload.id}: {str(e)}")
+            transaction.on_commit(lambda: discard_chunks(upload, [path for _, _, path in parts]))
+    except Exception:
+        if evidence.evidence_file.name:
+            evidence.evidence_file.storage.delete(evidence.evidence_file.name)
+        ChunkedUpload.objects.filter(id=upload.id, status='ASSEMBLING', assembling_since=lease).update(
+            status='UPLOADING', assembling_since=None
+        )
+        raise
+    logger.info(f"Assembled chunked upload {upload.id} ({upload.total_size} bytes) into evidence file {evidence.id}")
+    return evidence
+
+
+def discard_chunks(upload, paths):
+    storage = chunk_storage()
+    for path in paths:
+        storage.delete(path)
+    upload.parts.all().delete()
+
+
+def discard_stale_uploads(max_age):
+    """
+    Delete unfinished uploads that have received nothing for `max_age` (a timedelta), with their
+    stored chunks. Uploads being assembled under a live lease are left alone. Returns the count.
+    """
+    now = timezone.now()
+    stale = ChunkedUpload.objects.exclude(status='COMPLETE').exclude(
+        status='ASSEMBLING', assembling_since__gte=now - timedelta(seconds=ASSEMBLY_LEASE_SECONDS)
+    ).annotate(
+        last_activity=Coalesce(Max('parts__received_at'), 'updated_at')
+    ).filter(last_activity__lt=now - max_age)
+    count = 0
+    for upload in stale:
+        discard_chunks(upload, list(upload.parts.values_list('path', flat=True)))
+        upload.delete()
+        count += 1
+    if count:
+        logger.info(f"Discarded {count} abandoned chunked uploads")
+    return count
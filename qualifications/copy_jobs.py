@@ -0,0 +1,89 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from qualifications.models import QualificationCopyJob
+
+logger = logging.getLogger('qualifications')
+
+# Seconds a running job stays locked without reporting progress before another worker may take it over
+LEASE_SECONDS = 300
+
+
+def start_copy_job(qualification, businesses, requested_by=None):
+    """
+    Queue a copy of `qualification` into `businesses` for `manage.py run_qualification_copies`.
+    With QUALIFICATION_COPY_EAGER = True the job runs as soon as the transaction commits
+    (handy in tests and local development).
+    """
+    businesses = list(businesses)
+    job = QualificationCopyJob.objects.create(
+        qualification=qualification, requested_by=requested_by, total=len(businesses)
+    )
+    job.businesses.set(businesses)
+    logger.info(f"Queued copy job {job.id} of qualification {qualification.id} into {len(businesses)} businesses")
+    if getattr(settings, 'QUALIFICATION_COPY_EAGER', False):
+        transaction.on_commit(lambda: run_job(job))
+    return job
+
+
+def claim_job():
+    """
+    Lock the oldest runnable job for this worker and return it, or None. Jobs are leased, so a
+    crashed worker's job becomes runnable again once its lease runs out.
+    """
+    now = timezone.now()
+    runnable = Q(status='PENDING') | Q(status='RUNNING', locked_until__lt=now)
+    with transaction.atomic():
+        job = QualificationCopyJob.objects.filter(runnable).order_by('created_at').select_for_update(skip_locked=True).first()
+        if job is None:
+            return None
+        QualificationCopyJob.objects.filter(id=job.id).update(
+            status='RUNNING', started_at=now, locked_until=now + timedelta(seconds=LEASE_SECONDS)
+        )
+    job.refresh_from_db()
+    return job
+
+
+def run_job(job):
+    """
+    Run one copy job, recording progress after each batch of businesses. Returns True on success.
+    """
+    def progress(done, total):
+        QualificationCopyJob.objects.filter(id=job.id).update(
+            completed=done, locked_until=timezone.now() + timedelta(seconds=LEASE_SECONDS)
+        )
+
+    # Leased like claimed jobs, so a job that dies on the eager path is picked up by the worker
+    now = timezone.now()
+    QualificationCopyJob.objects.filter(id=job.id).update(
+        status='RUNNING', started_at=now, locked_until=now + timedelta(seconds=LEASE_SECONDS)
+    )
+    try:
+        copies = job.qualification.copy_to_businesses(job.businesses.order_by('business_id'), progress=progress)
+    except Exception as e:
+        logger.error(f"Copy job {job.id} failed: {str(e)}")
+        QualificationCopyJob.objects.filter(id=job.id).update(
+            status='FAILED', last_error=str(e) or e.__class__.__name__, locked_until=None, finished_at=timezone.now()
+        )
+        return False
+    QualificationCopyJob.objects.filter(id=job.id).update(
+        status='DONE', completed=job.total, copied_to=sorted(copies), locked_until=None, finished_at=timezone.now()
+    )
+    logger.info(f"Copy job {job.id} copied qualification {job.qualification_id} into {len(copies)} businesses")
+    return True
+
+
+def run_pending():
+    """
+    Run jobs until none are left. Returns (succeeded, failed) counts.
+    """
+    succeeded = failed = 0
+    while (job := claim_job()) is not None:
+        if run_job(job):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
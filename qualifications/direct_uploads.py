@@ -0,0 +1,147 @@
+import logging
+import os
+import posixpath
+import uuid
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from qualifications.file_serving import get_s3_client
+from qualifications.models import ClaimedUpload, EvidenceFile, WorkbookSubmission, MAX_UPLOAD_MB, ALLOWED_UPLOAD_EXTENSIONS
+
+logger = logging.getLogger('qualifications')
+
+UPLOAD_TOKEN_SALT = 'qualifications.direct_uploads'
+
+# kind -> (model, file field) the uploaded object ends up in
+UPLOAD_TARGETS = {
+    'evidence': (EvidenceFile, 'evidence_file'),
+    'workbook': (WorkbookSubmission, 'workbook_file'),
+}
+
+
+def direct_uploads_enabled():
+    return getattr(settings, 'DIRECT_UPLOADS', False)
+
+
+def upload_expiry():
+    return getattr(settings, 'DIRECT_UPLOAD_EXPIRY', 3600)
+
+
+def check_upload(filename, size):
+    """
+    Apply validate_file's rules to a file that is not on this server: its name and byte size.
+    """
+    if not size or size < 1:
+        raise ValidationError("The uploaded file is empty.")
+    if size > MAX_UPLOAD_MB * 1024 * 1024:
+        raise ValidationError(f"File size must not exceed {MAX_UPLOAD_MB}MB.")
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in ALLOWED_UPLOAD_EXTENSIONS:
+        raise ValidationError(f"File type not allowed. Allowed types: {', '.join(ALLOWED_UPLOAD_EXTENSIONS)}.")
+
+
+def upload_key(kind, filename):
+    """
+    Storage key for a new upload: the field's upload_to directory plus a random segment, so
+    keys never collide and need no existence check against the bucket.
+    """
+    model, field_name = UPLOAD_TARGETS[kind]
+    name = model._meta.get_field(field_name).generate_filename(None, filename)
+    return posixpath.join(posixpath.dirname(name), uuid.uuid4().hex, posixpath.basename(name))
+
+
+def start_upload(user_business, kind, filename, size):
+    """
+    Return the presigned POST (url and form fields) the browser sends the file to, plus a
+    signed token naming the key, to be handed back when the submission form is posted.
+    """
+    if kind not in UPLOAD_TARGETS:
+        raise ValidationError("Unknown upload type.")
+    check_upload(filename, size)
+    key = upload_key(kind, filename)
+    fields, conditions = {}, [['content-length-range', 1, MAX_UPLOAD_MB * 1024 * 1024]]
+    # The ACL of the field's own storage (private for learner files), not the bucket-wide default
+    model, field_name = UPLOAD_TARGETS[kind]
+    acl = getattr(model._meta.get_field(field_name).storage, 'default_acl', None)
+    if acl:
+        fields['acl'] = acl
+        conditions.append({'acl': acl})
+    post = get_s3_client().generate_presigned_post(
+        Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+        Key=key,
+        Fields=fields,
+        Conditions=conditions,
+        ExpiresIn=upload_expiry(),
+    )
+    token = signing.dumps({'kind': kind, 'key': key, 'user': str(user_business.id)}, salt=UPLOAD_TOKEN_SALT)
+    logger.debug(f"Presigned {kind} upload {key} for {user_business.user.email}")
+    return {'url': post['url'], 'fields': post['fields'], 'token': token}
+
+
+def verify_object(key):
+    """
+    Check an uploaded object's real size and extension; objects that fail are deleted.
+    """
+    client = get_s3_client()
+    try:
+        head = client.head_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key)
+    except ClientError as e:
+        logger.warning(f"Direct upload {key} not found: {str(e)}")
+        raise ValidationError("The uploaded file could not be found. Please upload it again.")
+    try:
+        check_upload(key, head['ContentLength'])
+    except ValidationError:
+        client.delete_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key)
+        logger.warning(f"Deleted direct upload {key} of {head['ContentLength']} bytes failing validation")
+        raise
+
+
+def already_claimed(keys):
+    """
+    True if any of the storage keys is already the file of an EvidenceFile or WorkbookSubmission.
+    """
+    return (
+        EvidenceFile.objects.filter(evidence_file__in=keys).exists()
+        or WorkbookSubmission.objects.filter(workbook_file__in=keys).exists()
+    )
+
+
+def claim_uploads(user_business, kind, tokens):
+    """
+    Turn upload tokens posted with a submission form into verified storage keys, ready to be
+    assigned to the file field. Raises ValidationError for forged, expired, foreign, invalid or
+    already submitted uploads. The keys must then be passed to record_claims inside the
+    transaction that saves them.
+    """
+    keys = []
+    for token in tokens:
+        try:
+            upload = signing.loads(token, salt=UPLOAD_TOKEN_SALT, max_age=upload_expiry() * 2)
+        except signing.BadSignature:
+            raise ValidationError("Your upload has expired. Please upload the file again.")
+        if upload['kind'] != kind or upload['user'] != str(user_business.id):
+            raise ValidationError("Invalid upload.")
+        if upload['key'] in keys:
+            raise ValidationError("The same upload was submitted twice.")
+        keys.append(upload['key'])
+    if keys and already_claimed(keys):
+        raise ValidationError("This upload has already been submitted. Please upload the file again.")
+    for key in keys:
+        verify_object(key)
+    return keys
+
+
+def record_claims(keys):
+    """
+    Claim storage keys for the submission being saved in the current transaction. Raises
+    ValidationError if another submission got any of them first (two requests posting the same
+    token at once both pass claim_uploads), rolling the submission back: a key ends up in one
+    row only, so deleting that row's file never breaks another.
+    """
+    try:
+        with transaction.atomic():
+            ClaimedUpload.objects.bulk_create([ClaimedUpload(key=key) for key in keys])
+    except IntegrityError:
+        raise ValidationError("This upload has already been submitted. Please upload the file again.")
@@ -0,0 +1,237 @@
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import threading
+from urllib.parse import quote
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.http import Http404, HttpResponse, HttpResponseNotModified, HttpResponseRedirect, StreamingHttpResponse
+from django.urls import reverse
+from qualifications.models import Learner, EvidenceFile, WorkbookSubmission, LearnerDocumentSubmission, LearnerDocsByAssessor
+from qualifications.roles import ASSESSOR, IQA_ROLE, EQA_ROLE
+
+logger = logging.getLogger('qualifications')
+
+# Bytes read from S3 per chunk while streaming a download
+STREAM_CHUNK_SIZE = 64 * 1024
+
+MIME_TYPES = {
+    '.pdf': 'application/pdf',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.mp4': 'video/mp4',
+    '.doc': 'application/msword',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.ppt': 'application/vnd.ms-powerpoint',
+    '.pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+}
+
+# Office files are downloaded; everything else opens in the browser
+ATTACHMENT_EXTENSIONS = {'.doc', '.docx', '.ppt', '.pptx'}
+
+# Share of a presigned URL's lifetime it is reused from the cache, so a handed-out URL
+# always has time left to complete a download
+PRESIGNED_URL_REUSE = 0.8
+
+# kind -> (model, file field, path to the owning learner's UserBusiness, path to the qualification)
+LEARNER_FILES = {
+    'evidence': (
+        EvidenceFile, 'evidence_file', 'evidence_submission__user',
+        'evidence_submission__assessment_criterion__learning_outcome__unit__qualification'
+    ),
+    'workbook': (WorkbookSubmission, 'workbook_file', 'user', 'learning_outcome__unit__qualification'),
+    'document': (LearnerDocumentSubmission, 'document_file', 'learner__user', 'learner__qualification'),
+    'learner_doc': (LearnerDocsByAssessor, 'file', 'learner__user', 'learner__qualification'),
+}
+
+_RANGE_RE = re.compile(r'^bytes=(\d+-\d*|-\d+)$')
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """
+    Return the process-wide S3 client for the media bucket, creating it on first use.
+    boto3 clients are thread-safe and pool their HTTPS connections, so downloads share one.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = boto3.client(
+                    's3',
+                    endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_S3_REGION_NAME,
+                    config=Config(signature_version=getattr(settings, 'AWS_S3_SIGNATURE_VERSION', 's3v4')),
+                )
+    return _client
+
+
+def reset_s3_client():
+    global _client
+    with _client_lock:
+        _client = None
+
+
+def content_type_for(file_key):
+    ext = os.path.splitext(file_key)[1].lower()
+    return MIME_TYPES.get(ext) or mimetypes.guess_type(file_key)[0] or 'application/octet-stream'
+
+
+def content_disposition_for(file_key):
+    ext = os.path.splitext(file_key)[1].lower()
+    disposition = 'attachment' if ext in ATTACHMENT_EXTENSIONS else 'inline'
+    return f'{disposition}; filename="{quote(os.path.basename(file_key))}"'
+
+
+def _stream(body):
+    try:
+        yield from body.iter_chunks(chunk_size=STREAM_CHUNK_SIZE)
+    finally:
+        body.close()
+
+
+def s3_file_response(request, file_key):
+    """
+    Stream an object from the media bucket.
+
+    A single-range `Range` header and `If-None-Match` are passed through to S3, so video can be
+    seeked (206 Partial Content) and unchanged files revalidate with a 304 using the object's
+    ETag. The body is streamed in STREAM_CHUNK_SIZE chunks rather than buffered.
+    """
+    params = {'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': file_key}
+    range_header = request.headers.get('Range', '')
+    if _RANGE_RE.match(range_header):
+        params['Range'] = range_header
+    if request.headers.get('If-None-Match'):
+        params['IfNoneMatch'] = request.headers['If-None-Match']
+
+    try:
+        s3_response = get_s3_client().get_object(**params)
+    except ClientError as e:
+        code = e.response.get('Error', {}).get('Code')
+        if code in ('304', 'NotModified'):
+            response = HttpResponseNotModified()
+            response['ETag'] = params['IfNoneMatch']
+            return response
+        if code == 'InvalidRange':
+            return HttpResponse(status=416)
+        logger.error(f"Error fetching file {file_key} from Spaces: {str(e)}")
+        raise Http404("File not found.")
+
+    logger.debug(f"Streaming file {file_key}, range {params.get('Range', 'full')}, length {s3_response.get('ContentLength', 'unknown')}")
+    response = StreamingHttpResponse(_stream(s3_response['Body']), content_type=content_type_for(file_key))
+    if s3_response.get('ContentRange'):
+        response.status_code = 206
+        response['Content-Range'] = s3_response['ContentRange']
+    response['Content-Length'] = str(s3_response['ContentLength'])
+    response['Content-Disposition'] = content_disposition_for(file_key)
+    response['Accept-Ranges'] = 'bytes'
+    if s3_response.get('ETag'):
+        response['ETag'] = s3_response['ETag']
+    # Browsers may keep a copy but must revalidate it with If-None-Match before reuse
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def download_mode():
+    """
+    'redirect' sends downloads straight to S3 through presigned URLs; 'stream' proxies the bytes.
+    """
+    return getattr(settings, 'FILE_DOWNLOAD_MODE', 'stream')
+
+
+def presigned_url(file_key):
+    """
+    Return a presigned GET URL for an object in the media bucket, valid for PRESIGNED_URL_EXPIRY
+    seconds. URLs are cached per object and reused for most of that window.
+    """
+    expires = getattr(settings, 'PRESIGNED_URL_EXPIRY', 900)
+    cache_key = f"presigned:{hashlib.sha256(file_key.encode()).hexdigest()}"
+    url = cache.get(cache_key)
+    if url is None:
+        url = get_s3_client().generate_presigned_url(
+            'get_object',
+            Params={
+                'Bucket': settings.AWS_STORAGE_BUCKET_NAME,
+                'Key': file_key,
+                'ResponseContentType': content_type_for(file_key),
+                'ResponseContentDisposition': content_disposition_for(file_key),
+            },
+            ExpiresIn=expires,
+        )
+        cache.set(cache_key, url, int(expires * PRESIGNED_URL_REUSE))
+    return url
+
+
+def file_response(request, file_key):
+    """
+    Answer a download the caller has already authorised, by redirect or by streaming per download_mode().
+    """
+    if download_mode() == 'redirect':
+        response = HttpResponseRedirect(presigned_url(file_key))
+        response['Cache-Control'] = 'private, no-store'
+        return response
+    return s3_file_response(request, file_key)
+
+
+def learner_file_url(kind, object_id):
+    return reverse('qualifications:download_file', args=[kind, object_id])
+
+
+def _assigned_to(user_business, roles, learner_user_id, qualification_id):
+    """
+    True if the learner is assigned to `user_business` as their assessor, IQA or EQA, in a role
+    it holds on the qualification.
+    """
+    assignment = Q(pk__in=[])
+    if ASSESSOR in roles:
+        assignment |= Q(assessor=user_business)
+    if IQA_ROLE in roles:
+        assignment |= Q(iqa=user_business)
+    if EQA_ROLE in roles:
+        assignment |= Q(eqas__user=user_business)
+    return Learner.objects.filter(
+        assignment, user_id=learner_user_id, qualification_id=qualification_id
+    ).exists()
+
+
+def learner_file(request, kind, object_id):
+    """
+    Return the storage key of a learner's evidence file, workbook or document if the requesting
+    UserBusiness may read it, else raise Http404.
+
+    The owning learner, the assessor, IQA and EQAs the learner is assigned to and admins of the
+    qualification's business have access. Costs one query on top of the cached role map, plus
+    one to check the assignment of assessors, IQAs and EQAs.
+    """
+    if kind not in LEARNER_FILES or request.user_business is None:
+        raise Http404("File not found.")
+    model, file_field, owner_path, qualification_path = LEARNER_FILES[kind]
+    row = model.objects.filter(id=object_id).values_list(
+        file_field, owner_path, qualification_path, f'{qualification_path}__business'
+    ).first()
+    if row is None or not row[0]:
+        raise Http404("File not found.")
+    file_key, owner_id, qualification_id, business_id = row
+    user_business = request.user_business
+    roles = request.roles.roles_for(qualification_id) & {ASSESSOR, IQA_ROLE, EQA_ROLE}
+    allowed = (
+        owner_id == user_business.id
+        or (user_business.user_type == 'admin' and business_id == user_business.business_id)
+        or (bool(roles) and _assigned_to(user_business, roles, owner_id, qualification_id))
+    )
+    if not allowed:
+        logger.warning(f"Denied {kind} file {object_id} to {user_business.user.email}")
+        raise Http404("You do not have permission to access this file.")
+    return file_key
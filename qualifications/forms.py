@@ -131,7 +131,8 @@ class WorkbookSubmissionForm(forms.Form):
 
     def clean_workbook_file(self):
         file = self.cleaned_data.get('workbook_file')
-        if not file:
+        # A workbook uploaded straight to storage is posted as a token; the view verifies it
+        if not file and not self.data.get('workbook_upload'):
             raise forms.ValidationError("A workbook file is required.")
         return file
 
@@ -653,7 +654,8 @@ class EvidenceSubmissionForm(forms.Form):
 
     def clean_evidence_files(self):
         files = self.files.getlist('evidence_files')
-        if not files and not self.cleaned_data.get('evidence_detail'):
+        uploads = self.data.getlist('evidence_uploads') if hasattr(self.data, 'getlist') else []
+        if not files and not uploads and not self.cleaned_data.get('evidence_detail'):
             raise forms.ValidationError("You must provide either evidence details or at least one file.")
         return files
 
@@ -0,0 +1,128 @@
+import logging
+from django.urls import reverse
+from qualifications.file_serving import learner_file_url
+from qualifications.models import EvidenceSubmission, WorkbookSubmission, Feedback, Sampling
+from qualifications.structure import load_qualification_tree, qualification_structure
+
+logger = logging.getLogger('qualifications')
+
+
+def latest_evidence_by_ac(learner_user, qualification):
+    """
+    Return {ac_id: newest EvidenceSubmission} for every AC the learner has submitted against.
+    """
+    return {
+        submission.assessment_criterion_id: submission
+        for submission in EvidenceSubmission.objects.latest_per_ac(learner_user, qualification)
+    }
+
+
+def latest_workbook_by_lo(learner_user, qualification):
+    """
+    Return {lo_id: newest WorkbookSubmission} for every LO the learner has uploaded a workbook to.
+    """
+    latest = {}
+    workbooks = WorkbookSubmission.objects.filter(
+        user=learner_user,
+        learning_outcome__unit__qualification=qualification
+    ).order_by('-submitted_at')
+    for workbook in workbooks:
+        latest.setdefault(workbook.learning_outcome_id, workbook)
+    return latest
+
+
+def lo_ids_with_feedback(learner_user, qualification):
+    """
+    Return the set of LO ids where any of the learner's evidence has assessor feedback.
+    """
+    return set(
+        Feedback.objects.filter(
+            evidence_submission__user=learner_user,
+            evidence_submission__assessment_criterion__learning_outcome__unit__qualification=qualification
+        ).values_list('evidence_submission__assessment_criterion__learning_outcome', flat=True).distinct()
+    )
+
+
+def latest_sampling_outcome_by_unit(learner_user, qualification):
+    """
+    Return {unit_id: outcome of the newest Sampling} for units where the learner's evidence was sampled.
+    """
+    latest = {}
+    samplings = Sampling.objects.filter(
+        evidence_submission__user=learner_user,
+        evidence_submission__assessment_criterion__learning_outcome__unit__qualification=qualification
+    ).order_by('-created_at').values_list('evidence_submission__assessment_criterion__learning_outcome__unit', 'outcome')
+    for unit_id, outcome in samplings:
+        latest.setdefault(unit_id, outcome)
+    return latest
+
+
+def latest_feedback_by_submission(submissions):
+    """
+    Return {submission_id: newest Feedback} for the given evidence submissions in one query.
+    """
+    latest = {}
+    feedbacks = Feedback.objects.filter(evidence_submission__in=submissions).order_by('-created_at')
+    for feedback in feedbacks:
+        latest.setdefault(feedback.evidence_submission_id, feedback)
+    return latest
+
+
+def build_assessor_grid(learner, qualification):
+    """
+    Build the assessor review grid for one learner on one qualification in a constant number of
+    queries. Returns (structured_data, latest_submissions) where latest_submissions is the
+    {ac_id: newest EvidenceSubmission} map the grid was built from.
+    """
+    learner_user = learner.user
+    units = qualification_structure(qualification).units
+    latest_submissions = latest_evidence_by_ac(learner_user, qualification)
+    latest_workbooks = latest_workbook_by_lo(learner_user, qualification)
+    sampling_outcomes = latest_sampling_outcome_by_unit(learner_user, qualification)
+
+    latest_by_lo = {}
+    for unit in units:
+        for lo in unit.learning_outcomes:
+            submissions = [latest_submissions[ac.id] for ac in lo.assessment_criteria if ac.id in latest_submissions]
+            if submissions:
+                latest_by_lo[lo.id] = max(submissions, key=lambda submission: submission.submitted_at)
+    latest_feedbacks = latest_feedback_by_submission(list(latest_by_lo.values()))
+
+    structured_data = []
+    for unit in units:
+        unit_data = {
+            'id': str(unit.id),
+            'title': unit.unit_title,
+            'number': unit.unit_number,
+            'learning_outcomes': [],
+            'has_iqa_feedback': unit.id in sampling_outcomes,
+            'is_non_conformance': sampling_outcomes.get(unit.id) == 'NON_CONFORMANCE'
+        }
+        for lo in unit.learning_outcomes:
+            latest_submission = latest_by_lo.get(lo.id)
+            workbook_submission = latest_workbooks.get(lo.id)
+            lo_data = {
+                'detail': lo.lo_detail,
+                'id': str(lo.id),
+                'assessment_criteria': [],
+                'can_provide_feedback': False,
+                'latest_feedback': latest_feedbacks.get(latest_submission.id) if latest_submission else None,
+                'workbook_url': learner_file_url('workbook', workbook_submission.id) if workbook_submission and workbook_submission.workbook_file else None
+            }
+            for ac in lo.assessment_criteria:
+                submission = latest_submissions.get(ac.id)
+                status = submission.status if submission else 'Not Submitted'
+                if status == 'REJECTED':
+                    status = 'Resubmission Required'
+                lo_data['assessment_criteria'].append({
+                    'detail': ac.ac_detail,
+                    'id': str(ac.id),
+                    'status': status,
+                    'submission_id': submission.id if submission else None,
+                    'evidence_url': reverse('qualifications:learner_evidence', args=[str(qualification.id), str(learner.id), str(ac.id)]) if submission else None
+                })
+                if submission:
+                    lo_data['can_provide_feedback'] = True
+            unit_data['learning_outcomes'].append(lo_data)
+        structured_data.append(unit_data)
+    return structured_data, latest_submissions
@@ -0,0 +1,14 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from qualifications.chunked_uploads import discard_stale_uploads
+
+class Command(BaseCommand):
+    help = 'Delete chunked uploads abandoned before completion, with their stored chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-hours', type=float, default=48,
+                            help='Hours since an upload last received a chunk before it counts as abandoned')
+
+    def handle(self, *args, **options):
+        count = discard_stale_uploads(timedelta(hours=options['max_age_hours']))
+        self.stdout.write(self.style.SUCCESS(f'Discarded {count} abandoned uploads'))
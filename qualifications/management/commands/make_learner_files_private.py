@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from qualifications.file_serving import LEARNER_FILES, get_s3_client
+
+class Command(BaseCommand):
+    help = 'Set a private ACL on every learner file already in the media bucket (evidence, workbooks, documents)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Count the objects that would be changed without changing them')
+
+    def handle(self, *args, **options):
+        client = get_s3_client()
+        paginator = client.get_paginator('list_objects_v2')
+        total = 0
+        for model, file_field, _, _ in LEARNER_FILES.values():
+            # Top directory of the field's upload_to, e.g. 'evidence/'; direct and chunked uploads land under it too
+            prefix = model._meta.get_field(file_field).upload_to.split('/')[0] + '/'
+            count = 0
+            for page in paginator.paginate(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Prefix=prefix):
+                for item in page.get('Contents', []):
+                    if not options['dry_run']:
+                        client.put_object_acl(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=item['Key'], ACL='private')
+                    count += 1
+            self.stdout.write(f'{prefix}: {count} objects')
+            total += count
+        verb = 'Would make' if options['dry_run'] else 'Made'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {total} learner files private'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from qualifications.models import Qual, Learner
+from qualifications.progress import rebuild_learner_progress
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized LearnerProgress table from evidence submissions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--qualification', action='append', dest='qualifications', default=[],
+                            help='Only rebuild learners of this qualification id (repeatable)')
+
+    def handle(self, *args, **options):
+        qualifications = Qual.objects.all()
+        if options['qualifications']:
+            qualifications = qualifications.filter(id__in=options['qualifications'])
+
+        total = 0
+        for qualification in qualifications.iterator():
+            learners = Learner.objects.filter(qualification=qualification)
+            with transaction.atomic():
+                total += len(rebuild_learner_progress(learners))
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt progress for {total} learners'))
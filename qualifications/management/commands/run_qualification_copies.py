@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from qualifications.copy_jobs import run_pending
+
+class Command(BaseCommand):
+    help = 'Run queued jobs that copy qualifications into other businesses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Run the jobs queued now and exit instead of polling')
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help='Seconds to sleep when no job is queued')
+
+    def handle(self, *args, **options):
+        total_succeeded = total_failed = 0
+        while True:
+            succeeded, failed = run_pending()
+            total_succeeded += succeeded
+            total_failed += failed
+            if succeeded or failed:
+                self.stdout.write(f'Ran {succeeded + failed} copy jobs, {failed} failed')
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS(f'Copy jobs finished: {total_succeeded} succeeded, {total_failed} failed'))
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from AssessEEZ.email_queue import drain
+
+class Command(BaseCommand):
+    help = 'Send emails waiting in the outbox, retrying failures with exponential backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Drain what is due now and exit instead of polling')
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='Rows claimed per round')
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Emails sent in parallel within a batch')
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help='Seconds to sleep when nothing is due')
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = drain(options['batch_size'], options['concurrency'])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f'Sent {sent}, failed {failed}')
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS(f'Outbox drained: {total_sent} sent, {total_failed} failed'))
@@ -0,0 +1,225 @@
+import base64
+import logging
+import uuid
+from datetime import datetime
+from django.core.cache import cache
+from django.db.models import F, Prefetch, Q, Exists, OuterRef, Case, When, Value, IntegerField, CharField
+from django.db.models.functions import Greatest
+from users.models import UserBusiness
+from qualifications.models import Learner, Assessor, IQA, EQA, MessageRecipient, Thread, ThreadParticipant
+from qualifications.roles import LEARNER, ASSESSOR, IQA_ROLE, EQA_ROLE
+
+logger = logging.getLogger('qualifications')
+
+UNREAD_COUNT_TIMEOUT = 30
+THREAD_PAGE_SIZE = 25
+
+# Which ThreadParticipant timestamp/message pair orders each mailbox
+MAILBOXES = {
+    'inbox': ('last_received_at', 'last_received_message'),
+    'sent': ('last_sent_at', 'last_sent_message'),
+}
+
+
+def _unread_count_key(user_business_id):
+    return f"messages:unread:{user_business_id}"
+
+
+def unread_message_count(user_business):
+    """
+    Return the number of unread messages addressed to a UserBusiness.
+
+    Served from a short-lived cache; a miss is a single count on the (recipient, is_read) index.
+    """
+    if user_business is None:
+        return 0
+    key = _unread_count_key(user_business.pk)
+    count = cache.get(key)
+    if count is None:
+        count = MessageRecipient.objects.filter(recipient=user_business, is_read=False).count()
+        cache.set(key, count, UNREAD_COUNT_TIMEOUT)
+    return count
+
+
+def invalidate_unread_count(user_business_id):
+    """
+    Drop the cached unread count. Called by the MessageRecipient signal handlers; call it directly
+    after queryset.update() calls that change is_read, since those send no signals.
+    """
+    cache.delete(_unread_count_key(user_business_id))
+
+
+def start_thread(business, subject, qualification=None):
+    return Thread.objects.create(business=business, subject=subject, qualification=qualification)
+
+
+def participant_thread(user_business, thread_id):
+    """
+    Return the thread with the given id if the UserBusiness takes part in it, otherwise None.
+    """
+    return Thread.objects.filter(id=thread_id, participants__user_business=user_business).first()
+
+
+def deliver_message(message, recipients):
+    """
+    Create the MessageRecipient rows for a freshly created message in one insert and bring its
+    thread and participant rows up to date. Call inside the transaction that created the message.
+    """
+    thread = message.thread
+    recipient_ids = {recipient.pk for recipient in recipients}
+    MessageRecipient.objects.bulk_create(
+        [MessageRecipient(message=message, recipient_id=user_business_id) for user_business_id in recipient_ids]
+    )
+    Thread.objects.filter(id=thread.id).update(last_message_at=message.sent_at)
+    ThreadParticipant.objects.bulk_create(
+        [ThreadParticipant(thread=thread, user_business_id=user_business_id) for user_business_id in recipient_ids | {message.sender_id}],
+        ignore_conflicts=True,
+    )
+    ThreadParticipant.objects.filter(thread=thread, user_business=message.sender_id).update(
+        last_sent_message=message, last_sent_at=message.sent_at
+    )
+    ThreadParticipant.objects.filter(thread=thread, user_business__in=recipient_ids).update(
+        unread_count=F('unread_count') + 1, last_received_message=message, last_received_at=message.sent_at
+    )
+    # bulk_create sends no post_save, so the signal handler cannot do this
+    cache.delete_many([_unread_count_key(user_business_id) for user_business_id in recipient_ids])
+    logger.debug(f"Delivered message {message.id} in thread {thread.id} to {len(recipient_ids)} recipients")
+
+
+def mark_thread_read(thread, user_business, read_at):
+    """
+    Mark every message of the thread addressed to the UserBusiness as read.
+    """
+    MessageRecipient.objects.filter(
+        message__thread=thread, recipient=user_business, is_read=False
+    ).update(is_read=True, read_at=read_at)
+    ThreadParticipant.objects.filter(thread=thread, user_business=user_business).update(unread_count=0)
+    invalidate_unread_count(user_business.pk)
+
+
+def mark_recipient_read(message_recipient, read_at):
+    """
+    Mark a single delivered message as read and take it off its thread's unread count.
+    """
+    message_recipient.is_read = True
+    message_recipient.read_at = read_at
+    message_recipient.save()
+    ThreadParticipant.objects.filter(
+        thread=message_recipient.message.thread_id, user_business=message_recipient.recipient_id
+    ).update(unread_count=Greatest(F('unread_count') - 1, 0))
+
+
+def encode_cursor(timestamp, row_id):
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{row_id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Return (timestamp, id) from a cursor, or None if it is missing or malformed.
+    """
+    if not cursor:
+        return None
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(timestamp), uuid.UUID(row_id)
+    except (ValueError, UnicodeDecodeError):
+        logger.warning(f"Ignoring malformed mailbox cursor {cursor!r}")
+        return None
+
+
+def mailbox_page(user_business, mailbox, cursor=None, page_size=THREAD_PAGE_SIZE):
+    """
+    Return one page of the UserBusiness's inbox or sent threads, newest first, as
+    (participants, next_cursor).
+
+    Pages are keyed on (timestamp, id) rather than offsets, so every page is a bounded scan of
+    the participant index however much history the user has. next_cursor is None on the last page.
+    """
+    time_field, message_field = MAILBOXES[mailbox]
+    queryset = ThreadParticipant.objects.filter(
+        user_business=user_business, **{f'{time_field}__isnull': False}
+    ).select_related('thread', f'{message_field}__sender__user')
+    if mailbox == 'sent':
+        queryset = queryset.prefetch_related(
+            Prefetch(f'{message_field}__recipients', queryset=MessageRecipient.objects.select_related('recipient__user'))
+        )
+    position = decode_cursor(cursor)
+    if position:
+        timestamp, row_id = position
+        queryset = queryset.filter(
+            Q(**{f'{time_field}__lt': timestamp}) | Q(**{time_field: timestamp, 'id__lt': row_id})
+        )
+    rows = list(queryset.order_by(f'-{time_field}', '-id')[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, time_field), last.id)
+    return rows, next_cursor
+
+
+def recipients_for_qualification(user_business, qualification_id, role_map):
+    """
+    Return the people `user_business` may message about a qualification, each annotated with
+    `role_label`, in a single query.
+
+    Who is listed depends on the sender's role: admins see everyone on the qualification, EQAs
+    see admins, IQAs and assessors see their learners and those learners' assessor/IQA,
+    learners see their own assessor and IQA; everyone except admins and EQAs also sees admins.
+    """
+    qualification_learners = Learner.objects.filter(qualification_id=qualification_id)
+
+    def holds(model):
+        return Exists(model.objects.filter(user=OuterRef('pk'), qualification_id=qualification_id))
+
+    queryset = UserBusiness.objects.filter(business_id=user_business.business_id).annotate(
+        is_learner=holds(Learner),
+        is_assessor=holds(Assessor),
+        is_iqa=holds(IQA),
+        is_eqa=holds(EQA),
+    )
+    is_admin = Q(user_type='admin')
+    if user_business.user_type == 'admin':
+        audience = Q(is_learner=True) | Q(is_assessor=True) | Q(is_iqa=True) | Q(is_eqa=True)
+        queryset = queryset.exclude(pk=user_business.pk)
+    elif role_map.has_role(EQA_ROLE, qualification_id):
+        audience = is_admin
+    elif role_map.has_role(IQA_ROLE, qualification_id):
+        mine = qualification_learners.filter(iqa=user_business)
+        audience = (
+            Exists(mine.filter(user=OuterRef('pk')))
+            | Exists(mine.filter(assessor=OuterRef('pk')))
+            | is_admin
+        )
+    elif role_map.has_role(LEARNER, qualification_id):
+        mine = qualification_learners.filter(user=user_business)
+        audience = Exists(mine.filter(assessor=OuterRef('pk'))) | Exists(mine.filter(iqa=OuterRef('pk'))) | is_admin
+    elif role_map.has_role(ASSESSOR, qualification_id):
+        mine = qualification_learners.filter(assessor=user_business)
+        audience = (
+            Exists(mine.filter(user=OuterRef('pk')))
+            | Exists(mine.filter(iqa=OuterRef('pk')))
+            | is_admin
+        )
+    else:
+        return []
+
+    return list(queryset.filter(audience).annotate(
+        role_label=Case(
+            When(user_type='admin', then=Value('Admin')),
+            When(is_learner=True, then=Value('Learner')),
+            When(is_assessor=True, then=Value('Assessor')),
+            When(is_iqa=True, then=Value('IQA')),
+            When(is_eqa=True, then=Value('EQA')),
+            default=Value('User'),
+            output_field=CharField(),
+        ),
+        role_rank=Case(
+            When(is_assessor=True, then=Value(0)),
+            When(is_learner=True, then=Value(1)),
+            When(is_iqa=True, then=Value(2)),
+            When(is_eqa=True, then=Value(3)),
+            default=Value(4),
+            output_field=IntegerField(),
+        ),
+    ).select_related('user').order_by('role_rank', 'user__full_name', 'user__email'))
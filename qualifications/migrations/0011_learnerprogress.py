@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:35
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qualifications', '0010_workbooksubmission'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LearnerProgress',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('accepted_ac', models.PositiveIntegerField(default=0, verbose_name='Accepted ACs')),
+                ('submitted_ac', models.PositiveIntegerField(default=0, verbose_name='Submitted ACs')),
+                ('pending_ac', models.PositiveIntegerField(default=0, verbose_name='ACs Awaiting Assessment')),
+                ('units_accepted', models.PositiveIntegerField(default=0, verbose_name='Units Fully Accepted')),
+                ('last_activity_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('learner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='progress', to='qualifications.learner')),
+            ],
+            options={
+                'verbose_name': 'Learner Progress',
+                'verbose_name_plural': 'Learner Progress',
+                'indexes': [models.Index(fields=['last_activity_at'], name='idx_progress_last_activity')],
+            },
+        ),
+    ]
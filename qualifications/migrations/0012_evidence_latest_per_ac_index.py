@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qualifications', '0011_learnerprogress'),
+        ('users', '0004_remove_userbusiness_password'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='evidencesubmission',
+            index=models.Index(fields=['user', 'assessment_criterion', '-submitted_at'], name='idx_evidence_latest_per_ac'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qualifications', '0012_evidence_latest_per_ac_index'),
+        ('users', '0004_remove_userbusiness_password'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='messagerecipient',
+            index=models.Index(fields=['recipient', 'is_read'], name='idx_msgrecipient_unread'),
+        ),
+    ]
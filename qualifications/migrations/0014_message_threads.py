@@ -0,0 +1,89 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:44
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qualifications', '0013_messagerecipient_unread_index'),
+        ('users', '0004_remove_userbusiness_password'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThreadParticipant',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('last_received_at', models.DateTimeField(blank=True, null=True)),
+                ('last_sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Thread Participant',
+                'verbose_name_plural': 'Thread Participants',
+            },
+        ),
+        migrations.CreateModel(
+            name='Thread',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('subject', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='message_threads', to='users.business')),
+                ('qualification', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='qualifications.qual')),
+            ],
+            options={
+                'verbose_name': 'Message Thread',
+                'verbose_name_plural': 'Message Threads',
+            },
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='thread',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='qualifications.thread'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['thread', 'sent_at'], name='idx_message_thread_sent'),
+        ),
+        migrations.AddField(
+            model_name='threadparticipant',
+            name='last_received_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='qualifications.message'),
+        ),
+        migrations.AddField(
+            model_name='threadparticipant',
+            name='last_sent_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='qualifications.message'),
+        ),
+        migrations.AddField(
+            model_name='threadparticipant',
+            name='thread',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='qualifications.thread'),
+        ),
+        migrations.AddField(
+            model_name='threadparticipant',
+            name='user_business',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='thread_participations', to='users.userbusiness'),
+        ),
+        migrations.AddIndex(
+            model_name='thread',
+            index=models.Index(fields=['business', '-last_message_at'], name='idx_thread_business_last'),
+        ),
+        migrations.AddIndex(
+            model_name='threadparticipant',
+            index=models.Index(fields=['user_business', '-last_received_at'], name='idx_participant_inbox'),
+        ),
+        migrations.AddIndex(
+            model_name='threadparticipant',
+            index=models.Index(fields=['user_business', '-last_sent_at'], name='idx_participant_sent'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='threadparticipant',
+            unique_together={('thread', 'user_business')},
+        ),
+    ]
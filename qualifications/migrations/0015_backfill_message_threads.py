@@ -0,0 +1,72 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:44
+
+from django.db import migrations
+
+
+def backfill_threads(apps, schema_editor):
+    """
+    Group existing messages into threads the way the inbox used to: by subject, now kept
+    separate per business. Participant rows get the newest received/sent message and the
+    number of unread messages each UserBusiness has in the thread.
+    """
+    Message = apps.get_model('qualifications', 'Message')
+    MessageRecipient = apps.get_model('qualifications', 'MessageRecipient')
+    Thread = apps.get_model('qualifications', 'Thread')
+    ThreadParticipant = apps.get_model('qualifications', 'ThreadParticipant')
+
+    threads = {}
+    message_threads = {}
+    for message in Message.objects.filter(thread__isnull=True).select_related('sender').order_by('sent_at').iterator():
+        key = (message.sender.business_id, message.subject)
+        thread = threads.get(key)
+        if thread is None:
+            thread = Thread.objects.create(
+                business_id=message.sender.business_id,
+                subject=message.subject,
+                qualification_id=message.qualification_id,
+            )
+            threads[key] = thread
+        thread.last_message_at = message.sent_at
+        message_threads.setdefault(thread.id, []).append(message.id)
+
+    for thread in threads.values():
+        Thread.objects.filter(id=thread.id).update(last_message_at=thread.last_message_at)
+    for thread_id, message_ids in message_threads.items():
+        for start in range(0, len(message_ids), 500):
+            Message.objects.filter(id__in=message_ids[start:start + 500]).update(thread_id=thread_id)
+
+    participants = {}
+
+    def participant(thread_id, user_business_id):
+        key = (thread_id, user_business_id)
+        if key not in participants:
+            participants[key] = ThreadParticipant(thread_id=thread_id, user_business_id=user_business_id)
+        return participants[key]
+
+    for message in Message.objects.filter(thread__isnull=False).order_by('sent_at').iterator():
+        row = participant(message.thread_id, message.sender_id)
+        row.last_sent_message_id = message.id
+        row.last_sent_at = message.sent_at
+
+    recipients = MessageRecipient.objects.filter(message__thread__isnull=False).values_list(
+        'message__thread', 'recipient', 'message', 'message__sent_at', 'is_read'
+    ).order_by('message__sent_at')
+    for thread_id, recipient_id, message_id, sent_at, is_read in recipients.iterator():
+        row = participant(thread_id, recipient_id)
+        row.last_received_message_id = message_id
+        row.last_received_at = sent_at
+        if not is_read:
+            row.unread_count += 1
+
+    ThreadParticipant.objects.bulk_create(participants.values(), batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qualifications', '0014_message_threads'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_threads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qualifications', '0015_backfill_message_threads'),
+        ('users', '0004_remove_userbusiness_password'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='threadparticipant',
+            name='idx_participant_inbox',
+        ),
+        migrations.RemoveIndex(
+            model_name='threadparticipant',
+            name='idx_participant_sent',
+        ),
+        migrations.AddIndex(
+            model_name='threadparticipant',
+            index=models.Index(fields=['user_business', '-last_received_at', '-id'], name='idx_participant_inbox'),
+        ),
+        migrations.AddIndex(
+            model_name='threadparticipant',
+            index=models.Index(fields=['user_business', '-last_sent_at', '-id'], name='idx_participant_sent'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qualifications', '0017_outboxemail'),
+        ('users', '0004_remove_userbusiness_password'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='digest_pending',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'digest_pending'], name='idx_notification_digest'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:29
+
+import AssessEEZ.storage_backends
+import qualifications.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qualifications', '0020_qualification_copy_jobs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='evidencefile',
+            name='evidence_file',
+            field=models.FileField(storage=AssessEEZ.storage_backends.PrivateMediaStorage(), upload_to='evidence/%Y/%m/%d/', validators=[qualifications.models.validate_file]),
+        ),
+        migrations.AlterField(
+            model_name='learnerdocsbyassessor',
+            name='file',
+            field=models.FileField(storage=AssessEEZ.storage_backends.PrivateMediaStorage(), upload_to='learner_docs/%Y/%m/%d/'),
+        ),
+        migrations.AlterField(
+            model_name='learnerdocumentsubmission',
+            name='document_file',
+            field=models.FileField(storage=AssessEEZ.storage_backends.PrivateMediaStorage(), upload_to='learner_documents/%Y/%m/%d/', validators=[qualifications.models.validate_file]),
+        ),
+        migrations.AlterField(
+            model_name='workbooksubmission',
+            name='workbook_file',
+            field=models.FileField(blank=True, null=True, storage=AssessEEZ.storage_backends.PrivateMediaStorage(), upload_to='workbooks/%Y/%m/%d/', validators=[qualifications.models.validate_file]),
+        ),
+    ]
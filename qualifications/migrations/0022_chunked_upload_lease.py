@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qualifications', '0021_private_learner_files'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='assembling_since',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qualifications', '0022_chunked_upload_lease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaimedUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('claimed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Claimed Upload',
+                'verbose_name_plural': 'Claimed Uploads',
+            },
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, connections, transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from django.core.exceptions import ValidationError
 from users.models import Business, UserBusiness
 import uuid
@@ -7,12 +9,16 @@ from django.utils import timezone
 from qualifications.utils import ROLE_TYPES
 from django.conf import settings
 from storages.backends.s3boto3 import S3Boto3Storage
+from AssessEEZ.storage_backends import PrivateMediaStorage
 from django.core.validators import RegexValidator
 # Custom validator for file size and type
 
+MAX_UPLOAD_MB = 1000  # Max file size in MB
+ALLOWED_UPLOAD_EXTENSIONS = ['.pdf', '.jpg', '.jpeg', '.png', '.mp4', '.doc', '.docx', '.ppt', '.pptx', '.zip', '.xls', '.xlsx']
+
 def validate_file(fieldfile_obj):
-    max_size_mb = 1000  # Max file size in MB
-    allowed_extensions = ['.pdf', '.jpg', '.jpeg', '.png', '.mp4', '.doc', '.docx', '.ppt', '.pptx', '.zip', '.xls', '.xlsx']
+    max_size_mb = MAX_UPLOAD_MB
+    allowed_extensions = ALLOWED_UPLOAD_EXTENSIONS
     
     file_size = fieldfile_obj.size
     if file_size > max_size_mb * 1024 * 1024:
@@ -23,6 +29,9 @@ def validate_file(fieldfile_obj):
         raise ValidationError(f"File type not allowed. Allowed types: {', '.join(allowed_extensions)}.")
     pass
 
+# Businesses written per transaction by Qual.copy_to_businesses
+COPY_BATCH_SIZE = 10
+
 class Qual(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     qualification_title = models.CharField(max_length=200)
@@ -49,48 +58,67 @@ class Qual(models.Model):
         Create a copy of this qualification for a new business, including related units, LOs, and ACs.
         Returns the new Qual instance.
         """
-        # Create a new Qual instance with the same details but a different business
-        new_qual = Qual(
-            qualification_title=self.qualification_title,
-            qualification_number=self.qualification_number,
-            awarding_body=self.awarding_body,
-            business=new_business
-        )
-        new_qual.full_clean()  # Validate the new instance
-        new_qual.save()
-
-        # Copy related Units
-        for unit in self.units.all():
-            new_unit = Unit(
-                unit_title=unit.unit_title,
-                unit_number=unit.unit_number,
-                qualification=new_qual,
-                serial_number=unit.serial_number
+        copies = self.copy_to_businesses([new_business])
+        if new_business.business_id not in copies:
+            raise ValidationError(
+                f"Qualification {self.qualification_number} already exists for business {new_business.business_id}."
             )
-            new_unit.full_clean()
-            new_unit.save()
-
-            # Copy related Learning Outcomes (LOs)
-            for lo in unit.learning_outcomes.all():
-                new_lo = LO(
-                    lo_detail=lo.lo_detail,
-                    unit=new_unit,
-                    serial_number=lo.serial_number
+        return copies[new_business.business_id]
+
+    def copy_to_businesses(self, businesses, progress=None):
+        """
+        Copy this qualification with its units, LOs and ACs into every business in `businesses`
+        that does not already have its qualification number. Returns {business_id: new Qual}.
+
+        The source tree is read once. Copies are built in memory with their UUIDs assigned up
+        front, so each batch of COPY_BATCH_SIZE businesses is written with one bulk insert per level
+        in its own transaction. `progress(done, total)` is called after each batch.
+        """
+        businesses = list(businesses)
+        existing = set(Qual.objects.filter(
+            qualification_number=self.qualification_number, business__in=businesses
+        ).values_list('business_id', flat=True))
+        targets = [business for business in businesses if business.business_id not in existing]
+        units = list(self.units.order_by('serial_number').prefetch_related('learning_outcomes__assessment_criteria'))
+
+        copies = {}
+        for start in range(0, len(targets), COPY_BATCH_SIZE):
+            rows = {Qual: [], Unit: [], LO: [], AC: []}
+            for business in targets[start:start + COPY_BATCH_SIZE]:
+                new_qual = Qual(
+                    id=uuid.uuid4(),
+                    qualification_title=self.qualification_title,
+                    qualification_number=self.qualification_number,
+                    awarding_body=self.awarding_body,
+                    business=business
                 )
-                new_lo.full_clean()
-                new_lo.save()
-
-                # Copy related Assessment Criteria (ACs)
-                for ac in lo.assessment_criteria.all():
-                    new_ac = AC(
-                        ac_detail=ac.ac_detail,
-                        learning_outcome=new_lo,
-                        serial_number=ac.serial_number
+                rows[Qual].append(new_qual)
+                for unit in units:
+                    new_unit = Unit(
+                        id=uuid.uuid4(),
+                        unit_title=unit.unit_title,
+                        unit_number=unit.unit_number,
+                        qualification=new_qual,
+                        serial_number=unit.serial_number
                     )
-                    new_ac.full_clean()
-                    new_ac.save()
+                    rows[Unit].append(new_unit)
+                    for lo in unit.learning_outcomes.all():
+                        new_lo = LO(id=uuid.uuid4(), lo_detail=lo.lo_detail, unit=new_unit, serial_number=lo.serial_number)
+                        rows[LO].append(new_lo)
+                        rows[AC].extend(
+                            AC(id=uuid.uuid4(), ac_detail=ac.ac_detail, learning_outcome=new_lo, serial_number=ac.serial_number)
+                            for ac in lo.assessment_criteria.all()
+                        )
+            with transaction.atomic():
+                for model in (Qual, Unit, LO, AC):
+                    model.objects.bulk_create(rows[model])
+            copies.update((new_qual.business_id, new_qual) for new_qual in rows[Qual])
+            if progress:
+                progress(len(existing) + min(start + COPY_BATCH_SIZE, len(targets)), len(businesses))
+        if progress and not targets:
+            progress(len(businesses), len(businesses))
+        return copies
 
-        return new_qual
     class Meta:
         verbose_name = "Qualification"
         verbose_name_plural = "Qualifications"
@@ -182,7 +210,7 @@ class WorkbookSubmission(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(UserBusiness, on_delete=models.CASCADE, related_name='workbook_submissions')
     learning_outcome = models.ForeignKey(LO, on_delete=models.CASCADE, related_name='workbook_submissions')
-    workbook_file = models.FileField(upload_to='workbooks/%Y/%m/%d/', validators=[validate_file], storage=S3Boto3Storage(), null=True, blank=True)
+    workbook_file = models.FileField(upload_to='workbooks/%Y/%m/%d/', validators=[validate_file], storage=PrivateMediaStorage(), null=True, blank=True)
     submitted_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=[('SUBMITTED', 'Submitted'), ('ACCEPTED', 'Accepted'), ('REJECTED', 'Rejected')], default='SUBMITTED')
     assessor = models.ForeignKey(
@@ -220,6 +248,29 @@ class WorkbookSubmission(models.Model):
         ]
 
 
+class EvidenceSubmissionQuerySet(models.QuerySet):
+    def latest_per_ac(self, learner_user=None, qualification=None):
+        """
+        Newest submission for every (learner, AC) pair in one query, optionally narrowed to a
+        learner and/or qualification. Uses DISTINCT ON where the database supports it and a
+        ROW_NUMBER() window otherwise; both are served by idx_evidence_latest_per_ac.
+        """
+        queryset = self
+        if learner_user is not None:
+            queryset = queryset.filter(user=learner_user)
+        if qualification is not None:
+            queryset = queryset.filter(assessment_criterion__learning_outcome__unit__qualification=qualification)
+        if connections[queryset.db].features.can_distinct_on_fields:
+            return queryset.order_by('user', 'assessment_criterion', '-submitted_at').distinct('user', 'assessment_criterion')
+        return queryset.annotate(
+            latest_rank=Window(
+                RowNumber(),
+                partition_by=[F('user'), F('assessment_criterion')],
+                order_by=F('submitted_at').desc()
+            )
+        ).filter(latest_rank=1)
+
+
 class EvidenceSubmission(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(UserBusiness, on_delete=models.CASCADE, related_name='evidence_submissions')
@@ -236,6 +287,8 @@ class EvidenceSubmission(models.Model):
         verbose_name="Assessor"
     )
 
+    objects = EvidenceSubmissionQuerySet.as_manager()
+
     def clean(self):
         try:
             learner = Learner.objects.get(
@@ -259,13 +312,14 @@ class EvidenceSubmission(models.Model):
             models.Index(fields=['user'], name='idx_evidence_user'),
             models.Index(fields=['assessment_criterion'], name='idx_evidence_ac'),
             models.Index(fields=['assessor'], name='idx_evidence_assessor'),  # New index
+            models.Index(fields=['user', 'assessment_criterion', '-submitted_at'], name='idx_evidence_latest_per_ac'),
         ]
 
 
 class EvidenceFile(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     evidence_submission = models.ForeignKey(EvidenceSubmission, on_delete=models.CASCADE, related_name='files')
-    evidence_file = models.FileField(upload_to='evidence/%Y/%m/%d/', validators=[validate_file], storage=S3Boto3Storage())
+    evidence_file = models.FileField(upload_to='evidence/%Y/%m/%d/', validators=[validate_file], storage=PrivateMediaStorage())
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -708,6 +762,30 @@ class Learner(models.Model):
             models.Index(fields=['batch_number'], name='idx_learner_batch_number'),
         ]
 
+class LearnerProgress(models.Model):
+    """
+    Denormalized evidence progress for a learner, refreshed whenever evidence is submitted,
+    accepted or rejected. Rebuild from source data with `manage.py rebuild_learner_progress`.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    learner = models.OneToOneField(Learner, on_delete=models.CASCADE, related_name='progress')
+    accepted_ac = models.PositiveIntegerField(default=0, verbose_name="Accepted ACs")
+    submitted_ac = models.PositiveIntegerField(default=0, verbose_name="Submitted ACs")
+    pending_ac = models.PositiveIntegerField(default=0, verbose_name="ACs Awaiting Assessment")
+    units_accepted = models.PositiveIntegerField(default=0, verbose_name="Units Fully Accepted")
+    last_activity_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Progress for {self.learner_id}: {self.accepted_ac} ACs accepted"
+
+    class Meta:
+        verbose_name = "Learner Progress"
+        verbose_name_plural = "Learner Progress"
+        indexes = [
+            models.Index(fields=['last_activity_at'], name='idx_progress_last_activity'),
+        ]
+
 class Assessor(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(UserBusiness, on_delete=models.CASCADE, related_name='assessor_assignments')
@@ -882,6 +960,8 @@ class Notification(models.Model):
     evidence_submission = models.ForeignKey('EvidenceSubmission', on_delete=models.CASCADE, related_name='notifications', null=True, blank=True)
     message = models.TextField()
     is_read = models.BooleanField(default=False)
+    # Waiting to go out in the recipient's next digest email (NOTIFICATION_DIGEST_WINDOW)
+    digest_pending = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def clean(self):
@@ -907,6 +987,7 @@ class Notification(models.Model):
             models.Index(fields=['user'], name='idx_notification_user'),
             models.Index(fields=['evidence_submission'], name='idx_notification_submission'),
             models.Index(fields=['is_read'], name='idx_notification_is_read'),
+            models.Index(fields=['user', 'digest_pending'], name='idx_notification_digest'),
         ]
 
 class IQAFeedback(models.Model):
@@ -1023,7 +1104,7 @@ class LearnerDocumentSubmission(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     learner = models.ForeignKey(Learner, on_delete=models.CASCADE, related_name='document_submissions')
     document_requirement = models.ForeignKey(DocumentRequirement, on_delete=models.CASCADE, related_name='submissions')
-    document_file = models.FileField(upload_to='learner_documents/%Y/%m/%d/', validators=[validate_file], storage=S3Boto3Storage())
+    document_file = models.FileField(upload_to='learner_documents/%Y/%m/%d/', validators=[validate_file], storage=PrivateMediaStorage())
     submitted_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
     comments = models.TextField(blank=True, null=True)
@@ -1094,7 +1175,7 @@ class LearnerDocsByAssessor(models.Model):
     learner = models.ForeignKey('qualifications.Learner', on_delete=models.CASCADE, related_name='assessor_documents')
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
-    file = models.FileField(upload_to='learner_docs/%Y/%m/%d/', storage=S3Boto3Storage())
+    file = models.FileField(upload_to='learner_docs/%Y/%m/%d/', storage=PrivateMediaStorage())
     uploaded_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.PROTECT,
@@ -1111,8 +1192,59 @@ class LearnerDocsByAssessor(models.Model):
         return f"{self.title} - {self.learner}"
     
 
+class Thread(models.Model):
+    """
+    A conversation. Messages belong to exactly one thread; replies are attached to the thread
+    they answer rather than matched by subject.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    business = models.ForeignKey(Business, on_delete=models.CASCADE, related_name='message_threads')
+    subject = models.CharField(max_length=255)
+    qualification = models.ForeignKey('Qual', on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.subject
+
+    class Meta:
+        verbose_name = "Message Thread"
+        verbose_name_plural = "Message Threads"
+        indexes = [
+            models.Index(fields=['business', '-last_message_at'], name='idx_thread_business_last'),
+        ]
+
+
+class ThreadParticipant(models.Model):
+    """
+    One UserBusiness's view of a thread: how many messages they have not read yet and the
+    newest message they received and sent, so inbox and sent pages are single index scans.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    thread = models.ForeignKey(Thread, on_delete=models.CASCADE, related_name='participants')
+    user_business = models.ForeignKey(UserBusiness, on_delete=models.CASCADE, related_name='thread_participations')
+    unread_count = models.PositiveIntegerField(default=0)
+    last_received_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_received_at = models.DateTimeField(null=True, blank=True)
+    last_sent_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user_business} in {self.thread} ({self.unread_count} unread)"
+
+    class Meta:
+        verbose_name = "Thread Participant"
+        verbose_name_plural = "Thread Participants"
+        unique_together = ['thread', 'user_business']
+        indexes = [
+            models.Index(fields=['user_business', '-last_received_at', '-id'], name='idx_participant_inbox'),
+            models.Index(fields=['user_business', '-last_sent_at', '-id'], name='idx_participant_sent'),
+        ]
+
+
 class Message(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    thread = models.ForeignKey(Thread, on_delete=models.CASCADE, related_name='messages', null=True, blank=True)
     sender = models.ForeignKey(UserBusiness, on_delete=models.CASCADE, related_name='sent_messages')
     subject = models.CharField(max_length=255)
     body = models.TextField()
@@ -1131,6 +1263,9 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['-sent_at']
+        indexes = [
+            models.Index(fields=['thread', 'sent_at'], name='idx_message_thread_sent'),
+        ]
 
 class MessageRecipient(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -1143,4 +1278,149 @@ class MessageRecipient(models.Model):
         return f"{self.message} to {self.recipient} (Read: {self.is_read})"
 
     class Meta:
-        unique_together = ['message', 'recipient']
\ No newline at end of file
+        unique_together = ['message', 'recipient']
+        indexes = [
+            models.Index(fields=['recipient', 'is_read'], name='idx_msgrecipient_unread'),
+        ]
+
+class OutboxEmail(models.Model):
+    """
+    An email waiting to be sent. Rows are written in the same transaction as the change that
+    triggers them and drained by `manage.py send_queued_emails`. `kind` names a send_* helper
+    in AssessEEZ.email_utils and `payload` holds its arguments.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=10,
+        choices=[('PENDING', 'Pending'), ('SENDING', 'Sending'), ('SENT', 'Sent'), ('FAILED', 'Failed')],
+        default='PENDING'
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} ({self.status}, {self.attempts} attempts)"
+
+    class Meta:
+        verbose_name = "Outbox Email"
+        verbose_name_plural = "Outbox Emails"
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='idx_outbox_due'),
+        ]
+
+class ChunkedUpload(models.Model):
+    """
+    A resumable evidence upload sent in fixed-size chunks. Each received chunk is stored in
+    the private media bucket and tracked as a ChunkedUploadPart until the file is assembled
+    into an EvidenceFile.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(UserBusiness, on_delete=models.CASCADE, related_name='chunked_uploads')
+    assessment_criterion = models.ForeignKey(AC, on_delete=models.CASCADE, related_name='chunked_uploads')
+    filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    status = models.CharField(
+        max_length=10,
+        choices=[('UPLOADING', 'Uploading'), ('ASSEMBLING', 'Assembling'), ('COMPLETE', 'Complete')],
+        default='UPLOADING'
+    )
+    evidence_file = models.ForeignKey(EvidenceFile, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    assembling_since = models.DateTimeField(null=True, blank=True)  # lease of the request assembling the file
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def chunk_count(self):
+        return -(-self.total_size // self.chunk_size)
+
+    def expected_chunk_size(self, index):
+        if index == self.chunk_count - 1:
+            return self.total_size - index * self.chunk_size
+        return self.chunk_size
+
+    def __str__(self):
+        return f"{self.filename} by {self.user} ({self.status})"
+
+    class Meta:
+        verbose_name = "Chunked Upload"
+        verbose_name_plural = "Chunked Uploads"
+        indexes = [
+            models.Index(fields=['user', 'status'], name='idx_chunked_upload_user'),
+        ]
+
+class ChunkedUploadPart(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    upload = models.ForeignKey(ChunkedUpload, on_delete=models.CASCADE, related_name='parts')
+    index = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    path = models.CharField(max_length=255)
+    received_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Chunk {self.index} of {self.upload}"
+
+    class Meta:
+        verbose_name = "Chunked Upload Part"
+        verbose_name_plural = "Chunked Upload Parts"
+        unique_together = ['upload', 'index']
+
+
+class ClaimedUpload(models.Model):
+    """
+    A storage key sent straight to the bucket (qualifications.direct_uploads) that a submission
+    has taken. The unique key makes claiming an upload part of the submission's own insert, so
+    one object never ends up behind two rows.
+    """
+    key = models.CharField(max_length=255, unique=True)
+    claimed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.key
+
+    class Meta:
+        verbose_name = "Claimed Upload"
+        verbose_name_plural = "Claimed Uploads"
+
+
+class QualificationCopyJob(models.Model):
+    """
+    A background copy of a qualification into several businesses, queued from the superadmin
+    dashboard and run by `manage.py run_qualification_copies`. `completed` counts the businesses
+    handled so far, so the dashboard can show progress while the job runs.
+    """
+    STATUS_CHOICES = [('PENDING', 'Pending'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    qualification = models.ForeignKey(Qual, on_delete=models.CASCADE, related_name='copy_jobs')
+    businesses = models.ManyToManyField(Business, related_name='+')
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    total = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    copied_to = models.JSONField(default=list, blank=True)
+    last_error = models.TextField(blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def percent_complete(self):
+        return int(self.completed * 100 / self.total) if self.total else 100
+
+    def __str__(self):
+        return f"Copy of {self.qualification} ({self.status}, {self.completed}/{self.total})"
+
+    class Meta:
+        verbose_name = "Qualification Copy Job"
+        verbose_name_plural = "Qualification Copy Jobs"
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='idx_copy_job_status'),
+        ]
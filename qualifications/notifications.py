@@ -0,0 +1,71 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from AssessEEZ.email_queue import enqueue_email, enqueue_email_at, is_scheduled
+from AssessEEZ.email_utils import send_notification_email, send_notification_digest_email, send_document_submission_notification_email
+from qualifications.models import Notification
+from users.models import UserBusiness
+
+logger = logging.getLogger('qualifications')
+
+
+def digest_window():
+    return getattr(settings, 'NOTIFICATION_DIGEST_WINDOW', 0)
+
+
+def queue_notification_email(notification, business_name):
+    """
+    Queue the email for a Notification that was just created.
+
+    With NOTIFICATION_DIGEST_WINDOW set, the notification joins the recipient's pending digest
+    instead, and the first notification of a window schedules one digest email for the end of
+    it. Grading a whole learning outcome then sends the learner one email, not one per AC.
+    """
+    user = notification.user.user
+    if not user.email:
+        raise ValueError("Recipient email is empty")
+    window = digest_window()
+    if not window:
+        enqueue_email(
+            send_notification_email,
+            recipient_email=user.email,
+            learner_name=user.full_name or user.email,
+            business_name=business_name,
+            notification_message=notification.message,
+            notification_date=notification.created_at
+        )
+        return
+    Notification.objects.filter(id=notification.id).update(digest_pending=True)
+    if not is_scheduled(send_notification_digest_email, user_business_id=notification.user_id):
+        enqueue_email_at(
+            timezone.now() + timedelta(seconds=window),
+            send_notification_digest_email,
+            user_business_id=notification.user_id,
+            business_name=business_name
+        )
+        logger.debug(f"Scheduled notification digest for {user.email} in {window}s")
+
+
+def queue_submission_email(learner, business, submission_type):
+    """
+    Queue the new-submission email to the learner's assessor, or to a business admin when the
+    learner has none. Returns the recipient's email, or None if there is nobody to tell.
+    """
+    recipient = learner.assessor or UserBusiness.objects.filter(
+        business=business, user_type='admin'
+    ).select_related('user').first()
+    if recipient is None:
+        logger.warning(f"No assessor or admin for learner {learner.id} for qualification {learner.qualification_id}")
+        return None
+    enqueue_email(
+        send_document_submission_notification_email,
+        assessor_email=recipient.user.email,
+        assessor_name=recipient.user.full_name or recipient.user.email,
+        learner_name=learner.user.user.full_name or learner.user.user.email,
+        qualification_title=learner.qualification.qualification_title,
+        business_name=business.name,
+        business_id=business.business_id,
+        submission_type=submission_type
+    )
+    return recipient.user.email
@@ -0,0 +1,267 @@
+import csv
+import io
+import logging
+import posixpath
+import re
+import shutil
+import tempfile
+import zipfile
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.utils import timezone
+from django.utils.text import slugify
+from qualifications.loaders import latest_evidence_by_ac, latest_workbook_by_lo
+from qualifications.structure import qualification_structure
+from qualifications.models import EvidenceFile, WorkbookSubmission, DocumentRequirement, LearnerDocumentSubmission, LearnerDocsByAssessor
+
+logger = logging.getLogger('qualifications')
+
+# Bytes copied per read while moving a file from storage into the archive
+COPY_CHUNK_SIZE = 64 * 1024
+
+# A prefetched file stays in memory up to this size and spills to a temporary file beyond it
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+MANIFEST_NAME = 'manifest.csv'
+
+# arcname: path inside the archive; file: the FieldFile to copy; modified: timestamp for the entry
+PortfolioEntry = namedtuple('PortfolioEntry', ['arcname', 'file', 'modified'])
+
+_UNSAFE_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+
+
+def export_concurrency():
+    return getattr(settings, 'PORTFOLIO_EXPORT_CONCURRENCY', 4)
+
+
+def _segment(text, limit=80):
+    """
+    Make `text` safe to use as one folder or file name inside the archive.
+    """
+    text = _UNSAFE_CHARS.sub(' ', str(text)).strip(' .')
+    return text[:limit].rstrip(' .') or '_'
+
+
+def _stamp(moment):
+    return timezone.localtime(moment).strftime('%Y-%m-%d %H%M%S')
+
+
+def _status_label(submission):
+    if submission is None:
+        return 'Not Submitted'
+    if submission.status == 'REJECTED':
+        return 'Resubmission Required'
+    return submission.get_status_display()
+
+
+def _tree_folders(units):
+    """
+    Return ({lo_id: folder}, {ac_id: folder}) with folders named after the unit and the
+    position of each LO and AC in the tree, e.g. "Unit 101 - Safety/LO 2/AC 2.1".
+    """
+    lo_folders, ac_folders = {}, {}
+    for unit in units:
+        unit_folder = _segment(f"Unit {unit.unit_number} - {unit.unit_title}")
+        for lo_number, lo in enumerate(unit.learning_outcomes, 1):
+            lo_folders[lo.id] = f"{unit_folder}/LO {lo_number}"
+            for ac_number, ac in enumerate(lo.assessment_criteria, 1):
+                ac_folders[ac.id] = f"{unit_folder}/LO {lo_number}/AC {lo_number}.{ac_number}"
+    return lo_folders, ac_folders
+
+
+def portfolio_entries(learner, units):
+    """
+    List every stored file in the learner's portfolio (evidence, workbooks, submitted documents
+    and documents uploaded by their assessor) with its path in the archive. Costs four queries.
+    """
+    lo_folders, ac_folders = _tree_folders(units)
+    files = []
+
+    evidence_files = EvidenceFile.objects.filter(
+        evidence_submission__user=learner.user,
+        evidence_submission__assessment_criterion__learning_outcome__unit__qualification=learner.qualification
+    ).select_related('evidence_submission').order_by('evidence_submission__submitted_at', 'uploaded_at')
+    for evidence in evidence_files:
+        submission = evidence.evidence_submission
+        folder = f"evidence/{ac_folders[submission.assessment_criterion_id]}/{_stamp(submission.submitted_at)} {_status_label(submission)}"
+        files.append((folder, evidence.evidence_file, evidence.uploaded_at))
+
+    workbooks = WorkbookSubmission.objects.filter(
+        user=learner.user, learning_outcome__unit__qualification=learner.qualification
+    ).order_by('submitted_at')
+    for workbook in workbooks:
+        folder = f"workbooks/{lo_folders[workbook.learning_outcome_id]}/{_stamp(workbook.submitted_at)} {_status_label(workbook)}"
+        files.append((folder, workbook.workbook_file, workbook.submitted_at))
+
+    documents = LearnerDocumentSubmission.objects.filter(learner=learner).select_related('document_requirement').order_by('submitted_at')
+    for document in documents:
+        folder = f"documents/{_segment(document.document_requirement.title)}/{_stamp(document.submitted_at)} {document.get_status_display()}"
+        files.append((folder, document.document_file, document.submitted_at))
+
+    for document in LearnerDocsByAssessor.objects.filter(learner=learner).order_by('uploaded_at'):
+        files.append((f"from_assessor/{_segment(document.title)}", document.file, document.uploaded_at))
+
+    entries, used = [], set()
+    for folder, field_file, modified in files:
+        if not field_file:
+            continue
+        arcname = f"{folder}/{_segment(posixpath.basename(field_file.name), 120)}"
+        stem, ext = posixpath.splitext(arcname)
+        copy = 1
+        while arcname in used:
+            copy += 1
+            arcname = f"{stem} ({copy}){ext}"
+        used.add(arcname)
+        entries.append(PortfolioEntry(arcname, field_file, modified))
+    return entries
+
+
+def portfolio_manifest(learner, units, missing=()):
+    """
+    CSV summary of the portfolio: the latest status of every workbook (per LO), assessment
+    criterion and required document, followed by any files that could not be read from storage.
+    """
+    latest_evidence = latest_evidence_by_ac(learner.user, learner.qualification)
+    latest_workbooks = latest_workbook_by_lo(learner.user, learner.qualification)
+    latest_documents = {}
+    for document in LearnerDocumentSubmission.objects.filter(learner=learner).order_by('-submitted_at'):
+        latest_documents.setdefault(document.document_requirement_id, document)
+
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['Type', 'Unit', 'LO', 'AC', 'Detail', 'Status', 'Last submitted'])
+    for unit in units:
+        for lo_number, lo in enumerate(unit.learning_outcomes, 1):
+            workbook = latest_workbooks.get(lo.id)
+            writer.writerow([
+                'Workbook', unit.unit_number, lo_number, '', lo.lo_detail,
+                _status_label(workbook), _stamp(workbook.submitted_at) if workbook else ''
+            ])
+            for ac_number, ac in enumerate(lo.assessment_criteria, 1):
+                submission = latest_evidence.get(ac.id)
+                writer.writerow([
+                    'Assessment criterion', unit.unit_number, lo_number, f"{lo_number}.{ac_number}", ac.ac_detail,
+                    _status_label(submission), _stamp(submission.submitted_at) if submission else ''
+                ])
+    for requirement in DocumentRequirement.objects.filter(qualification=learner.qualification).order_by('title'):
+        document = latest_documents.get(requirement.id)
+        writer.writerow([
+            'Document', '', '', '', requirement.title,
+            document.get_status_display() if document else 'Not Submitted', _stamp(document.submitted_at) if document else ''
+        ])
+    for arcname in missing:
+        writer.writerow(['Missing file', '', '', '', arcname, 'Could not be read from storage', ''])
+    return out.getvalue()
+
+
+def portfolio_filename(learner):
+    name = learner.user.user.full_name or learner.user.user.email
+    return f"portfolio-{slugify(name)}-{slugify(learner.qualification.qualification_number)}.zip"
+
+
+class _ArchiveSink(io.RawIOBase):
+    """
+    Write-only, unseekable target for ZipFile that hands what was written back to the response
+    generator, so the archive is never held whole.
+    """
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _fetch(field_file):
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        with field_file.storage.open(field_file.name, 'rb') as source:
+            shutil.copyfileobj(source, spool, COPY_CHUNK_SIZE)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def _discard(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def _prefetch(entries, pool, window):
+    """
+    Yield (entry, future) in order while keeping at most `window` storage reads ahead of the
+    consumer, so reads overlap with writing the archive without the backlog growing.
+    """
+    entries = iter(entries)
+    pending = deque()
+    try:
+        for entry in entries:
+            pending.append((entry, pool.submit(_fetch, entry.file)))
+            if len(pending) >= window:
+                break
+        while pending:
+            entry, future = pending.popleft()
+            following = next(entries, None)
+            if following is not None:
+                pending.append((following, pool.submit(_fetch, following.file)))
+            yield entry, future
+    finally:
+        # Reached when the client disconnects: drop reads that have not been written out
+        for _, future in pending:
+            if not future.cancel():
+                future.add_done_callback(_discard)
+
+
+def stream_portfolio(learner):
+    """
+    Return an iterator over the learner's portfolio as a ZIP archive, for a StreamingHttpResponse.
+
+    Files are copied from storage in order, with up to PORTFOLIO_EXPORT_CONCURRENCY reads in
+    flight; each read is spooled to a temporary file beyond SPOOL_MAX_SIZE, so memory use does not
+    grow with the size of the portfolio. Files are stored uncompressed since evidence is mostly
+    already-compressed media. The manifest is written last so it can list files that failed to read.
+    """
+    units = qualification_structure(learner.qualification).units
+    return _archive(learner, units, portfolio_entries(learner, units))
+
+
+def _archive(learner, units, entries):
+    window = max(1, export_concurrency())
+    sink = _ArchiveSink()
+    missing = []
+    pool = ThreadPoolExecutor(max_workers=window, thread_name_prefix='portfolio-export')
+    prefetched = _prefetch(entries, pool, window)
+    try:
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as archive:
+            for entry, future in prefetched:
+                try:
+                    spool = future.result()
+                except Exception as e:
+                    logger.warning(f"Portfolio export for learner {learner.id} could not read {entry.file.name}: {str(e)}")
+                    missing.append(entry.arcname)
+                    continue
+                info = zipfile.ZipInfo(entry.arcname, date_time=timezone.localtime(entry.modified).timetuple()[:6])
+                with spool, archive.open(info, 'w') as target:
+                    while chunk := spool.read(COPY_CHUNK_SIZE):
+                        target.write(chunk)
+                        if data := sink.take():
+                            yield data
+
+            info = zipfile.ZipInfo(MANIFEST_NAME, date_time=timezone.localtime().timetuple()[:6])
+            archive.writestr(info, portfolio_manifest(learner, units, missing), compress_type=zipfile.ZIP_DEFLATED)
+        yield sink.take()
+    finally:
+        prefetched.close()
+        pool.shutdown(wait=False, cancel_futures=True)
+    logger.info(f"Exported portfolio for learner {learner.id}: {len(entries) - len(missing)} files, {len(missing)} missing")
@@ -0,0 +1,178 @@
+import logging
+from collections import namedtuple, defaultdict
+from django.db.models import Count, Max, Q
+from qualifications.models import AC, EvidenceSubmission, LearnerProgress, Sampling
+
+logger = logging.getLogger('qualifications')
+
+QUAL_PATH = 'assessment_criterion__learning_outcome__unit__qualification'
+UNIT_PATH = 'assessment_criterion__learning_outcome__unit'
+
+
+class Progress(namedtuple('Progress', ['accepted_ac', 'total_ac', 'has_pending'])):
+    """
+    Evidence progress of one learner on one qualification.
+    """
+    __slots__ = ()
+
+    @property
+    def percentage(self):
+        return (self.accepted_ac / self.total_ac * 100) if self.total_ac > 0 else 0
+
+
+def total_ac_counts(qualification_ids):
+    """
+    Return {qualification_id: number of ACs} for the given qualifications in a single grouped query.
+    """
+    rows = AC.objects.filter(
+        learning_outcome__unit__qualification__in=qualification_ids
+    ).values('learning_outcome__unit__qualification').annotate(total=Count('id'))
+    return {row['learning_outcome__unit__qualification']: row['total'] for row in rows}
+
+
+def _aggregate_progress(learners, qualification_ids):
+    """
+    Group the evidence table by (user, qualification) for learners that have no LearnerProgress row yet.
+    """
+    rows = EvidenceSubmission.objects.filter(
+        user__in={learner.user_id for learner in learners},
+        **{f'{QUAL_PATH}__in': qualification_ids}
+    ).values('user', QUAL_PATH).annotate(
+        accepted=Count('assessment_criterion', filter=Q(status='ACCEPTED'), distinct=True),
+        pending=Count('id', filter=Q(status='SUBMITTED')),
+    )
+    counts = {(row['user'], row[QUAL_PATH]): row for row in rows}
+    result = {}
+    for learner in learners:
+        row = counts.get((learner.user_id, learner.qualification_id))
+        result[learner.id] = (row['accepted'] if row else 0, bool(row and row['pending']))
+    return result
+
+
+def learner_progress_map(learners):
+    """
+    Compute progress for a whole set of Learner rows at once.
+
+    Learners may span several qualifications. Returns {learner.id: Progress}. Progress is read
+    from the materialized LearnerProgress rows; learners without a row fall back to one grouped
+    aggregate over the evidence table.
+    """
+    learners = list(learners)
+    if not learners:
+        return {}
+
+    qualification_ids = {learner.qualification_id for learner in learners}
+    totals = total_ac_counts(qualification_ids)
+    stored = {
+        row.learner_id: (row.accepted_ac, row.pending_ac > 0)
+        for row in LearnerProgress.objects.filter(learner__in=[learner.id for learner in learners])
+    }
+    missing = [learner for learner in learners if learner.id not in stored]
+    if missing:
+        logger.debug(f"No materialized progress for {len(missing)} learners, aggregating evidence")
+        stored.update(_aggregate_progress(missing, qualification_ids))
+
+    return {
+        learner.id: Progress(
+            accepted_ac=stored[learner.id][0],
+            total_ac=totals.get(learner.qualification_id, 0),
+            has_pending=stored[learner.id][1],
+        )
+        for learner in learners
+    }
+
+
+def rebuild_learner_progress(learners, activity_at=None):
+    """
+    Recompute and upsert LearnerProgress for the given learners from the evidence table.
+
+    Call inside the transaction that changes EvidenceSubmission.status so the stored progress
+    commits or rolls back with it. `activity_at` overrides last_activity_at (e.g. the time of an
+    assessor decision); otherwise the latest submission time is used.
+    """
+    learners = list(learners)
+    if not learners:
+        return []
+
+    qualification_ids = {learner.qualification_id for learner in learners}
+    unit_totals = {
+        row['learning_outcome__unit']: row['total']
+        for row in AC.objects.filter(
+            learning_outcome__unit__qualification__in=qualification_ids
+        ).values('learning_outcome__unit').annotate(total=Count('id'))
+    }
+    rows = EvidenceSubmission.objects.filter(
+        user__in={learner.user_id for learner in learners},
+        **{f'{QUAL_PATH}__in': qualification_ids}
+    ).values('user', QUAL_PATH, UNIT_PATH, 'assessment_criterion').annotate(
+        accepted=Count('id', filter=Q(status='ACCEPTED')),
+        pending=Count('id', filter=Q(status='SUBMITTED')),
+        last_submitted=Max('submitted_at'),
+    )
+
+    stats = defaultdict(lambda: {'accepted': 0, 'submitted': 0, 'pending': 0, 'last': None, 'units': defaultdict(int)})
+    for row in rows:
+        entry = stats[(row['user'], row[QUAL_PATH])]
+        entry['submitted'] += 1
+        if row['accepted']:
+            entry['accepted'] += 1
+            entry['units'][row[UNIT_PATH]] += 1
+        if row['pending']:
+            entry['pending'] += 1
+        if entry['last'] is None or row['last_submitted'] > entry['last']:
+            entry['last'] = row['last_submitted']
+
+    records = []
+    for learner in learners:
+        entry = stats.get((learner.user_id, learner.qualification_id))
+        records.append(LearnerProgress(
+            learner=learner,
+            accepted_ac=entry['accepted'] if entry else 0,
+            submitted_ac=entry['submitted'] if entry else 0,
+            pending_ac=entry['pending'] if entry else 0,
+            units_accepted=sum(
+                1 for unit_id, accepted in entry['units'].items() if accepted >= unit_totals.get(unit_id, 0) > 0
+            ) if entry else 0,
+            last_activity_at=activity_at or (entry['last'] if entry else None),
+        ))
+
+    LearnerProgress.objects.bulk_create(
+        records,
+        update_conflicts=True,
+        unique_fields=['learner'],
+        update_fields=['accepted_ac', 'submitted_ac', 'pending_ac', 'units_accepted', 'last_activity_at', 'updated_at'],
+    )
+    logger.debug(f"Rebuilt progress for {len(records)} learners")
+    return records
+
+
+def sampled_unit_counts(learners, iqa=None):
+    """
+    Return {learner.id: number of distinct units sampled} for a set of learners in one grouped query.
+
+    By default each learner's own assigned IQA is used; pass `iqa` to count only samplings by that
+    IQA (the IQA workload view).
+    """
+    learners = list(learners)
+    if not learners:
+        return {}
+
+    iqa_ids = {iqa.id} if iqa else {learner.iqa_id for learner in learners if learner.iqa_id}
+    if not iqa_ids:
+        return {learner.id: 0 for learner in learners}
+
+    rows = Sampling.objects.filter(
+        iqa__in=iqa_ids,
+        evidence_submission__user__in={learner.user_id for learner in learners},
+        **{f'evidence_submission__{QUAL_PATH}__in': {learner.qualification_id for learner in learners}}
+    ).values('iqa', 'evidence_submission__user', f'evidence_submission__{QUAL_PATH}').annotate(
+        units=Count(f'evidence_submission__{UNIT_PATH}', distinct=True)
+    )
+    counts = {
+        (row['iqa'], row['evidence_submission__user'], row[f'evidence_submission__{QUAL_PATH}']): row['units']
+        for row in rows
+    }
+    return {
+        learner.id: counts.get((iqa.id if iqa else learner.iqa_id, learner.user_id, learner.qualification_id), 0)
+        for learner in learners
+    }
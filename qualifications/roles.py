@@ -0,0 +1,141 @@
+import logging
+import time
+import uuid
+from django.core.cache import cache
+from qualifications.models import Learner, Assessor, IQA, EQA
+
+logger = logging.getLogger('qualifications')
+
+LEARNER = 'LEARNER'
+ASSESSOR = 'ASSESSOR'
+IQA_ROLE = 'IQA'
+EQA_ROLE = 'EQA'
+
+ROLE_CACHE_TIMEOUT = 60 * 60
+
+# Display labels in the order a role wins when a user holds several on one qualification
+ROLE_LABELS = (
+    (LEARNER, 'Learner'),
+    (ASSESSOR, 'Assessor'),
+    (IQA_ROLE, 'IQA'),
+    (EQA_ROLE, 'EQA'),
+)
+
+
+def _as_uuid(value):
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+
+
+class RoleMap:
+    """
+    The roles one UserBusiness holds, keyed by qualification id.
+
+    LEARNER only counts active learner assignments, matching the checks the views used to run.
+    """
+    __slots__ = ('_roles',)
+
+    def __init__(self, roles=None):
+        self._roles = {_as_uuid(qualification_id): frozenset(names) for qualification_id, names in (roles or {}).items()}
+
+    def roles_for(self, qualification_id):
+        return self._roles.get(_as_uuid(qualification_id), frozenset())
+
+    def has_role(self, role, qualification_id=None):
+        """
+        True if the user holds `role` on the given qualification, or on any qualification when
+        `qualification_id` is None.
+        """
+        if qualification_id is None:
+            return any(role in names for names in self._roles.values())
+        return role in self.roles_for(qualification_id)
+
+    def has_any(self, qualification_id):
+        return bool(self.roles_for(qualification_id))
+
+    def label_for(self, qualification_id, default=None):
+        """
+        Display label of the user's role on a qualification, or `default` if they hold none.
+        """
+        names = self.roles_for(qualification_id)
+        for role, label in ROLE_LABELS:
+            if role in names:
+                return label
+        return default
+
+    def qualification_ids(self, role):
+        return {qualification_id for qualification_id, names in self._roles.items() if role in names}
+
+    def as_dict(self):
+        return dict(self._roles)
+
+    def __bool__(self):
+        return bool(self._roles)
+
+    def __repr__(self):
+        return f"RoleMap({self._roles!r})"
+
+
+def _version_key(user_business_id):
+    return f"roles:version:{user_business_id}"
+
+
+def role_map_version(user_business_id):
+    """
+    Return the current role version for a UserBusiness, starting a new one if the cache has none.
+
+    New versions start from the clock rather than 1 so an evicted version key can never line up
+    with a role map that is still cached under an old version.
+    """
+    key = _version_key(user_business_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_role_version(user_business_id):
+    """
+    Invalidate every cached role map of a UserBusiness by moving it to a new version.
+    """
+    key = _version_key(user_business_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def _query_role_map(user_business):
+    roles = {}
+    sources = (
+        (LEARNER, Learner.objects.filter(user=user_business, is_active=True)),
+        (ASSESSOR, Assessor.objects.filter(user=user_business)),
+        (IQA_ROLE, IQA.objects.filter(user=user_business)),
+        (EQA_ROLE, EQA.objects.filter(user=user_business)),
+    )
+    for role, queryset in sources:
+        for qualification_id in queryset.values_list('qualification_id', flat=True):
+            roles.setdefault(qualification_id, set()).add(role)
+    return roles
+
+
+def load_role_map(user_business):
+    """
+    Return the RoleMap for a UserBusiness.
+
+    Role maps are cached across requests under the UserBusiness's role version, which the
+    Learner/Assessor/IQA/EQA signal handlers bump on every change. A miss costs one query per
+    role table.
+    """
+    if user_business is None:
+        return RoleMap()
+
+    key = f"roles:{user_business.pk}:{role_map_version(user_business.pk)}"
+    roles = cache.get(key)
+    if roles is None:
+        roles = {
+            qualification_id: sorted(names) for qualification_id, names in _query_role_map(user_business).items()
+        }
+        cache.set(key, roles, ROLE_CACHE_TIMEOUT)
+        logger.debug(f"Resolved roles for {user_business.user.email} on {len(roles)} qualifications")
+    return RoleMap(roles)
@@ -1,10 +1,26 @@
 import logging
+from collections import namedtuple
 from rest_framework import serializers
 from .models import Qual, Unit, LO, AC, EvidenceSubmission
+from .structure import build_structure, bump_structure_version, qualification_structure
 from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
 
 logger = logging.getLogger('qualifications')
 
+SUBMISSIONS_BLOCK_MESSAGE = "You cannot Edit this Qualification because there are Learners Submissions against this Qualification"
+
+# Changes for one save of a qualification tree: new and changed nodes per model, and removed
+# nodes as (error key, model, id) in tree order
+TreeDiff = namedtuple('TreeDiff', ['created', 'updated', 'removed'])
+
+TREE_UPDATE_FIELDS = {
+    Unit: ['unit_title', 'unit_number', 'serial_number', 'updated_at'],
+    LO: ['lo_detail', 'serial_number', 'updated_at'],
+    AC: ['ac_detail', 'serial_number', 'updated_at'],
+}
+
 class ACSerializer(serializers.ModelSerializer):
     id = serializers.UUIDField(required=False, allow_null=True)
     ac_detail = serializers.CharField()
@@ -45,7 +61,8 @@ class UnitSerializer(serializers.ModelSerializer):
         return LOSerializer(learning_outcomes, many=True).data
 
 class QualificationSerializer(serializers.ModelSerializer):
-    units = UnitSerializer(many=True)
+    # Written through the model tree, read back from the structure snapshot in to_representation
+    units = UnitSerializer(many=True, write_only=True)
     qualification_title = serializers.CharField()
     qualification_number = serializers.CharField()
     awarding_body = serializers.CharField()
@@ -90,139 +107,119 @@ class QualificationSerializer(serializers.ModelSerializer):
             return instance
 
     def _create_or_update_units(self, qualification, units_data):
-        logger.debug(f"Creating/updating units for qualification: {qualification.id}")
-        existing_units = {str(unit.id): unit for unit in qualification.units.all()}
-        submitted_unit_ids = set(str(unit.get('id')) for unit in units_data if unit.get('id'))
-        logger.debug(f"Existing unit IDs: {set(existing_units.keys())}, Submitted unit IDs: {submitted_unit_ids}")
-
+        """
+        Make the qualification's unit/LO/AC tree match `units_data` with a handful of bulk
+        queries, however large the tree: see _diff_tree, _check_removals and _apply_diff.
+        """
+        diff = self._diff_tree(qualification, units_data)
+        self._check_removals(diff.removed)
+        self._apply_diff(diff)
+        # Bump now so this transaction stops reading the old snapshot, and again on commit in case
+        # a concurrent request cached the old tree under the intermediate version
+        bump_structure_version(qualification.id)
+        transaction.on_commit(lambda: bump_structure_version(qualification.id))
+        self._tree_saved = True
+        logger.debug(
+            f"Saved tree for qualification {qualification.id}: "
+            f"{sum(len(nodes) for nodes in diff.created.values())} created, "
+            f"{sum(len(nodes) for nodes in diff.updated.values())} updated, {len(diff.removed)} removed"
+        )
+
+    def _diff_tree(self, qualification, units_data):
+        """
+        Compare the submitted tree with the stored one (loaded in three queries) and return the
+        TreeDiff between them. Nodes are matched by id under the same parent; unmatched submitted
+        nodes are created and unmatched stored nodes removed. Serial numbers follow submission order.
+        """
+        now = timezone.now()
+        diff = TreeDiff({Unit: [], LO: [], AC: []}, {Unit: [], LO: [], AC: []}, [])
+        existing_units = {
+            str(unit.id): unit
+            for unit in qualification.units.prefetch_related('learning_outcomes__assessment_criteria')
+        }
         for unit_idx, unit_data in enumerate(units_data, 1):
-            unit_id = str(unit_data.get('id')) if unit_data.get('id') else None
-            lo_data = unit_data.pop('learning_outcomes', [])
-            serial_number = float(unit_idx)
-            logger.debug(f"Processing unit data with ID: {unit_id}, serial_number: {serial_number}")
-            if unit_id and unit_id in existing_units:
-                logger.debug(f"Updating existing unit: {unit_id}")
-                unit = existing_units[unit_id]
-                unit.unit_title = unit_data.get('unit_title', unit.unit_title)
-                unit.unit_number = unit_data.get('unit_number', unit.unit_number)
-                unit.serial_number = serial_number
-                unit.save()
-                del existing_units[unit_id]
-            else:
-                logger.debug(f"Creating new unit with data: {unit_data}")
-                if 'id' in unit_data:
-                    del unit_data['id']
-                unit = Unit(
-                    qualification=qualification,
-                    unit_title=unit_data['unit_title'],
-                    unit_number=unit_data['unit_number'],
-                    serial_number=serial_number
-                )
-                unit.save()  # Save Unit before creating LOs
-            self._create_or_update_learning_outcomes(unit, lo_data, unit_idx)
-
-        for unit_id in existing_units:
-            unit = existing_units[unit_id]
-            submission_count = EvidenceSubmission.objects.filter(
-                assessment_criterion__learning_outcome__unit=unit
-            ).count()
-            if submission_count > 0:
-                logger.debug(f"Blocking deletion of unit {unit_id} due to {submission_count} submissions")
-                raise serializers.ValidationError({
-                    "units": "You cannot Edit this Qualification because there are Learners Submissions against this Qualification"
-                })
-            unit.delete()
-            logger.debug(f"Deleted unit: {unit_id}")
-
-    def _create_or_update_learning_outcomes(self, unit, learning_outcomes_data, unit_serial):
-        logger.debug(f"Creating/updating LOs for unit: {unit.id}")
-        existing_los = {str(lo.id): lo for lo in unit.learning_outcomes.all()}
-        submitted_lo_ids = set(str(lo.get('id')) for lo in learning_outcomes_data if lo.get('id'))
-
-        for lo_idx, lo_data in enumerate(learning_outcomes_data, 1):
-            lo_id = str(lo_data.get('id')) if lo_data.get('id') else None
-            ac_data = lo_data.pop('assessment_criteria', [])
-            serial_number = float(f"{unit_serial}.{lo_idx}")
-            logger.debug(f"Processing LO with ID: {lo_id}, serial_number: {serial_number}")
-            
-            if lo_id and lo_id in existing_los:
-                lo = existing_los[lo_id]
-                lo.lo_detail = lo_data.get('lo_detail', lo.lo_detail)
-                lo.serial_number = serial_number
-                lo.save()
-                logger.debug(f"Updated LO: {lo.id}")
-            else:
-                if 'id' in lo_data:
-                    del lo_data['id']
-                lo = LO(
-                    unit=unit,
-                    lo_detail=lo_data['lo_detail'],
-                    serial_number=serial_number
-                )
-                lo.save()  # Save LO before creating ACs
-                logger.debug(f"Created LO: {lo.id}")
-            
-            self._create_or_update_assessment_criteria(lo, ac_data, unit_serial, lo_idx)
-            
-            if lo_id and lo_id in existing_los:
-                del existing_los[lo_id]
-
-        for lo_id in existing_los:
-            lo = existing_los[lo_id]
-            submission_count = EvidenceSubmission.objects.filter(
-                assessment_criterion__learning_outcome=lo
-            ).count()
-            if submission_count > 0:
-                logger.debug(f"Blocking deletion of LO {lo_id} due to {submission_count} submissions")
-                raise serializers.ValidationError({
-                    "learning_outcomes": "You cannot Edit this Qualification because there are Learners Submissions against this Qualification"
-                })
-            lo.delete()
-            logger.debug(f"Deleted LO: {lo_id}")
-
-    def _create_or_update_assessment_criteria(self, learning_outcome, ac_data, unit_serial, lo_idx):
-        logger.debug(f"Creating/updating ACs for LO: {learning_outcome.id}")
-        existing_acs = {str(ac.id): ac for ac in learning_outcome.assessment_criteria.all()}
-        submitted_ac_ids = set(str(ac.get('id')) for ac in ac_data if ac.get('id'))
-
-        for ac_idx, ac_data in enumerate(ac_data, 1):
-            ac_id = str(ac_data.get('id')) if ac_data.get('id') else None
-            serial_number = float(f"{unit_serial}.{lo_idx}{ac_idx}")
-            logger.debug(f"Processing AC with ID: {ac_id}, serial_number: {serial_number}, detail: {ac_data['ac_detail']}")
-            if ac_id and ac_id in existing_acs:
-                logger.debug(f"Updating existing AC: {ac_id}")
-                ac = existing_acs[ac_id]
-                ac.ac_detail = ac_data.get('ac_detail', ac.ac_detail)
-                ac.serial_number = serial_number
-                ac.save()
-                logger.debug(f"Updated AC: {ac.id}")
-                del existing_acs[ac_id]
-            else:
-                logger.debug(f"Creating new AC with data: {ac_data}")
-                if 'id' in ac_data:
-                    del ac_data['id']
-                ac = AC(
-                    learning_outcome=learning_outcome,
-                    ac_detail=ac_data['ac_detail'],
-                    serial_number=serial_number
+            unit, is_new = self._match_node(
+                diff, Unit, existing_units, unit_data, ['unit_title', 'unit_number'], float(unit_idx), now,
+                qualification=qualification
+            )
+            existing_los = {} if is_new else {str(lo.id): lo for lo in unit.learning_outcomes.all()}
+            for lo_idx, lo_data in enumerate(unit_data.get('learning_outcomes', []), 1):
+                lo, is_new = self._match_node(
+                    diff, LO, existing_los, lo_data, ['lo_detail'], float(f"{unit_idx}.{lo_idx}"), now, unit=unit
                 )
-                ac.save()
-                logger.debug(f"Created AC: {ac.id}")
-
-        for ac_id in existing_acs:
-            ac = existing_acs[ac_id]
-            submission_count = EvidenceSubmission.objects.filter(assessment_criterion=ac).count()
-            if submission_count > 0:
-                logger.debug(f"Blocking deletion of AC {ac_id} due to {submission_count} submissions")
-                raise serializers.ValidationError({
-                    "assessment_criteria": "You cannot Edit this Qualification because there are Learners Submissions against this Qualification"
-                })
-            ac.delete()
-            logger.debug(f"Deleted AC: {ac_id}")
+                existing_acs = {} if is_new else {str(ac.id): ac for ac in lo.assessment_criteria.all()}
+                for ac_idx, ac_data in enumerate(lo_data.get('assessment_criteria', []), 1):
+                    self._match_node(
+                        diff, AC, existing_acs, ac_data, ['ac_detail'], float(f"{unit_idx}.{lo_idx}{ac_idx}"), now,
+                        learning_outcome=lo
+                    )
+                diff.removed.extend(('assessment_criteria', AC, ac.id) for ac in existing_acs.values())
+            diff.removed.extend(('learning_outcomes', LO, lo.id) for lo in existing_los.values())
+        diff.removed.extend(('units', Unit, unit.id) for unit in existing_units.values())
+        return diff
+
+    def _match_node(self, diff, model, existing, data, fields, serial_number, now, **parent):
+        """
+        Return (node, is_new): the stored node `data` refers to, taken out of `existing`, with the
+        submitted values applied and queued for update if any changed; otherwise a new node
+        queued for insert.
+        """
+        node = existing.pop(str(data['id']), None) if data.get('id') else None
+        if node is None:
+            node = model(serial_number=serial_number, **parent, **{field: data[field] for field in fields})
+            diff.created[model].append(node)
+            return node, True
+        values = {field: data.get(field, getattr(node, field)) for field in fields}
+        values['serial_number'] = serial_number
+        if any(getattr(node, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(node, field, value)
+            node.updated_at = now
+            diff.updated[model].append(node)
+        return node, False
+
+    def _check_removals(self, removed):
+        """
+        Refuse the save if any removed unit, LO or AC has learner submissions, reporting the first
+        blocked node in tree order. One query covers every removed node.
+        """
+        if not removed:
+            return
+        ids = {model: [node_id for _, node_model, node_id in removed if node_model is model] for model in (Unit, LO, AC)}
+        blocked = set()
+        rows = EvidenceSubmission.objects.filter(
+            Q(assessment_criterion__learning_outcome__unit__in=ids[Unit])
+            | Q(assessment_criterion__learning_outcome__in=ids[LO])
+            | Q(assessment_criterion__in=ids[AC])
+        ).values_list(
+            'assessment_criterion', 'assessment_criterion__learning_outcome', 'assessment_criterion__learning_outcome__unit'
+        ).distinct()
+        for row in rows:
+            blocked.update(row)
+        for key, model, node_id in removed:
+            if node_id in blocked:
+                logger.debug(f"Blocking deletion of {model.__name__} {node_id} due to learner submissions")
+                raise serializers.ValidationError({key: SUBMISSIONS_BLOCK_MESSAGE})
+
+    def _apply_diff(self, diff):
+        # Deletes go first so a removed node's unit number or detail can be reused in the same save
+        for model in (AC, LO, Unit):
+            removed_ids = [node_id for _, node_model, node_id in diff.removed if node_model is model]
+            if removed_ids:
+                model.objects.filter(id__in=removed_ids).delete()
+        for model in (Unit, LO, AC):
+            if diff.updated[model]:
+                model.objects.bulk_update(diff.updated[model], TREE_UPDATE_FIELDS[model])
+            if diff.created[model]:
+                model.objects.bulk_create(diff.created[model])
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        units = Unit.objects.filter(qualification=instance).order_by('serial_number')
-        representation['units'] = UnitSerializer(units, many=True).data
-        logger.debug(f"Returning qualification {instance.id} with units: {[u.unit_title for u in units]}")
+        # Right after a save the tree is not committed yet, so read it without caching it
+        if getattr(self, '_tree_saved', False):
+            structure = build_structure(instance)
+        else:
+            structure = qualification_structure(instance)
+        representation['units'] = UnitSerializer(structure.units, many=True).data
+        logger.debug(f"Returning qualification {instance.id} with units: {[u.unit_title for u in structure.units]}")
         return representation
\ No newline at end of file
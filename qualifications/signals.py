@@ -0,0 +1,43 @@
+from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.dispatch import receiver
+from qualifications.models import Learner, Assessor, IQA, EQA, MessageRecipient, EvidenceSubmission, LearnerProgress
+from qualifications.roles import bump_role_version
+from qualifications.messaging import invalidate_unread_count
+from qualifications.progress import rebuild_learner_progress
+
+
+@receiver(post_save, sender=Learner)
+@receiver(post_delete, sender=Learner)
+@receiver(post_save, sender=Assessor)
+@receiver(post_delete, sender=Assessor)
+@receiver(post_save, sender=IQA)
+@receiver(post_delete, sender=IQA)
+@receiver(post_save, sender=EQA)
+@receiver(post_delete, sender=EQA)
+def invalidate_role_map(sender, instance, **kwargs):
+    # Bump now so this transaction stops reading the old roles, and again on commit in case a
+    # concurrent request cached the old rows under the intermediate version
+    user_business_id = instance.user_id
+    bump_role_version(user_business_id)
+    transaction.on_commit(lambda: bump_role_version(user_business_id))
+
+
+@receiver(post_save, sender=MessageRecipient)
+@receiver(post_delete, sender=MessageRecipient)
+def invalidate_unread_message_count(sender, instance, **kwargs):
+    invalidate_unread_count(instance.recipient_id)
+
+
+@receiver(post_delete, sender=EvidenceSubmission)
+def drop_learner_progress(sender, instance, **kwargs):
+    # Readers fall back to aggregating the evidence table until the next write rebuilds the row.
+    # Dropping rather than rebuilding is safe inside a cascade that is deleting the learner too.
+    LearnerProgress.objects.filter(learner__user_id=instance.user_id).delete()
+
+
+@receiver(post_save, sender=Learner)
+def rebuild_moved_learner_progress(sender, instance, created, **kwargs):
+    # Progress is keyed by the learner's user and qualification, either of which an edit may change
+    if not created:
+        rebuild_learner_progress([instance])
@@ -0,0 +1,103 @@
+import logging
+import time
+from collections import namedtuple
+from django.core.cache import cache
+from django.db.models import Prefetch
+from qualifications.models import Unit, LO, AC
+
+logger = logging.getLogger('qualifications')
+
+STRUCTURE_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Immutable snapshot of a qualification's tree; every level is a tuple ordered by serial number
+ACNode = namedtuple('ACNode', ['id', 'ac_detail', 'serial_number'])
+LONode = namedtuple('LONode', ['id', 'lo_detail', 'serial_number', 'assessment_criteria'])
+UnitNode = namedtuple('UnitNode', ['id', 'unit_title', 'unit_number', 'serial_number', 'learning_outcomes'])
+QualificationStructure = namedtuple('QualificationStructure', ['qualification_id', 'version', 'units'])
+
+
+def load_qualification_tree(qualification):
+    """
+    Return the qualification's units with learning outcomes and assessment criteria prefetched,
+    each level ordered by serial number. Costs three queries however large the tree is.
+    """
+    return list(
+        Unit.objects.filter(qualification=qualification).order_by('serial_number').prefetch_related(
+            Prefetch(
+                'learning_outcomes',
+                queryset=LO.objects.order_by('serial_number').prefetch_related(
+                    Prefetch('assessment_criteria', queryset=AC.objects.order_by('serial_number'))
+                )
+            )
+        )
+    )
+
+
+def _qualification_id(qualification):
+    return getattr(qualification, 'pk', qualification)
+
+
+def _version_key(qualification_id):
+    return f"qual_structure_version:{qualification_id}"
+
+
+def structure_version(qualification_id):
+    """
+    Return the current structure version of a qualification, starting a new one if the cache has none.
+    Versions start from the clock so an evicted version key never lines up with an old snapshot.
+    """
+    key = _version_key(qualification_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_structure_version(qualification_id):
+    """
+    Invalidate the cached snapshot of a qualification by moving it to a new version.
+    """
+    key = _version_key(qualification_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def build_structure(qualification, version=None):
+    """
+    Read the qualification's units, LOs and ACs (three queries) into a QualificationStructure.
+    """
+    units = tuple(
+        UnitNode(
+            unit.id, unit.unit_title, unit.unit_number, unit.serial_number,
+            tuple(
+                LONode(
+                    lo.id, lo.lo_detail, lo.serial_number,
+                    tuple(ACNode(ac.id, ac.ac_detail, ac.serial_number) for ac in lo.assessment_criteria.all())
+                )
+                for lo in unit.learning_outcomes.all()
+            )
+        )
+        for unit in load_qualification_tree(qualification)
+    )
+    return QualificationStructure(_qualification_id(qualification), version, units)
+
+
+def qualification_structure(qualification):
+    """
+    Return the QualificationStructure of a Qual (or Qual id).
+
+    Snapshots are cached under the qualification's structure version, which QualificationSerializer
+    bumps whenever it saves the tree, so a hit costs no query on the Unit/LO/AC tables.
+    """
+    qualification_id = _qualification_id(qualification)
+    version = structure_version(qualification_id)
+    key = f"qual_structure:{qualification_id}:{version}"
+    structure = cache.get(key)
+    if structure is None:
+        structure = build_structure(qualification_id, version)
+        cache.set(key, structure, STRUCTURE_CACHE_TIMEOUT)
+        logger.debug(f"Built structure snapshot of qualification {qualification_id} with {len(structure.units)} units")
+    return structure
@@ -1,9 +1,10 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.core.exceptions import ValidationError
 from users.models import Business, UserBusiness, CustomUser
 from qualifications.models import Qual, Learner, Assessor, IQA
 from django.contrib.auth.hashers import make_password
 import uuid
+from io import StringIO
 
 class RoleTests(TestCase):
     def test_multiple_qualifications_and_role_constraint(self):
@@ -54,4 +55,1580 @@ class RoleTests(TestCase):
 
         # Test that IQA creation succeeds for different qualification or business
         IQA.objects.create(user=user_business1, qualification=qual3)  # Succeeds: different qual
-        IQA.objects.create(user=user_business2, qualification=qual2)  # Succeeds: different business
\ No newline at end of file
+        IQA.objects.create(user=user_business2, qualification=qual2)  # Succeeds: different business
+
+
+class QualificationTreeTestCase(TestCase):
+    """
+    Base fixture: one business, one qualification with a single unit/LO and four ACs,
+    an assessor, an IQA and three learners assigned to them.
+    """
+    def setUp(self):
+        from qualifications.models import Unit, LO, AC
+        self.business = Business.objects.create(business_id="B1", name="Business 1")
+        self.qual = Qual.objects.create(
+            qualification_title="Test Qual", qualification_number="Q1", awarding_body="AB", business=self.business
+        )
+        self.unit = Unit.objects.create(unit_title="Unit 1", unit_number="U1", qualification=self.qual)
+        self.lo = LO.objects.create(lo_detail="LO 1", unit=self.unit)
+        self.acs = [AC.objects.create(ac_detail=f"AC {i}", learning_outcome=self.lo, serial_number=i) for i in range(4)]
+        self.assessor_ub = self.make_user_business("assessor@example.com")
+        self.iqa_ub = self.make_user_business("iqa@example.com")
+        Assessor.objects.create(user=self.assessor_ub, qualification=self.qual)
+        IQA.objects.create(user=self.iqa_ub, qualification=self.qual)
+        self.learners = [
+            Learner.objects.create(
+                user=self.make_user_business(f"learner{i}@example.com"),
+                qualification=self.qual,
+                assessor=self.assessor_ub,
+                iqa=self.iqa_ub,
+            )
+            for i in range(3)
+        ]
+
+    def make_user_business(self, email, user_type='user'):
+        user = CustomUser.objects.create(email=email, full_name=email.split('@')[0])
+        return UserBusiness.objects.create(user=user, business=self.business, user_type=user_type)
+
+
+class LearnerProgressTests(QualificationTreeTestCase):
+    def test_progress_map_counts_accepted_acs_and_pending(self):
+        from qualifications.models import EvidenceSubmission
+        from qualifications.progress import learner_progress_map
+        first, second, third = self.learners
+        EvidenceSubmission.objects.create(user=first.user, assessment_criterion=self.acs[0], status='ACCEPTED')
+        EvidenceSubmission.objects.create(user=first.user, assessment_criterion=self.acs[0], status='ACCEPTED')
+        EvidenceSubmission.objects.create(user=first.user, assessment_criterion=self.acs[1], status='ACCEPTED')
+        EvidenceSubmission.objects.create(user=second.user, assessment_criterion=self.acs[2], status='SUBMITTED')
+
+        with self.assertNumQueries(3):
+            progress_map = learner_progress_map(self.learners)
+
+        self.assertEqual(progress_map[first.id].accepted_ac, 2)
+        self.assertEqual(progress_map[first.id].percentage, 50)
+        self.assertFalse(progress_map[first.id].has_pending)
+        self.assertEqual(progress_map[second.id].accepted_ac, 0)
+        self.assertTrue(progress_map[second.id].has_pending)
+        self.assertEqual(progress_map[third.id].percentage, 0)
+
+    def test_rebuild_materializes_progress(self):
+        from django.core.management import call_command
+        from qualifications.models import EvidenceSubmission, LearnerProgress
+        from qualifications.progress import learner_progress_map
+        first = self.learners[0]
+        for ac in self.acs:
+            EvidenceSubmission.objects.create(user=first.user, assessment_criterion=ac, status='ACCEPTED')
+        EvidenceSubmission.objects.create(user=self.learners[1].user, assessment_criterion=self.acs[0], status='SUBMITTED')
+
+        call_command('rebuild_learner_progress', stdout=StringIO())
+
+        progress = LearnerProgress.objects.get(learner=first)
+        self.assertEqual((progress.accepted_ac, progress.submitted_ac, progress.units_accepted), (4, 4, 1))
+        self.assertEqual(LearnerProgress.objects.get(learner=self.learners[1]).pending_ac, 1)
+        with self.assertNumQueries(2):
+            progress_map = learner_progress_map(self.learners)
+        self.assertEqual(progress_map[first.id].percentage, 100)
+        self.assertTrue(progress_map[self.learners[1].id].has_pending)
+
+    def test_deleted_evidence_and_moved_learners_refresh_progress(self):
+        from qualifications.models import EvidenceSubmission, LearnerProgress
+        from qualifications.progress import learner_progress_map, rebuild_learner_progress
+        first = self.learners[0]
+        submissions = [
+            EvidenceSubmission.objects.create(user=first.user, assessment_criterion=ac, status='ACCEPTED')
+            for ac in self.acs
+        ]
+        rebuild_learner_progress(self.learners)
+        self.assertEqual(learner_progress_map([first])[first.id].percentage, 100)
+
+        submissions[0].delete()
+        self.assertFalse(LearnerProgress.objects.filter(learner=first).exists())
+        self.assertEqual(learner_progress_map([first])[first.id].percentage, 75)
+
+        other = Qual.objects.create(qualification_title="Other", business=self.business)
+        rebuild_learner_progress([first])
+        Assessor.objects.create(user=self.assessor_ub, qualification=other)
+        IQA.objects.create(user=self.iqa_ub, qualification=other)
+        first.qualification = other
+        first.save()
+        self.assertEqual(LearnerProgress.objects.get(learner=first).accepted_ac, 0)
+        self.assertEqual(learner_progress_map([first])[first.id].accepted_ac, 0)
+
+    def test_sampled_unit_counts_groups_by_learner_and_iqa(self):
+        from qualifications.models import EvidenceSubmission, Sampling
+        from qualifications.progress import sampled_unit_counts
+        first, second, _ = self.learners
+        other_iqa = self.make_user_business("other-iqa@example.com")
+        for ac in self.acs[:2]:
+            submission = EvidenceSubmission.objects.create(user=first.user, assessment_criterion=ac)
+            Sampling.objects.create(evidence_submission=submission, iqa=self.iqa_ub)
+        submission = EvidenceSubmission.objects.create(user=second.user, assessment_criterion=self.acs[0])
+        Sampling.objects.create(evidence_submission=submission, iqa=other_iqa)
+
+        with self.assertNumQueries(1):
+            counts = sampled_unit_counts(self.learners)
+        self.assertEqual([counts[learner.id] for learner in self.learners], [1, 0, 0])
+        counts = sampled_unit_counts(self.learners, iqa=other_iqa)
+        self.assertEqual([counts[learner.id] for learner in self.learners], [0, 1, 0])
+
+
+class LearnerTreeLoaderTests(QualificationTreeTestCase):
+    def test_latest_submission_and_feedback_maps(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from qualifications.models import EvidenceSubmission, Feedback
+        from qualifications.loaders import load_qualification_tree, latest_evidence_by_ac, lo_ids_with_feedback
+        learner = self.learners[0]
+        older = EvidenceSubmission.objects.create(user=learner.user, assessment_criterion=self.acs[0], status='REJECTED')
+        EvidenceSubmission.objects.filter(id=older.id).update(submitted_at=timezone.now() - timedelta(days=1))
+        newer = EvidenceSubmission.objects.create(user=learner.user, assessment_criterion=self.acs[0])
+        Feedback.objects.create(evidence_submission=older, feedback_detail="Redo", assessor=self.assessor_ub)
+
+        with self.assertNumQueries(3):
+            units = load_qualification_tree(self.qual)
+            acs = [ac for unit in units for lo in unit.learning_outcomes.all() for ac in lo.assessment_criteria.all()]
+        self.assertEqual(acs, self.acs)
+        self.assertEqual(latest_evidence_by_ac(learner.user, self.qual), {self.acs[0].id: newer})
+        self.assertEqual(lo_ids_with_feedback(learner.user, self.qual), {self.lo.id})
+        self.assertEqual(lo_ids_with_feedback(self.learners[1].user, self.qual), set())
+
+
+class AssessorReviewGridTests(QualificationTreeTestCase):
+    def setUp(self):
+        super().setUp()
+        from qualifications.models import EvidenceSubmission
+        self.learner = self.learners[0]
+        self.submissions = [
+            EvidenceSubmission.objects.create(user=self.learner.user, assessment_criterion=ac) for ac in self.acs[:3]
+        ]
+
+    def test_grid_query_count_is_constant(self):
+        from qualifications.models import Unit, LO, AC
+        from qualifications.loaders import build_assessor_grid
+        unit = Unit.objects.create(unit_title="Unit 2", unit_number="U2", qualification=self.qual, serial_number=1)
+        for i in range(3):
+            lo = LO.objects.create(lo_detail=f"LO 2.{i}", unit=unit, serial_number=i)
+            for j in range(5):
+                AC.objects.create(ac_detail=f"AC 2.{i}.{j}", learning_outcome=lo, serial_number=j)
+
+        with self.assertNumQueries(7):
+            structured_data, latest_submissions = build_assessor_grid(self.learner, self.qual)
+        self.assertEqual(len(structured_data), 2)
+        statuses = [ac['status'] for ac in structured_data[0]['learning_outcomes'][0]['assessment_criteria']]
+        self.assertEqual(statuses, ['SUBMITTED', 'SUBMITTED', 'SUBMITTED', 'Not Submitted'])
+        self.assertTrue(structured_data[0]['learning_outcomes'][0]['can_provide_feedback'])
+        self.assertFalse(structured_data[1]['learning_outcomes'][0]['can_provide_feedback'])
+
+    def test_post_updates_statuses_and_progress(self):
+        from django.urls import reverse
+        from qualifications.models import LearnerProgress
+        self.client.force_login(self.assessor_ub.user)
+        session = self.client.session
+        session['business_id'] = self.business.business_id
+        session.save()
+        data = {'lo_id': str(self.lo.id), 'feedback_detail': 'Well done'}
+        for ac in self.acs:
+            data[f'status_{ac.id}'] = 'ACCEPTED'
+        response = self.client.post(
+            reverse('qualifications:assessor_feedback', args=[self.qual.id, self.learner.id]), data
+        )
+        self.assertEqual(response.status_code, 302)
+        for submission in self.submissions:
+            submission.refresh_from_db()
+            self.assertEqual(submission.status, 'ACCEPTED')
+        self.assertEqual(LearnerProgress.objects.get(learner=self.learner).accepted_ac, 3)
+
+
+class LatestPerACTests(QualificationTreeTestCase):
+    def test_latest_per_ac_returns_newest_submission_per_learner_and_ac(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from qualifications.models import EvidenceSubmission
+        first, second, _ = self.learners
+        now = timezone.now()
+        expected = set()
+        for learner in (first, second):
+            for ac in self.acs[:2]:
+                for age, status in ((2, 'REJECTED'), (0, 'SUBMITTED'), (1, 'REJECTED')):
+                    submission = EvidenceSubmission.objects.create(user=learner.user, assessment_criterion=ac, status=status)
+                    EvidenceSubmission.objects.filter(id=submission.id).update(submitted_at=now - timedelta(days=age))
+                    if age == 0:
+                        expected.add(submission.id)
+
+        with self.assertNumQueries(1):
+            latest = list(EvidenceSubmission.objects.latest_per_ac(qualification=self.qual))
+        self.assertEqual({submission.id for submission in latest}, expected)
+        self.assertEqual(len(EvidenceSubmission.objects.latest_per_ac(first.user, self.qual)), 2)
+
+
+class UserBusinessMiddlewareTests(QualificationTreeTestCase):
+    def test_role_map_loads_active_roles_per_qualification(self):
+        from qualifications.roles import load_role_map, LEARNER, ASSESSOR, IQA_ROLE
+        first = self.learners[0]
+        roles = load_role_map(self.assessor_ub)
+        self.assertTrue(roles.has_role(ASSESSOR, self.qual.id))
+        self.assertTrue(roles.has_role(ASSESSOR, str(self.qual.id)))
+        self.assertFalse(roles.has_role(IQA_ROLE))
+        self.assertTrue(load_role_map(first.user).has_role(LEARNER, self.qual.id))
+        first.is_active = False
+        first.save()
+        self.assertFalse(load_role_map(first.user))
+
+    def test_request_carries_user_business_and_lazy_roles(self):
+        from django.test import RequestFactory
+        from django.contrib.sessions.backends.db import SessionStore
+        from AssessEEZ.middleware import UserBusinessMiddleware
+        from qualifications.roles import IQA_ROLE
+        request = RequestFactory().get('/')
+        request.user = self.iqa_ub.user
+        request.session = SessionStore()
+        request.session['business_id'] = self.business.business_id
+        UserBusinessMiddleware(lambda request: None)(request)
+        self.assertEqual(request.user_business, self.iqa_ub)
+        self.assertEqual(request.business, self.business)
+        with self.assertNumQueries(4):
+            self.assertTrue(request.roles.has_role(IQA_ROLE, self.qual.id))
+        with self.assertNumQueries(0):
+            self.assertFalse(request.roles.has_role(IQA_ROLE, uuid.uuid4()))
+
+        request.session['business_id'] = 'missing'
+        UserBusinessMiddleware(lambda request: None)(request)
+        self.assertIsNone(request.user_business)
+        self.assertFalse(request.roles)
+
+
+class RoleCacheTests(QualificationTreeTestCase):
+    def assert_cached_roles_follow_changes(self):
+        from qualifications.roles import load_role_map, ASSESSOR, EQA_ROLE
+        from qualifications.models import EQA
+        other_qual = Qual.objects.create(
+            qualification_title="Other Qual", qualification_number="Q2", awarding_body="AB", business=self.business
+        )
+        self.assertTrue(load_role_map(self.assessor_ub).has_role(ASSESSOR, self.qual.id))
+        with self.assertNumQueries(0):
+            self.assertFalse(load_role_map(self.assessor_ub).has_role(EQA_ROLE))
+
+        eqa = EQA.objects.create(user=self.assessor_ub, qualification=other_qual)
+        self.assertTrue(load_role_map(self.assessor_ub).has_role(EQA_ROLE, other_qual.id))
+        eqa.delete()
+        self.assertFalse(load_role_map(self.assessor_ub).has_role(EQA_ROLE))
+
+    def test_locmem_cache(self):
+        from django.test import override_settings
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'roles-test'}}):
+            self.assert_cached_roles_follow_changes()
+
+    def test_file_based_cache(self):
+        import tempfile
+        from django.test import override_settings
+        with tempfile.TemporaryDirectory() as location:
+            with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}):
+                self.assert_cached_roles_follow_changes()
+
+    def test_roles_cached_before_commit_are_dropped_on_commit(self):
+        from qualifications.roles import load_role_map, role_map_version, ASSESSOR
+        self.assertTrue(load_role_map(self.assessor_ub).has_role(ASSESSOR, self.qual.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            Assessor.objects.filter(user=self.assessor_ub).delete()
+            # Stands in for a concurrent request that read the old rows before this commit
+            load_role_map(self.assessor_ub)
+            version = role_map_version(self.assessor_ub.pk)
+        self.assertNotEqual(role_map_version(self.assessor_ub.pk), version)
+        self.assertFalse(load_role_map(self.assessor_ub).has_role(ASSESSOR, self.qual.id))
+
+
+class UnreadMessageCountTests(QualificationTreeTestCase):
+    def test_context_processor_counts_unread_without_join(self):
+        from django.test import RequestFactory
+        from AssessEEZ.context_processors import user_context
+        from qualifications.models import Message, MessageRecipient
+        recipient = self.learners[0].user
+        for i in range(3):
+            message = Message.objects.create(sender=self.assessor_ub, subject=f"Subject {i}", body="Body")
+            MessageRecipient.objects.create(message=message, recipient=recipient)
+            MessageRecipient.objects.create(message=message, recipient=self.learners[1].user)
+
+        request = RequestFactory().get('/')
+        request.user = recipient.user
+        request.user_business = recipient
+        with self.assertNumQueries(1):
+            self.assertEqual(user_context(request)['unread_count'], 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(user_context(request)['unread_count'], 3)
+
+        first = MessageRecipient.objects.filter(recipient=recipient).first()
+        first.is_read = True
+        first.save()
+        self.assertEqual(user_context(request)['unread_count'], 2)
+        self.assertEqual(user_context(request)['business'], self.business)
+
+
+class MessageThreadTests(QualificationTreeTestCase):
+    def login(self, user_business):
+        self.client.force_login(user_business.user)
+        session = self.client.session
+        session['business_id'] = self.business.business_id
+        session.save()
+
+    def send(self, sender, recipients, subject, thread=None):
+        from django.urls import reverse
+        self.login(sender)
+        url = reverse('qualifications:compose_message')
+        if thread:
+            url += f"?reply=true&thread_id={thread.id}&qualification={self.qual.id}" + ''.join(f"&recipient={r.id}" for r in recipients)
+        response = self.client.post(url, {
+            'qualification': str(self.qual.id),
+            'recipients': [str(r.id) for r in recipients],
+            'subject': subject,
+            'body': 'Hello',
+        })
+        self.assertEqual(response.status_code, 302)
+
+    def test_replies_stay_in_thread_and_unread_counts_follow(self):
+        from django.urls import reverse
+        from qualifications.models import Thread, ThreadParticipant
+        learner = self.learners[0].user
+        self.send(self.assessor_ub, [learner], "Evidence")
+        self.send(self.assessor_ub, [self.learners[1].user], "Evidence")
+        self.assertEqual(Thread.objects.filter(subject="Evidence").count(), 2)
+
+        thread = Thread.objects.get(participants__user_business=learner)
+        self.send(learner, [self.assessor_ub], "Evidence", thread=thread)
+        self.send(self.assessor_ub, [learner], "Evidence", thread=thread)
+        self.assertEqual(thread.messages.count(), 3)
+        participant = ThreadParticipant.objects.get(thread=thread, user_business=learner)
+        self.assertEqual(participant.unread_count, 2)
+
+        self.login(learner)
+        response = self.client.get(reverse('qualifications:inbox'))
+        self.assertEqual([p.thread_id for p in response.context['threads']], [thread.id])
+        response = self.client.get(reverse('qualifications:message_thread', args=[thread.id]))
+        self.assertEqual(len(response.context['messages']), 3)
+        participant.refresh_from_db()
+        self.assertEqual(participant.unread_count, 0)
+
+        # Old links carried a message id
+        response = self.client.get(reverse('qualifications:message_thread', args=[thread.messages.first().id]))
+        self.assertRedirects(response, reverse('qualifications:message_thread', args=[thread.id]))
+
+    def test_backfill_groups_messages_by_business_and_subject(self):
+        import importlib
+        from django.apps import apps
+        from qualifications.models import Message, MessageRecipient, Thread, ThreadParticipant
+        backfill = importlib.import_module('qualifications.migrations.0015_backfill_message_threads').backfill_threads
+        learner = self.learners[0].user
+        for subject in ("Evidence", "Evidence", "Other"):
+            message = Message.objects.create(sender=self.assessor_ub, subject=subject, body="Body")
+            MessageRecipient.objects.create(message=message, recipient=learner)
+
+        backfill(apps, None)
+        self.assertFalse(Message.objects.filter(thread__isnull=True).exists())
+        self.assertEqual(Thread.objects.count(), 2)
+        participant = ThreadParticipant.objects.get(thread__subject="Evidence", user_business=learner)
+        self.assertEqual(participant.unread_count, 2)
+        self.assertIsNotNone(ThreadParticipant.objects.get(thread__subject="Other", user_business=self.assessor_ub).last_sent_at)
+
+
+class MailboxPaginationTests(QualificationTreeTestCase):
+    def setUp(self):
+        super().setUp()
+        from django.utils import timezone
+        from qualifications.models import Thread, ThreadParticipant
+        now = timezone.now()
+        self.learner = self.learners[0].user
+        for i in range(5):
+            thread = Thread.objects.create(business=self.business, subject=f"Thread {i}")
+            # Two pairs share a timestamp so the id tie-breaker is exercised
+            ThreadParticipant.objects.create(thread=thread, user_business=self.learner, last_received_at=now - timezone.timedelta(minutes=i // 2))
+
+    def test_keyset_pages_cover_every_thread_once(self):
+        from qualifications.messaging import mailbox_page
+        seen, cursor = [], None
+        while True:
+            with self.assertNumQueries(1):
+                rows, cursor = mailbox_page(self.learner, 'inbox', cursor, page_size=2)
+            seen.extend(rows)
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len({row.id for row in seen}), 5)
+        keys = [(row.last_received_at, row.id) for row in seen]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+        self.assertEqual(mailbox_page(self.learner, 'sent'), ([], None))
+
+    def test_json_endpoint_returns_cursor(self):
+        from django.urls import reverse
+        from qualifications.messaging import THREAD_PAGE_SIZE
+        self.client.force_login(self.learner.user)
+        session = self.client.session
+        session['business_id'] = self.business.business_id
+        session.save()
+        response = self.client.get(reverse('qualifications:mailbox_api', args=['inbox']))
+        data = response.json()
+        self.assertEqual(len(data['threads']), min(5, THREAD_PAGE_SIZE))
+        self.assertIsNone(data['next_cursor'])
+        self.assertEqual(self.client.get(reverse('qualifications:mailbox_api', args=['drafts'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('qualifications:inbox') + '?cursor=garbage').status_code, 200)
+
+
+class ComposeFanOutTests(QualificationTreeTestCase):
+    def post_message(self, recipients):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.urls import reverse
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('qualifications:compose_message'), {
+                'qualification': str(self.qual.id),
+                'recipients': [str(r.id) for r in recipients],
+                'subject': 'Cohort update',
+                'body': 'Hello',
+            })
+        self.assertEqual(response.status_code, 302)
+        return len(queries)
+
+    def test_fan_out_is_constant_and_emails_are_queued(self):
+        from django.core import mail
+        from django.test import override_settings
+        from qualifications.models import MessageRecipient
+        for i in range(3, 6):
+            self.learners.append(Learner.objects.create(
+                user=self.make_user_business(f"learner{i}@example.com"),
+                qualification=self.qual,
+                assessor=self.assessor_ub,
+                iqa=self.iqa_ub,
+            ))
+        self.client.force_login(self.assessor_ub.user)
+        session = self.client.session
+        session['business_id'] = self.business.business_id
+        session.save()
+
+        with override_settings(EMAIL_QUEUE_EAGER=True):
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.post_message([learner.user for learner in self.learners[:2]])
+            self.assertEqual(len(mail.outbox), 0)
+            for callback in callbacks:
+                callback()
+            self.assertEqual(len(mail.outbox), 2)
+            with self.captureOnCommitCallbacks(execute=True):
+                few = self.post_message([learner.user for learner in self.learners[:2]])
+                many = self.post_message([learner.user for learner in self.learners])
+
+        self.assertEqual(few, many)
+        self.assertEqual(len(mail.outbox), 10)
+        self.assertIn('Assessor', mail.outbox[-1].body)
+        self.assertEqual(MessageRecipient.objects.count(), 10)
+
+
+class RecipientQueryTests(QualificationTreeTestCase):
+    def recipients(self, user_business):
+        from qualifications.messaging import recipients_for_qualification
+        from qualifications.roles import load_role_map
+        role_map = load_role_map(user_business)
+        with self.assertNumQueries(1):
+            recipients = recipients_for_qualification(user_business, self.qual.id, role_map)
+        return {r.user.email: r.role_label for r in recipients}
+
+    def test_recipients_and_role_labels_in_one_query(self):
+        admin = self.make_user_business("admin@example.com", user_type='admin')
+        learner = self.learners[0].user
+        self.assertEqual(self.recipients(learner), {
+            'assessor@example.com': 'Assessor', 'iqa@example.com': 'IQA', 'admin@example.com': 'Admin',
+        })
+        assessor_view = self.recipients(self.assessor_ub)
+        self.assertEqual(assessor_view['iqa@example.com'], 'IQA')
+        self.assertEqual(len([label for label in assessor_view.values() if label == 'Learner']), 3)
+        admin_view = self.recipients(admin)
+        self.assertEqual(len(admin_view), 5)
+        self.assertNotIn('admin@example.com', admin_view)
+
+    def test_compose_choices_come_from_the_role_map(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.urls import reverse
+        other = Qual.objects.create(qualification_title="Other", business=self.business)
+        self.client.force_login(self.assessor_ub.user)
+        session = self.client.session
+        session['business_id'] = self.business.business_id
+        session.save()
+        self.client.get(reverse('qualifications:compose_message'))  # warm the role cache
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('qualifications:compose_message'))
+        self.assertEqual(list(response.context['form'].fields['qualification'].queryset), [self.qual])
+        self.assertNotIn(other, response.context['form'].fields['qualification'].queryset)
+        role_tables = [query['sql'] for query in queries if any(
+            f'"qualifications_{table}"' in query['sql'] for table in ('learner', 'assessor', 'iqa', 'eqa')
+        )]
+        self.assertEqual(role_tables, [])
+
+    def test_endpoint_returns_labels(self):
+        from django.urls import reverse
+        self.client.force_login(self.iqa_ub.user)
+        session = self.client.session
+        session['business_id'] = self.business.business_id
+        session.save()
+        response = self.client.get(reverse('qualifications:get_recipients_by_qualification'), {'qualification': str(self.qual.id)})
+        roles = sorted(r['role'] for r in response.json()['recipients'])
+        self.assertEqual(roles, ['Assessor', 'Learner', 'Learner', 'Learner'])
+
+
+class EmailOutboxTests(QualificationTreeTestCase):
+    def test_rows_commit_with_transaction_and_worker_sends_them(self):
+        from django.core import mail
+        from django.core.management import call_command
+        from django.db import transaction
+        from django.utils import timezone
+        from AssessEEZ.email_queue import enqueue_email
+        from AssessEEZ.email_utils import send_notification_email
+        from qualifications.models import OutboxEmail
+        kwargs = dict(
+            recipient_email='learner0@example.com', learner_name='Learner', business_name='Business 1',
+            notification_message='Accepted', notification_date=timezone.now()
+        )
+        try:
+            with transaction.atomic():
+                enqueue_email(send_notification_email, **kwargs)
+                raise RuntimeError("roll back")
+        except RuntimeError:
+            pass
+        self.assertFalse(OutboxEmail.objects.exists())
+
+        outbox = enqueue_email(send_notification_email, **kwargs)
+        self.assertEqual(len(mail.outbox), 0)
+        call_command('send_queued_emails', once=True, concurrency=1, stdout=StringIO())
+        outbox.refresh_from_db()
+        self.assertEqual(outbox.status, 'SENT')
+        self.assertEqual(outbox.payload, {})
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Accepted', mail.outbox[0].body)
+
+    def test_failures_back_off_then_give_up(self):
+        from unittest import mock
+        from django.test import override_settings
+        from django.utils import timezone
+        from AssessEEZ.email_queue import drain, enqueue_email
+        from AssessEEZ.email_utils import send_notification_email
+        from qualifications.models import OutboxEmail
+        outbox = enqueue_email(
+            send_notification_email, recipient_email='learner0@example.com', learner_name='Learner',
+            business_name='Business 1', notification_message='Accepted', notification_date=timezone.now()
+        )
+        with override_settings(EMAIL_QUEUE_MAX_ATTEMPTS=2, EMAIL_QUEUE_RETRY_BASE=60), \
+                mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=ConnectionError("SES down")):
+            self.assertEqual(drain(), (0, 1))
+            outbox.refresh_from_db()
+            self.assertEqual((outbox.status, outbox.attempts, outbox.last_error), ('PENDING', 1, 'SES down'))
+            self.assertGreater(outbox.next_attempt_at, timezone.now() + timezone.timedelta(seconds=50))
+            self.assertEqual(drain(), (0, 0))  # not due yet
+
+            OutboxEmail.objects.filter(id=outbox.id).update(next_attempt_at=timezone.now())
+            self.assertEqual(drain(), (0, 1))
+            outbox.refresh_from_db()
+            self.assertEqual(outbox.status, 'FAILED')
+            self.assertEqual(outbox.payload, {})
+
+    def test_welcome_emails_queue_a_password_link_not_a_password(self):
+        import re
+        from django.conf import settings
+        from django.contrib.auth.tokens import default_token_generator
+        from django.core import mail
+        from django.urls import reverse
+        from AssessEEZ.email_queue import drain, enqueue_email
+        from AssessEEZ.email_utils import send_welcome_email
+        user = self.iqa_ub.user
+        outbox = enqueue_email(
+            send_welcome_email, user.email, self.business.name, None, settings.LOGIN_URL, self.business.name,
+            role='IQA', qualification_title=self.qual.qualification_title, set_password=True
+        )
+        self.assertNotIn('password', str(outbox.payload['args']))
+        self.assertEqual(drain(), (1, 0))
+
+        link = re.search(r'href="([^"]*password-reset-redirect[^"]*)"', mail.outbox[0].body).group(1)
+        uidb64, token = link.rstrip('/').split('/')[-2:]
+        self.assertEqual(link, f"{settings.SITE_URL}{reverse('users:password_reset_redirect', args=[uidb64, token])}")
+        self.assertTrue(default_token_generator.check_token(user, token))
+
+    def test_worker_sends_a_batch_at_once(self):
+        from unittest import mock
+        from django.core import mail
+        from django.utils import timezone
+        from AssessEEZ import email_backends
+        from AssessEEZ.email_queue import drain, enqueue_email
+        from AssessEEZ.email_utils import send_notification_email
+        for learner in self.learners:
+            enqueue_email(
+                send_notification_email, recipient_email=learner.user.user.email, learner_name='Learner',
+                business_name='Business 1', notification_message='Accepted', notification_date=timezone.now()
+            )
+        with mock.patch('AssessEEZ.email_queue.send_batch', wraps=email_backends.send_batch) as send_batch:
+            self.assertEqual(drain(concurrency=2), (3, 0))
+        send_batch.assert_called_once()
+        self.assertEqual(send_batch.call_args.kwargs['max_workers'], 2)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), sorted(learner.user.user.email for learner in self.learners))
+
+    def test_unknown_helpers_are_rejected(self):
+        from AssessEEZ.email_queue import enqueue_email
+        with self.assertRaises(ValueError):
+            enqueue_email(print, 'not an email')
+
+
+class SESBatchSendTests(TestCase):
+    class StubSES:
+        """
+        Stands in for the boto3 SES client: records send_raw_email calls and fails for bounced addresses.
+        """
+        def __init__(self, bounce=()):
+            import threading
+            self.bounce = set(bounce)
+            self.calls = []
+            self.lock = threading.Lock()
+            self.active = self.peak = 0
+
+        def send_raw_email(self, Source, Destinations, RawMessage):
+            import time
+            from botocore.exceptions import ClientError
+            with self.lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+                self.calls.append((Source, Destinations))
+            time.sleep(0.01)
+            with self.lock:
+                self.active -= 1
+            if self.bounce.intersection(Destinations):
+                raise ClientError({'Error': {'Code': 'MessageRejected', 'Message': 'Address blacklisted.'}}, 'SendRawEmail')
+            return {'MessageId': f'id-{Destinations[0]}'}
+
+    def messages(self, count):
+        from django.core.mail import EmailMessage
+        return [
+            EmailMessage(subject=f'Hello {i}', body='Body', from_email='noreply@assesseez.co.uk', to=[f'user{i}@example.com'])
+            for i in range(count)
+        ]
+
+    def test_backends_share_one_client(self):
+        from unittest import mock
+        from AssessEEZ import email_backends
+        email_backends.reset_ses_client()
+        self.addCleanup(email_backends.reset_ses_client)
+        with mock.patch('AssessEEZ.email_backends.config', return_value='test'), \
+                mock.patch('AssessEEZ.email_backends.boto3.client', return_value=self.StubSES()) as client_factory:
+            for message in self.messages(3):
+                self.assertEqual(email_backends.SESEmailBackend().send_messages([message]), 1)
+        self.assertEqual(client_factory.call_count, 1)
+        self.assertEqual(len(client_factory.return_value.calls), 3)
+
+    def test_batch_reports_each_message_with_bounded_concurrency(self):
+        from unittest import mock
+        from AssessEEZ.email_backends import SESEmailBackend, send_batch
+        stub = self.StubSES(bounce={'user3@example.com'})
+        messages = self.messages(12)
+        with mock.patch('AssessEEZ.email_backends._client', stub):
+            results = send_batch(messages, connection=SESEmailBackend(), max_workers=4)
+
+        self.assertEqual([result.message for result in results], messages)
+        self.assertEqual(len(stub.calls), 12)
+        self.assertLessEqual(stub.peak, 4)
+        self.assertGreater(stub.peak, 1)
+        self.assertEqual(results[0].message_id, 'id-user0@example.com')
+        self.assertIsNone(results[0].error)
+        self.assertIsNone(results[3].message_id)
+        self.assertEqual(results[3].error.response['Error']['Code'], 'MessageRejected')
+        self.assertEqual(sum(result.error is None for result in results), 11)
+
+    def test_batch_falls_back_for_other_backends(self):
+        from django.core import mail
+        from AssessEEZ.email_backends import send_batch
+        results = send_batch(self.messages(3))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertTrue(all(result.error is None for result in results))
+
+
+class EmailComposeTests(TestCase):
+    def test_logo_and_templates_load_once(self):
+        from unittest import mock
+        from AssessEEZ import email_utils
+        email_utils._logo_part.cache_clear()
+        email_utils._template.cache_clear()
+        self.addCleanup(email_utils._logo_part.cache_clear)
+        context = {
+            'learner_name': 'Learner', 'business_name': 'Business 1', 'notification_message': 'Accepted',
+            'notification_date': '2026-10-18 09:00', 'login_url': '/login/', 'support_email': 'support@assesseez.co.uk',
+        }
+        with mock.patch('AssessEEZ.email_utils.open', mock.mock_open(read_data=b'GIF89a'), create=True) as opened, \
+                mock.patch('AssessEEZ.email_utils.find_logo_path', return_value='/static/images/assesseez_logo.png'), \
+                mock.patch('AssessEEZ.email_utils.get_template', wraps=email_utils.get_template) as get_template:
+            messages = [email_utils.compose('notification', context, [f'user{i}@example.com']) for i in range(5)]
+        self.assertEqual(opened.call_count, 1)
+        self.assertEqual(get_template.call_count, 1)
+
+        message = messages[0]
+        self.assertEqual(message.subject, 'AssessEEZ: New Notification')
+        self.assertEqual(message.content_subtype, 'html')
+        self.assertIn('cid:assesseez_logo', message.body)
+        self.assertIn('Content-ID: <assesseez_logo>', message.message().as_string())
+        self.assertIsNot(messages[0].attachments[0], messages[1].attachments[0])
+
+    def test_missing_logo_renders_without_it(self):
+        from unittest import mock
+        from AssessEEZ import email_utils
+        email_utils._logo_part.cache_clear()
+        self.addCleanup(email_utils._logo_part.cache_clear)
+        with mock.patch('AssessEEZ.email_utils.find_logo_path', return_value=None):
+            message = email_utils.compose('document_submission', {
+                'assessor_name': 'Assessor', 'learner_name': 'Learner', 'qualification_title': 'Qual',
+                'business_name': 'Business 1', 'business_id': 'B1', 'submission_type': 'Workbook',
+                'login_url': '/login/', 'admin_email': 'admin@example.com',
+            }, ['assessor@example.com'])
+        self.assertEqual(message.subject, 'AssessEEZ: New Workbook Submission Notification')
+        self.assertEqual(message.attachments, [])
+        self.assertNotIn('cid:assesseez_logo', message.body)
+
+
+class NotificationDigestTests(QualificationTreeTestCase):
+    def grade_all(self, learner):
+        from django.urls import reverse
+        from qualifications.models import EvidenceSubmission
+        for ac in self.acs:
+            EvidenceSubmission.objects.create(user=learner.user, assessment_criterion=ac, status='SUBMITTED')
+        self.client.force_login(self.assessor_ub.user)
+        session = self.client.session
+        session['business_id'] = self.business.business_id
+        session.save()
+        data = {'lo_id': str(self.lo.id), 'feedback_detail': 'Well done'}
+        data.update({f'status_{ac.id}': 'ACCEPTED' for ac in self.acs})
+        response = self.client.post(reverse('qualifications:assessor_feedback', args=[self.qual.id, learner.id]), data)
+        self.assertEqual(response.status_code, 302)
+
+    def test_without_window_each_notification_is_emailed(self):
+        from qualifications.models import OutboxEmail
+        self.grade_all(self.learners[0])
+        self.assertEqual(OutboxEmail.objects.filter(kind='send_notification_email').count(), 4)
+
+    def test_window_collapses_grading_into_one_digest(self):
+        from django.core import mail
+        from django.test import override_settings
+        from django.utils import timezone
+        from AssessEEZ.email_queue import drain
+        from qualifications.models import Notification, OutboxEmail
+        learner = self.learners[0]
+        with override_settings(NOTIFICATION_DIGEST_WINDOW=600):
+            self.grade_all(learner)
+        self.assertEqual(Notification.objects.filter(user=learner.user, digest_pending=True).count(), 4)
+        digest = OutboxEmail.objects.get()
+        self.assertEqual(digest.kind, 'send_notification_digest_email')
+        self.assertGreater(digest.next_attempt_at, timezone.now() + timezone.timedelta(seconds=500))
+        self.assertEqual(drain(), (0, 0))
+
+        OutboxEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(drain(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['learner0@example.com'])
+        for ac in self.acs:
+            self.assertIn(f"Your latest Submission for &#x27;{ac.ac_detail}&#x27; has been Accepted.", mail.outbox[0].body)
+        self.assertFalse(Notification.objects.filter(digest_pending=True).exists())
+
+    def test_next_window_starts_after_digest_is_claimed(self):
+        from django.test import override_settings
+        from qualifications.models import Notification, OutboxEmail
+        from qualifications.notifications import queue_notification_email
+        learner_user = self.learners[0].user
+        with override_settings(NOTIFICATION_DIGEST_WINDOW=600):
+            for i in range(3):
+                queue_notification_email(Notification.objects.create(user=learner_user, message=f"Event {i}"), 'Business 1')
+            self.assertEqual(OutboxEmail.objects.count(), 1)
+            OutboxEmail.objects.update(status='SENDING')
+            queue_notification_email(Notification.objects.create(user=learner_user, message="Late event"), 'Business 1')
+        self.assertEqual(OutboxEmail.objects.filter(status='PENDING').count(), 1)
+
+
+class StubS3:
+    """
+    Minimal stand-in for the boto3 S3 client: one bucket of in-memory objects with ETags,
+    honouring the Range and IfNoneMatch parameters of get_object.
+    """
+    def __init__(self, objects):
+        import hashlib
+        self.objects = {key: (data, f'"{hashlib.md5(data).hexdigest()}"') for key, data in objects.items()}
+        self.calls = []
+
+    def get_object(self, Bucket, Key, Range=None, IfNoneMatch=None):
+        import io
+        from botocore.exceptions import ClientError
+        from botocore.response import StreamingBody
+        self.calls.append({'Bucket': Bucket, 'Key': Key, 'Range': Range, 'IfNoneMatch': IfNoneMatch})
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey', 'Message': 'Not found'}}, 'GetObject')
+        data, etag = self.objects[Key]
+        if IfNoneMatch == etag:
+            raise ClientError({'Error': {'Code': '304', 'Message': 'Not Modified'}}, 'GetObject')
+        response = {'ETag': etag}
+        if Range:
+            start, end = Range[len('bytes='):].split('-')
+            if not start:
+                start, end = len(data) - int(end), len(data) - 1
+            start, end = int(start), min(int(end or len(data) - 1), len(data) - 1)
+            if start >= len(data):
+                raise ClientError({'Error': {'Code': 'InvalidRange', 'Message': 'Bad range'}}, 'GetObject')
+            response['ContentRange'] = f'bytes {start}-{end}/{len(data)}'
+            data = data[start:end + 1]
+        response.update({'Body': StreamingBody(io.BytesIO(data), len(data)), 'ContentLength': len(data)})
+        return response
+
+    def generate_presigned_post(self, Bucket, Key, Fields, Conditions, ExpiresIn):
+        self.calls.append({'presign_post': Key, 'Conditions': Conditions})
+        return {'url': f'https://{Bucket}.example.com/', 'fields': dict(Fields, key=Key)}
+
+    def head_object(self, Bucket, Key):
+        from botocore.exceptions import ClientError
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, 'HeadObject')
+        data, etag = self.objects[Key]
+        return {'ContentLength': len(data), 'ETag': etag}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn):
+        self.calls.append({'presign': Params['Key'], 'ExpiresIn': ExpiresIn})
+        return f"https://media.example.com/{Params['Key']}?sig={len(self.calls)}"
+
+
+class ServeFileTests(QualificationTreeTestCase):
+    def setUp(self):
+        super().setUp()
+        from unittest import mock
+        from django.test import override_settings
+        from qualifications.models import ResourceFolder, ResourceFile
+        folder = ResourceFolder.objects.create(name="Videos", business=self.business, visible_to_roles=['LEARNER'])
+        self.resource = ResourceFile.objects.create(folder=folder, title="Clip", file='resources/2026/10/18/clip.mp4')
+        self.data = bytes(range(256)) * 1024
+        self.s3 = StubS3({'resources/2026/10/18/clip.mp4': self.data})
+        for patcher in (
+            mock.patch('qualifications.file_serving._client', self.s3),
+            mock.patch('qualifications.file_serving.STREAM_CHUNK_SIZE', 10000),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        settings_override = override_settings(AWS_STORAGE_BUCKET_NAME='media')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_login(self.learners[0].user.user)
+
+    def get(self, **headers):
+        from django.urls import reverse
+        return self.client.get(reverse('qualifications:serve_file', args=[self.resource.id]), headers=headers)
+
+    def test_streams_whole_file_in_chunks_with_etag(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        chunks = list(response.streaming_content)
+        self.assertEqual(b''.join(chunks), self.data)
+        self.assertEqual(len(chunks), 27)
+        self.assertEqual(response['Content-Length'], str(len(self.data)))
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['ETag'], self.s3.objects['resources/2026/10/18/clip.mp4'][1])
+        self.assertEqual(self.s3.calls[0]['Bucket'], 'media')
+
+    def test_range_request_returns_partial_content(self):
+        response = self.get(Range='bytes=1000-1999')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.data[1000:2000])
+        self.assertEqual(response['Content-Range'], f'bytes 1000-1999/{len(self.data)}')
+        self.assertEqual(response['Content-Length'], '1000')
+
+        response = self.get(Range=f'bytes={len(self.data) + 10}-')
+        self.assertEqual(response.status_code, 416)
+
+        # Multi-range requests fall back to the whole file
+        response = self.get(Range='bytes=0-1,5-6')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(self.s3.calls[-1]['Range'])
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.get()['ETag']
+        response = self.get(If_None_Match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.get(If_None_Match='"stale"').status_code, 200)
+
+    def test_other_business_cannot_download(self):
+        other = Business.objects.create(business_id="B2", name="Business 2")
+        user = CustomUser.objects.create(email="outsider@example.com")
+        UserBusiness.objects.create(user=user, business=other)
+        self.client.force_login(user)
+        self.assertEqual(self.get().status_code, 404)
+        self.assertEqual(self.s3.calls, [])
+
+
+@override_settings(AWS_STORAGE_BUCKET_NAME='media', FILE_DOWNLOAD_MODE='redirect', PRESIGNED_URL_EXPIRY=600)
+class PresignedDownloadTests(QualificationTreeTestCase):
+    def setUp(self):
+        super().setUp()
+        from unittest import mock
+        from django.core.cache import cache
+        from qualifications.models import EvidenceSubmission, EvidenceFile, ResourceFolder, ResourceFile
+        cache.clear()
+        folder = ResourceFolder.objects.create(name="Guides", business=self.business, visible_to_roles=['LEARNER'])
+        self.resource = ResourceFile.objects.create(folder=folder, title="Guide", file='resources/guide.pdf')
+        submission = EvidenceSubmission.objects.create(user=self.learners[0].user, assessment_criterion=self.acs[0])
+        self.evidence = EvidenceFile.objects.create(evidence_submission=submission, evidence_file='evidence/essay.pdf')
+        self.s3 = StubS3({'resources/guide.pdf': b'%PDF guide', 'evidence/essay.pdf': b'%PDF essay'})
+        patcher = mock.patch('qualifications.file_serving._client', self.s3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def login(self, user_business):
+        self.client.force_login(user_business.user)
+        session = self.client.session
+        session['business_id'] = user_business.business.business_id
+        session.save()
+
+    def evidence_url(self):
+        from django.urls import reverse
+        return reverse('qualifications:download_file', args=['evidence', self.evidence.id])
+
+    def test_resource_redirect_reuses_cached_url(self):
+        from django.urls import reverse
+        self.login(self.learners[0].user)
+        url = reverse('qualifications:serve_file', args=[self.resource.id])
+        first, second = self.client.get(url), self.client.get(url)
+        self.assertEqual(first.status_code, 302)
+        self.assertEqual(first['Location'], second['Location'])
+        self.assertTrue(first['Location'].startswith('https://media.example.com/resources/guide.pdf'))
+        self.assertEqual(self.s3.calls, [{'presign': 'resources/guide.pdf', 'ExpiresIn': 600}])
+
+    def test_learner_file_permissions(self):
+        self.login(self.learners[0].user)
+        self.assertEqual(self.client.get(self.evidence_url()).status_code, 302)
+        self.login(self.assessor_ub)
+        self.assertEqual(self.client.get(self.evidence_url()).status_code, 302)
+        self.login(self.make_user_business("admin@example.com", user_type='admin'))
+        self.assertEqual(self.client.get(self.evidence_url()).status_code, 302)
+
+        self.login(self.learners[1].user)
+        self.assertEqual(self.client.get(self.evidence_url()).status_code, 404)
+        self.login(self.make_user_business("staff@example.com"))
+        self.assertEqual(self.client.get(self.evidence_url()).status_code, 404)
+        self.assertEqual(len(self.s3.calls), 1)
+
+    def test_only_assigned_staff_read_learner_files(self):
+        from qualifications.models import EQA
+        other_assessor = self.make_user_business("assessor2@example.com")
+        Assessor.objects.create(user=other_assessor, qualification=self.qual)
+        self.login(other_assessor)
+        self.assertEqual(self.client.get(self.evidence_url()).status_code, 404)
+
+        self.login(self.iqa_ub)
+        self.assertEqual(self.client.get(self.evidence_url()).status_code, 302)
+
+        eqa_ub = self.make_user_business("eqa@example.com")
+        eqa = EQA.objects.create(user=eqa_ub, qualification=self.qual)
+        self.login(eqa_ub)
+        self.assertEqual(self.client.get(self.evidence_url()).status_code, 404)
+        eqa.learners.add(self.learners[0])
+        self.assertEqual(self.client.get(self.evidence_url()).status_code, 302)
+
+    def test_learner_files_are_stored_privately(self):
+        from unittest import mock
+        from django.core.management import call_command
+        from qualifications.file_serving import LEARNER_FILES
+        for model, file_field, _, _ in LEARNER_FILES.values():
+            storage = model._meta.get_field(file_field).storage
+            self.assertEqual((storage.default_acl, storage.querystring_auth, storage.custom_domain), ('private', True, None))
+
+        client = mock.Mock()
+        client.get_paginator.return_value.paginate.side_effect = lambda Bucket, Prefix: [
+            {'Contents': [{'Key': f'{Prefix}a.pdf'}, {'Key': f'{Prefix}b.pdf'}]}
+        ]
+        with mock.patch('qualifications.management.commands.make_learner_files_private.get_s3_client', return_value=client), \
+                override_settings(AWS_STORAGE_BUCKET_NAME='media'):
+            call_command('make_learner_files_private', stdout=StringIO())
+        self.assertEqual(client.put_object_acl.call_count, 2 * len(LEARNER_FILES))
+        client.put_object_acl.assert_any_call(Bucket='media', Key='evidence/a.pdf', ACL='private')
+
+    @override_settings(FILE_DOWNLOAD_MODE='stream')
+    def test_stream_mode_proxies_learner_file(self):
+        self.login(self.assessor_ub)
+        response = self.client.get(self.evidence_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF essay')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+
+@override_settings(AWS_STORAGE_BUCKET_NAME='media', DIRECT_UPLOADS=True)
+class DirectUploadTests(QualificationTreeTestCase):
+    def setUp(self):
+        super().setUp()
+        from unittest import mock
+        self.s3 = StubS3({})
+        patcher = mock.patch('qualifications.file_serving._client', self.s3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.learner = self.learners[0]
+        self.login(self.learner.user)
+
+    def login(self, user_business):
+        self.client.force_login(user_business.user)
+        session = self.client.session
+        session['business_id'] = self.business.business_id
+        session.save()
+
+    def start(self, kind='evidence', filename='essay.pdf', size=1024):
+        from django.urls import reverse
+        return self.client.post(
+            reverse('qualifications:direct_upload', args=[self.qual.id]),
+            {'kind': kind, 'filename': filename, 'size': size}
+        )
+
+    def submit_evidence(self, *tokens):
+        from django.urls import reverse
+        return self.client.post(reverse('qualifications:learner_view', args=[self.qual.id]), {
+            'evidence_submit': '', 'ac_id': str(self.acs[0].id), 'evidence_detail': '', 'evidence_uploads': list(tokens),
+        })
+
+    def test_presigned_upload_is_recorded_on_submission(self):
+        from qualifications.models import EvidenceFile
+        upload = self.start().json()
+        key = upload['fields']['key']
+        self.assertTrue(key.startswith('evidence/') and key.endswith('/essay.pdf'))
+        self.assertIn(['content-length-range', 1, 1000 * 1024 * 1024], self.s3.calls[0]['Conditions'])
+
+        self.s3.objects[key] = (b'%PDF' * 256, '"etag"')  # the browser's POST to the bucket
+        response = self.submit_evidence(upload['token'])
+        self.assertEqual(response.status_code, 302)
+        evidence = EvidenceFile.objects.get()
+        self.assertEqual(evidence.evidence_file.name, key)
+        self.assertEqual(evidence.evidence_submission.user, self.learner.user)
+
+    def test_start_rejects_bad_files_and_non_learners(self):
+        self.assertEqual(self.start(filename='script.exe').status_code, 400)
+        self.assertEqual(self.start(size=2000 * 1024 * 1024).status_code, 400)
+        self.assertEqual(self.start(kind='resource').status_code, 400)
+        self.login(self.assessor_ub)
+        self.assertEqual(self.start().status_code, 404)
+
+    def test_submission_verifies_stored_object(self):
+        from unittest import mock
+        from qualifications.models import EvidenceFile
+        upload = self.start().json()
+        key = upload['fields']['key']
+        self.assertEqual(self.submit_evidence(upload['token']).status_code, 200)  # never uploaded
+
+        self.s3.objects[key] = (b'x', '"etag"')
+        with mock.patch('qualifications.direct_uploads.MAX_UPLOAD_MB', 0):
+            self.assertEqual(self.submit_evidence(upload['token']).status_code, 200)
+        self.assertNotIn(key, self.s3.objects)  # oversized objects are removed
+        self.assertFalse(EvidenceFile.objects.exists())
+
+    def test_tokens_are_bound_to_the_uploader(self):
+        from qualifications.models import EvidenceFile
+        upload = self.start().json()
+        self.s3.objects[upload['fields']['key']] = (b'%PDF', '"etag"')
+        self.login(self.learners[1].user)
+        self.assertEqual(self.submit_evidence(upload['token']).status_code, 200)
+        self.assertEqual(self.submit_evidence(upload['token'] + 'x').status_code, 200)
+        self.assertFalse(EvidenceFile.objects.exists())
+
+    def test_uploads_are_private_and_claimed_once(self):
+        from qualifications.models import EvidenceFile
+        upload = self.start().json()
+        self.assertIn({'acl': 'private'}, self.s3.calls[0]['Conditions'])
+        self.assertEqual(upload['fields']['acl'], 'private')
+
+        self.s3.objects[upload['fields']['key']] = (b'%PDF', '"etag"')
+        self.assertEqual(self.submit_evidence(upload['token'], upload['token']).status_code, 200)
+        self.assertFalse(EvidenceFile.objects.exists())
+        self.assertEqual(self.submit_evidence(upload['token']).status_code, 302)
+        self.assertEqual(self.submit_evidence(upload['token']).status_code, 200)
+        self.assertEqual(EvidenceFile.objects.count(), 1)
+
+    def test_concurrent_submissions_of_one_upload_claim_it_once(self):
+        from unittest import mock
+        from qualifications.models import EvidenceFile, EvidenceSubmission
+        upload = self.start().json()
+        self.s3.objects[upload['fields']['key']] = (b'%PDF', '"etag"')
+        self.assertEqual(self.submit_evidence(upload['token']).status_code, 302)
+        EvidenceSubmission.objects.update(status='ACCEPTED')  # the next post opens a new submission
+        # A second request racing the first passes the early check before the first commits
+        with mock.patch('qualifications.direct_uploads.already_claimed', return_value=False):
+            self.assertEqual(self.submit_evidence(upload['token']).status_code, 200)
+        self.assertEqual(EvidenceSubmission.objects.count(), 1)
+        self.assertEqual(EvidenceFile.objects.count(), 1)
+
+
+class ChunkedUploadTests(QualificationTreeTestCase):
+    def setUp(self):
+        super().setUp()
+        import tempfile
+        from unittest import mock
+        from django.core.files.storage import FileSystemStorage
+        from qualifications.models import EvidenceFile
+        media_root = tempfile.mkdtemp()
+        settings = override_settings(MEDIA_ROOT=media_root, CHUNKED_UPLOAD_CHUNK_SIZE=4, EMAIL_QUEUE_EAGER=False)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # Evidence and chunks normally land in the private S3 bucket; keep them on local disk here
+        field = EvidenceFile._meta.get_field('evidence_file')
+        self.bucket_storage = field.storage
+        self.storage = FileSystemStorage(location=media_root)
+        patcher = mock.patch.object(field, 'storage', self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.learner = self.learners[0]
+        self.login(self.learner.user)
+        self.data = b'0123456789'
+
+    def login(self, user_business):
+        self.client.force_login(user_business.user)
+        session = self.client.session
+        session['business_id'] = self.business.business_id
+        session.save()
+
+    def start(self, filename='notes.pdf'):
+        from django.urls import reverse
+        return self.client.post(
+            reverse('qualifications:chunked_upload_start', args=[self.qual.id]),
+            {'ac_id': str(self.acs[0].id), 'filename': filename, 'size': len(self.data)}
+        )
+
+    def send(self, upload_id, index, data=None):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.urls import reverse
+        data = self.data[index * 4:index * 4 + 4] if data is None else data
+        return self.client.post(
+            reverse('qualifications:chunked_upload_chunk', args=[upload_id, index]),
+            {'chunk': SimpleUploadedFile('blob', data)}
+        )
+
+    def complete(self, upload_id):
+        from django.urls import reverse
+        return self.client.post(
+            reverse('qualifications:chunked_upload_complete', args=[upload_id]), {'evidence_detail': 'My notes'}
+        )
+
+    def test_chunks_resume_and_assemble_into_evidence(self):
+        from django.urls import reverse
+        from qualifications.chunked_uploads import part_path
+        from qualifications.models import ChunkedUpload, EvidenceFile
+        upload = self.start().json()
+        self.assertEqual((upload['chunk_size'], upload['chunk_count']), (4, 3))
+        upload_id = upload['upload_id']
+
+        self.assertEqual(self.send(upload_id, 2).status_code, 200)
+        self.assertEqual(self.send(upload_id, 0, b'zzzz').status_code, 200)
+        self.assertEqual(self.send(upload_id, 1, b'xx').status_code, 400)  # wrong size
+        status = self.client.get(reverse('qualifications:chunked_upload_status', args=[upload_id])).json()
+        self.assertEqual(status['received'], [0, 2])
+        self.assertEqual(self.complete(upload_id).status_code, 400)
+
+        self.assertEqual(self.send(upload_id, 0).status_code, 200)  # retried chunk replaces the first copy
+        self.assertEqual(self.send(upload_id, 1).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            result = self.complete(upload_id).json()
+
+        evidence = EvidenceFile.objects.get()
+        self.assertEqual(result['evidence_file_id'], str(evidence.id))
+        with evidence.evidence_file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.data)
+        self.assertEqual(evidence.evidence_submission.status, 'SUBMITTED')
+        self.assertEqual(evidence.evidence_submission.evidence_detail, 'My notes')
+        upload = ChunkedUpload.objects.get(id=upload_id)
+        self.assertEqual(upload.status, 'COMPLETE')
+        self.assertFalse(upload.parts.exists())
+        self.assertFalse(self.storage.exists(part_path(upload, 0)))
+
+        # Completing again (a retried request) returns the same file
+        self.assertEqual(self.complete(upload_id).json()['evidence_file_id'], str(evidence.id))
+        self.assertEqual(EvidenceFile.objects.count(), 1)
+        self.assertEqual(self.send(upload_id, 0).status_code, 400)
+
+    def test_second_upload_joins_open_submission(self):
+        from qualifications.models import EvidenceSubmission
+        for _ in range(2):
+            upload_id = self.start().json()['upload_id']
+            for index in range(3):
+                self.send(upload_id, index)
+            self.assertEqual(self.complete(upload_id).status_code, 200)
+        submission = EvidenceSubmission.objects.get()
+        self.assertEqual(submission.files.count(), 2)
+
+    def upload_all(self):
+        upload_id = self.start().json()['upload_id']
+        for index in range(3):
+            self.send(upload_id, index)
+        return upload_id
+
+    def test_failed_completion_releases_the_upload(self):
+        import os
+        from unittest import mock
+        from django.conf import settings
+        from qualifications.models import ChunkedUpload, EvidenceFile
+        upload_id = self.upload_all()
+        with mock.patch('qualifications.chunked_uploads.rebuild_learner_progress', side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                self.complete(upload_id)
+        upload = ChunkedUpload.objects.get(id=upload_id)
+        self.assertEqual((upload.status, upload.assembling_since), ('UPLOADING', None))
+        self.assertFalse(EvidenceFile.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(settings.MEDIA_ROOT, 'evidence', *upload.created_at.strftime('%Y/%m/%d').split('/'))), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.complete(upload_id).status_code, 200)
+        self.assertEqual(ChunkedUpload.objects.get(id=upload_id).status, 'COMPLETE')
+
+    def test_stale_assembly_lease_is_taken_over(self):
+        from django.utils import timezone
+        from qualifications.chunked_uploads import ASSEMBLY_LEASE_SECONDS
+        from qualifications.models import ChunkedUpload
+        upload_id = self.upload_all()
+        ChunkedUpload.objects.filter(id=upload_id).update(status='ASSEMBLING', assembling_since=timezone.now())
+        self.assertEqual(self.complete(upload_id).status_code, 400)
+
+        ChunkedUpload.objects.filter(id=upload_id).update(
+            assembling_since=timezone.now() - timezone.timedelta(seconds=ASSEMBLY_LEASE_SECONDS + 1)
+        )
+        self.assertEqual(self.complete(upload_id).status_code, 200)
+
+    def test_cleanup_discards_abandoned_uploads(self):
+        from django.core.management import call_command
+        from django.utils import timezone
+        from qualifications.chunked_uploads import part_path
+        from qualifications.models import ChunkedUpload, ChunkedUploadPart
+        abandoned = self.start().json()['upload_id']
+        self.send(abandoned, 0)
+        active = self.start().json()['upload_id']
+        self.send(active, 0)
+        old = timezone.now() - timezone.timedelta(hours=72)
+        ChunkedUpload.objects.filter(id__in=[abandoned, active]).update(updated_at=old)
+        ChunkedUploadPart.objects.filter(upload_id=abandoned).update(received_at=old)
+
+        call_command('cleanup_chunked_uploads', stdout=StringIO())
+        self.assertEqual(list(ChunkedUpload.objects.values_list('id', flat=True)), [uuid.UUID(active)])
+        self.assertFalse(self.storage.exists(part_path(ChunkedUpload(id=abandoned), 0)))
+        self.assertTrue(self.storage.exists(part_path(ChunkedUpload(id=active), 0)))
+
+    def test_chunks_are_stored_in_the_private_bucket(self):
+        from unittest import mock
+        from django.core.files.storage import default_storage
+        from AssessEEZ.storage_backends import PrivateMediaStorage
+        from qualifications.chunked_uploads import chunk_storage, part_path
+        from qualifications.models import ChunkedUpload
+        self.assertIsInstance(self.bucket_storage, PrivateMediaStorage)
+        self.assertIs(chunk_storage(), self.storage)
+
+        # Not the per-instance filesystem default storage, which every web instance has its own copy of
+        upload_id = self.start().json()['upload_id']
+        with mock.patch.object(default_storage, 'save', side_effect=AssertionError("chunk saved to default storage")):
+            self.assertEqual(self.send(upload_id, 0).status_code, 200)
+        path = part_path(ChunkedUpload(id=upload_id), 0)
+        self.assertEqual(ChunkedUpload.objects.get(id=upload_id).parts.get().path, path)
+        with self.storage.open(path, 'rb') as stored:
+            self.assertEqual(stored.read(), self.data[:4])
+
+    def test_uploads_are_private_to_their_learner(self):
+        from django.urls import reverse
+        self.assertEqual(self.start(filename='run.exe').status_code, 400)
+        upload_id = self.start().json()['upload_id']
+        self.login(self.learners[1].user)
+        self.assertEqual(self.send(upload_id, 0).status_code, 404)
+        self.assertEqual(self.client.get(reverse('qualifications:chunked_upload_status', args=[upload_id])).status_code, 404)
+        self.login(self.assessor_ub)
+        self.assertEqual(self.start().status_code, 404)
+
+
+class PortfolioExportTests(QualificationTreeTestCase):
+    def setUp(self):
+        super().setUp()
+        import tempfile
+        from unittest import mock
+        from django.core.files.storage import FileSystemStorage
+        from qualifications.models import EvidenceFile, WorkbookSubmission
+        self.storage = FileSystemStorage(location=tempfile.mkdtemp())
+        for model, field in ((EvidenceFile, 'evidence_file'), (WorkbookSubmission, 'workbook_file')):
+            patcher = mock.patch.object(model._meta.get_field(field), 'storage', self.storage)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.learner = self.learners[0]
+
+    def login(self, user_business):
+        self.client.force_login(user_business.user)
+        session = self.client.session
+        session['business_id'] = self.business.business_id
+        session.save()
+
+    def export(self, learner=None):
+        from django.urls import reverse
+        learner = learner or self.learner
+        return self.client.get(reverse('qualifications:portfolio_export', args=[self.qual.id, learner.id]))
+
+    def add_evidence(self, ac, name, content, status='SUBMITTED'):
+        from django.core.files.base import ContentFile
+        from qualifications.models import EvidenceFile, EvidenceSubmission
+        submission = EvidenceSubmission.objects.create(user=self.learner.user, assessment_criterion=ac, status=status)
+        return EvidenceFile.objects.create(
+            evidence_submission=submission, evidence_file=self.storage.save(f"evidence/{name}", ContentFile(content))
+        )
+
+    @override_settings(PORTFOLIO_EXPORT_CONCURRENCY=2)
+    def test_export_streams_files_and_manifest(self):
+        import csv
+        import io
+        import zipfile
+        from django.core.files.base import ContentFile
+        from qualifications.models import EvidenceFile, WorkbookSubmission
+        self.add_evidence(self.acs[0], 'essay.pdf', b'essay', status='ACCEPTED')
+        self.add_evidence(self.acs[0], 'essay.pdf', b'essay v2')
+        self.add_evidence(self.acs[1], 'photo.jpg', b'\xff\xd8' * 50000)
+        WorkbookSubmission.objects.create(
+            user=self.learner.user, learning_outcome=self.lo, workbook_file=self.storage.save('workbooks/wb.docx', ContentFile(b'wb'))
+        )
+        missing = self.add_evidence(self.acs[2], 'gone.pdf', b'x')
+        self.storage.delete(missing.evidence_file.name)
+
+        self.login(self.make_user_business('admin@example.com', 'admin'))
+        response = self.export()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertIn('portfolio-learner0-q1.zip', response['Content-Disposition'])
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        names = archive.namelist()
+        self.assertEqual(len(names), 5)  # four readable files and the manifest
+        self.assertEqual(names[-1], 'manifest.csv')
+        photo = next(name for name in names if name.endswith('photo.jpg'))
+        self.assertTrue(photo.startswith('evidence/Unit U1 - Unit 1/LO 1/AC 1.2/'))
+        self.assertEqual(archive.read(photo), b'\xff\xd8' * 50000)
+        essays = sorted(archive.read(name) for name in names if 'AC 1.1' in name)
+        self.assertEqual(essays, [b'essay', b'essay v2'])
+        self.assertTrue(any(name.startswith('workbooks/Unit U1 - Unit 1/LO 1/') for name in names))
+
+        rows = list(csv.reader(io.StringIO(archive.read('manifest.csv').decode())))
+        statuses = {row[3]: row[5] for row in rows if row[0] == 'Assessment criterion'}
+        self.assertEqual(statuses, {'1.1': 'Submitted', '1.2': 'Submitted', '1.3': 'Submitted', '1.4': 'Not Submitted'})
+        self.assertTrue(any(row[0] == 'Missing file' and row[4].endswith('gone.pdf') for row in rows))
+        self.assertEqual(EvidenceFile.objects.count(), 4)
+
+    def test_export_is_limited_to_people_who_can_see_the_learner(self):
+        self.add_evidence(self.acs[0], 'essay.pdf', b'essay')
+        self.login(self.learners[1].user)
+        self.assertEqual(self.export().status_code, 404)
+        self.login(self.learner.user)
+        self.assertEqual(self.export().status_code, 200)
+        self.login(self.assessor_ub)
+        self.assertEqual(self.export().status_code, 200)
+        other = self.make_user_business('other-assessor@example.com')
+        Assessor.objects.create(user=other, qualification=self.qual)
+        self.login(other)
+        self.assertEqual(self.export().status_code, 404)
+
+
+class QualificationTreeSaveTests(QualificationTreeTestCase):
+    def payload(self):
+        from qualifications.serializers import QualificationSerializer
+        return QualificationSerializer(self.qual, context={'business': self.business}).data
+
+    def save(self, data):
+        from qualifications.serializers import QualificationSerializer
+        serializer = QualificationSerializer(self.qual, data=data, partial=True, context={'business': self.business})
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def test_tree_is_saved_as_a_diff(self):
+        from qualifications.models import AC, LO
+        data = self.payload()
+        lo_data = data['units'][0]['learning_outcomes'][0]
+        kept_ac = lo_data['assessment_criteria'][1]
+        lo_data['assessment_criteria'] = [
+            dict(kept_ac, ac_detail='AC 1 reworded'),
+            lo_data['assessment_criteria'][0],
+            {'ac_detail': 'New AC'},
+        ]
+        data['units'][0]['learning_outcomes'].append({
+            'lo_detail': 'LO 2', 'assessment_criteria': [{'ac_detail': f'LO 2 AC {i}'} for i in range(20)]
+        })
+        self.save(data)
+
+        acs = list(AC.objects.filter(learning_outcome=self.lo).order_by('serial_number'))
+        self.assertEqual([ac.ac_detail for ac in acs], ['AC 1 reworded', 'AC 0', 'New AC'])
+        self.assertEqual(str(acs[0].id), kept_ac['id'])
+        self.assertEqual([ac.serial_number for ac in acs], [1.11, 1.12, 1.13])
+        new_lo = LO.objects.get(lo_detail='LO 2')
+        self.assertEqual(new_lo.serial_number, 1.2)
+        self.assertEqual(new_lo.assessment_criteria.count(), 20)
+
+        # Query count does not grow with the tree: a second, larger edit costs the same
+        data = self.payload()
+        for lo_data in data['units'][0]['learning_outcomes']:
+            for ac_data in lo_data['assessment_criteria']:
+                ac_data['ac_detail'] += ' (edited)'
+        data['units'][0]['learning_outcomes'][1]['assessment_criteria'].pop()
+        data['units'].append({'unit_title': 'Unit 2', 'unit_number': 'U2', 'learning_outcomes': [
+            {'lo_detail': 'LO 1', 'assessment_criteria': [{'ac_detail': f'AC {i}'} for i in range(30)]}
+        ]})
+        with self.assertNumQueries(16):
+            self.save(data)
+        self.assertEqual(AC.objects.filter(ac_detail__endswith='(edited)').count(), 22)
+        self.assertEqual(AC.objects.count(), 52)
+
+    def test_removing_nodes_with_submissions_is_blocked(self):
+        from rest_framework.exceptions import ValidationError
+        from qualifications.models import AC, EvidenceSubmission
+        EvidenceSubmission.objects.create(user=self.learners[0].user, assessment_criterion=self.acs[2])
+        data = self.payload()
+        data['units'][0]['learning_outcomes'][0]['assessment_criteria'].pop(2)
+        with self.assertRaises(ValidationError) as raised:
+            self.save(data)
+        self.assertIn('assessment_criteria', raised.exception.detail)
+
+        data = self.payload()
+        data['units'][0]['learning_outcomes'][0]['assessment_criteria'].pop(3)  # no submissions
+        self.save(data)
+        self.assertEqual(AC.objects.count(), 3)
+
+        data = self.payload()
+        data['units'] = []
+        with self.assertRaises(ValidationError) as raised:
+            self.save(data)
+        self.assertIn('units', raised.exception.detail)
+
+    def test_put_refuses_edits_once_learners_have_submitted(self):
+        from django.urls import reverse
+        from qualifications.models import EvidenceSubmission
+        admin = self.make_user_business('admin@example.com', 'admin')
+        self.client.force_login(admin.user)
+        url = reverse('qualifications:edit-qualification', args=[self.qual.id])
+        data = self.payload()
+        data['qualification_title'] = 'Renamed'
+        self.assertEqual(self.client.put(url, data, content_type='application/json').status_code, 200)
+
+        EvidenceSubmission.objects.create(user=self.learners[0].user, assessment_criterion=self.acs[0])
+        response = self.client.put(url, data, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('assessment_criteria', response.json())
+        data['units'] = []
+        self.assertIn('units', self.client.put(url, data, content_type='application/json').json())
+
+
+class QualificationCopyTests(QualificationTreeTestCase):
+    def setUp(self):
+        super().setUp()
+        from qualifications.models import LO, AC
+        lo = LO.objects.create(lo_detail="LO 2", unit=self.unit, serial_number=2)
+        AC.objects.create(ac_detail="AC 2.1", learning_outcome=lo)
+        self.targets = [Business.objects.create(business_id=f"C{i}", name=f"Centre {i}") for i in range(12)]
+
+    def tree(self, qualification):
+        return [
+            (unit.unit_number, [(lo.lo_detail, sorted(ac.ac_detail for ac in lo.assessment_criteria.all()))
+                                for lo in unit.learning_outcomes.order_by('serial_number')])
+            for unit in qualification.units.order_by('serial_number')
+        ]
+
+    def test_copy_to_many_businesses_in_bulk(self):
+        progress = []
+        Qual.objects.create(qualification_title="Old", qualification_number="Q1", awarding_body="AB", business=self.targets[0])
+        with self.assertNumQueries(16):  # four reads, then two batches of four inserts inside a savepoint
+            copies = self.qual.copy_to_businesses(self.targets, progress=lambda done, total: progress.append((done, total)))
+        self.assertEqual(sorted(copies), sorted(f"C{i}" for i in range(1, 12)))
+        self.assertEqual(progress, [(11, 12), (12, 12)])
+        for business_id, copy in copies.items():
+            self.assertEqual(copy.business_id, business_id)
+            self.assertEqual(self.tree(copy), self.tree(self.qual))
+
+    def test_copy_to_business_refuses_duplicates(self):
+        copy = self.qual.copy_to_business(self.targets[0])
+        self.assertEqual(self.tree(copy), self.tree(self.qual))
+        with self.assertRaises(ValidationError):
+            self.qual.copy_to_business(self.targets[0])
+
+    def test_assignment_runs_as_a_background_job(self):
+        from django.urls import reverse
+        from qualifications.copy_jobs import run_pending
+        from qualifications.models import QualificationCopyJob
+        superuser = CustomUser.objects.create(email="root@example.com", is_superuser=True)
+        self.client.force_login(superuser)
+        response = self.client.post(
+            reverse('users:assign_qualification', args=[self.qual.id]), {'businesses': ['B1', 'C1', 'C2']}
+        )
+        job = QualificationCopyJob.objects.get()
+        self.assertRedirects(response, reverse('users:qualification_copy_job', args=[job.id]))
+        self.assertEqual((job.status, job.total), ('PENDING', 2))  # B1 already has the qualification
+
+        self.assertEqual(run_pending(), (1, 0))
+        status = self.client.get(reverse('users:qualification_copy_job', args=[job.id]), {'format': 'json'}).json()
+        self.assertEqual(status['status'], 'DONE')
+        self.assertEqual((status['completed'], status['total']), (2, 2))
+        self.assertEqual(status['copied_to'], ['C1', 'C2'])
+        self.assertEqual(Qual.objects.filter(qualification_number='Q1').count(), 3)
+        self.assertEqual(self.client.get(reverse('users:qualification_copy_job', args=[job.id])).status_code, 200)
+
+    def test_job_that_dies_mid_run_is_picked_up_again(self):
+        from unittest import mock
+        from django.utils import timezone
+        from qualifications.copy_jobs import claim_job, run_job, start_copy_job
+        from qualifications.models import QualificationCopyJob
+        job = start_copy_job(self.qual, [Business.objects.create(business_id="LEASE1", name="Lease")])
+        # SystemExit stands in for the worker process being killed during the copy
+        with mock.patch.object(Qual, 'copy_to_businesses', side_effect=SystemExit):
+            with self.assertRaises(SystemExit):
+                run_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'RUNNING')
+        self.assertIsNotNone(job.locked_until)
+        self.assertIsNone(claim_job())
+
+        QualificationCopyJob.objects.filter(id=job.id).update(locked_until=timezone.now() - timezone.timedelta(seconds=1))
+        self.assertEqual(claim_job().id, job.id)
+
+
+class QualificationStructureTests(QualificationTreeTestCase):
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        cache.clear()
+
+    def save(self, data):
+        from qualifications.serializers import QualificationSerializer
+        serializer = QualificationSerializer(self.qual, data=data, partial=True, context={'business': self.business})
+        serializer.is_valid(raise_exception=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            serializer.save()
+        return serializer
+
+    def test_snapshot_is_cached_and_immutable(self):
+        from qualifications.structure import qualification_structure
+        structure = qualification_structure(self.qual)
+        self.assertEqual([unit.unit_title for unit in structure.units], ['Unit 1'])
+        lo = structure.units[0].learning_outcomes[0]
+        self.assertEqual(lo.lo_detail, 'LO 1')
+        self.assertEqual([ac.id for ac in lo.assessment_criteria], [ac.id for ac in self.acs])
+        with self.assertRaises(AttributeError):
+            lo.lo_detail = 'Changed'
+        with self.assertNumQueries(0):
+            self.assertEqual(qualification_structure(self.qual.id), structure)
+
+    def test_saving_the_tree_moves_to_a_new_version(self):
+        from qualifications.serializers import QualificationSerializer
+        from qualifications.structure import qualification_structure
+        before = qualification_structure(self.qual)
+        data = QualificationSerializer(self.qual, context={'business': self.business}).data
+        data['units'][0]['learning_outcomes'][0]['lo_detail'] = 'LO 1 reworded'
+        serializer = self.save(data)
+        self.assertEqual(serializer.data['units'][0]['learning_outcomes'][0]['lo_detail'], 'LO 1 reworded')
+
+        after = qualification_structure(self.qual)
+        self.assertNotEqual(after.version, before.version)
+        self.assertEqual(after.units[0].learning_outcomes[0].lo_detail, 'LO 1 reworded')
+
+    def test_views_read_the_snapshot(self):
+        from django.urls import reverse
+        self.client.force_login(self.assessor_ub.user)
+        response = self.client.get(f"{reverse('qualifications:view-qualification')}?id={self.qual.id}")
+        self.assertContains(response, 'LO 1')
+        self.assertContains(response, 'AC 3')
+
+        response = self.client.get(reverse('qualifications:qualification-detail', args=[self.qual.id]))
+        self.assertEqual(response.status_code, 200)
+        lo_data = response.json()['units'][0]['learning_outcomes'][0]
+        self.assertEqual([ac['ac_detail'] for ac in lo_data['assessment_criteria']], [f"AC {i}" for i in range(4)])
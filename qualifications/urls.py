@@ -37,10 +37,17 @@ urlpatterns = [
     path('resources/add_folder/', views.add_folder, name='add_folder'),
     path('resources/delete_file/', views.delete_file, name='delete_file'),
     path('resources/file/<uuid:file_id>/', views.serve_file, name='serve_file'),
+    path('files/<str:kind>/<uuid:object_id>/', views.download_file, name='download_file'),
+    path('learner_view/<uuid:qualification_id>/uploads/', views.direct_upload_view, name='direct_upload'),
+    path('learner_view/<uuid:qualification_id>/uploads/chunked/', views.chunked_upload_start, name='chunked_upload_start'),
+    path('uploads/chunked/<uuid:upload_id>/', views.chunked_upload_status, name='chunked_upload_status'),
+    path('uploads/chunked/<uuid:upload_id>/chunks/<int:index>/', views.chunked_upload_chunk, name='chunked_upload_chunk'),
+    path('uploads/chunked/<uuid:upload_id>/complete/', views.chunked_upload_complete, name='chunked_upload_complete'),
     path('resources/edit_folder/<uuid:folder_id>/', views.edit_folder, name='edit_folder'),
     path('user_dashboard/', views.user_dashboard, name='user_dashboard'),
     path('learner_view/<uuid:qualification_id>/', views.learner_view, name='learner_view'),
     path('learner_evidence/<uuid:qualification_id>/<uuid:learner_id>/<uuid:ac_id>/', views.learner_evidence_view, name='learner_evidence'),
+    path('portfolio_export/<uuid:qualification_id>/<uuid:learner_id>/', views.portfolio_export_view, name='portfolio_export'),
     path('assessor/<uuid:qualification_id>/', views.assessor_view, name='assessor_view'),
     path('assessor_feedback/<uuid:qualification_id>/<uuid:learner_id>/', views.assessor_feedback_view, name='assessor_feedback'),
     path('feedback_history/<uuid:qualification_id>/<uuid:learner_id>/<uuid:lo_id>/', views.feedback_history_view, name='feedback_history'),
@@ -76,4 +83,5 @@ urlpatterns = [
     path('get-recipients/', views.get_recipients_by_qualification, name='get_recipients_by_qualification'),
     path('assessor/<uuid:qualification_id>/feedback/<uuid:learner_id>/<uuid:lo_id>/provide/', views.provide_feedback, name='provide_feedback'),
     path('sent/', views.sent_messages_view, name='sent_messages'),
+    path('api/mailbox/<str:mailbox>/', views.mailbox_api, name='mailbox_api'),
     ]
\ No newline at end of file
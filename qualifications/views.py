@@ -3,12 +3,12 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from django.db import transaction, connection
-from .serializers import QualificationSerializer
+from .serializers import QualificationSerializer, SUBMISSIONS_BLOCK_MESSAGE
 from qualifications.models import Learner, Assessor, IQA, EQA, ResourceFile, Message, MessageRecipient, IQADocumentRemark, WorkbookSubmission, IQAFeedback, LearnerDocsByAssessor, LearnerDocumentSubmission, DocumentRequirement, IQAFeedbackToAssessor, ResourceFolder, EvidenceSubmission, Feedback, Sampling, EvidenceFile, AC, LO, Unit, Notification
 from rest_framework.exceptions import PermissionDenied
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from qualifications.models import Qual
+from qualifications.models import Qual, ChunkedUpload
 from django.contrib import messages
 from django.core.mail import EmailMessage
 from django.conf import settings
@@ -17,14 +17,13 @@ from django.contrib.auth.hashers import make_password
 from users.models import CustomUser, UserBusiness, Business
 from qualifications.forms import RoleSelectionForm, LearnerForm, DocumentCheckForm, AssessorForm, MessageForm, WorkbookSubmissionForm, LearnerDocsByAssessorForm, IQADocumentRemarkForm, LearnerDocumentSubmissionForm,IQAFeedbackToAssessorForm, IQAFeedbackForm, DocumentRequirementForm,  IQAForm, EQAForm, UserFilterForm, EditUserForm, ResourceFolderForm,  ResourceFileForm, FeedbackForm, EvidenceSubmissionForm
 from django.template.loader import render_to_string
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 import json
 from django.core.exceptions import ValidationError
 import os
-import mimetypes
 from django.views.decorators.http import require_POST
 from qualifications.utils import ROLE_TYPES
-from django.http import FileResponse, Http404
+from django.http import Http404
 import logging
 from django.urls import reverse
 from django.db.models import Count, Q
@@ -32,12 +31,20 @@ from django.utils import timezone
 import uuid
 from rest_framework import serializers
 import traceback
-from urllib.parse import quote
-import boto3
-from botocore.exceptions import ClientError
 from django.db.models import Prefetch
 from django.contrib.auth.models import AnonymousUser
-from AssessEEZ.email_utils import send_welcome_email, send_message_notification_email, send_role_notification_email, send_document_submission_notification_email, send_non_conformance_email, send_notification_email
+from qualifications.progress import learner_progress_map, rebuild_learner_progress, sampled_unit_counts
+from qualifications.messaging import MAILBOXES, mailbox_page, recipients_for_qualification, unread_message_count, start_thread, participant_thread, deliver_message, mark_thread_read, mark_recipient_read
+from qualifications.roles import LEARNER, ASSESSOR, IQA_ROLE, EQA_ROLE
+from qualifications.loaders import build_assessor_grid, latest_evidence_by_ac, latest_workbook_by_lo, lo_ids_with_feedback, latest_sampling_outcome_by_unit
+from AssessEEZ.email_utils import send_welcome_email, send_message_notification_email, send_role_notification_email, send_document_submission_notification_email, send_non_conformance_email
+from AssessEEZ.email_queue import enqueue_email, enqueue_email_batch
+from qualifications.notifications import queue_notification_email
+from qualifications.file_serving import file_response, learner_file, learner_file_url
+from qualifications.direct_uploads import direct_uploads_enabled, start_upload, claim_uploads, record_claims
+from qualifications.chunked_uploads import start_chunked_upload, store_chunk, received_chunks, complete_chunked_upload
+from qualifications.portfolio_export import stream_portfolio, portfolio_filename
+from qualifications.structure import qualification_structure
 
 
 
@@ -60,9 +67,7 @@ class QualificationAddEditView(APIView):
                     result = cursor.fetchone()
                     logger.debug(f"Raw query result for id {qual_id}: {result}")
 
-                qualification = Qual.objects.prefetch_related(
-                    'units__learning_outcomes__assessment_criteria'
-                ).get(id=qual_id)
+                qualification = Qual.objects.select_related('business').get(id=qual_id)
                 logger.debug(f"Qualification found: {qualification.id}, business: {qualification.business.business_id}")
 
                 self._check_business_access(request.user, qualification.business)
@@ -119,30 +124,25 @@ class QualificationAddEditView(APIView):
         logger.debug(f"PUT request for qualification {qualification_id}")
         logger.debug(f"Request payload: {{qualification_id: {qualification_id}, units_count: {len(request.data.get('units', []))}}}")
         try:
-            qualification = Qual.objects.prefetch_related(
-                'units__learning_outcomes__assessment_criteria__evidence_submissions'
-            ).get(id=qualification_id)
+            qualification = Qual.objects.select_related('business').get(id=qualification_id)
             self._check_business_access(request.user, qualification.business)
             with transaction.atomic():
                 units_data = request.data.get('units', [])
-                submitted_unit_ids = set([unit.get('id') for unit in units_data if unit.get('id')])
+                submitted_unit_ids = set([str(unit.get('id')) for unit in units_data if unit.get('id')])
+                units_with_submissions = set(EvidenceSubmission.objects.filter(
+                    assessment_criterion__learning_outcome__unit__qualification=qualification
+                ).values_list('assessment_criterion__learning_outcome__unit', flat=True).distinct())
                 for unit in qualification.units.all():
-                    submission_count = EvidenceSubmission.objects.filter(
-                        assessment_criterion__learning_outcome__unit=unit
-                    ).count()
-                    logger.debug(f"Pre-save: Checking unit {unit.id} (Title: {unit.unit_title}) for submissions: {submission_count} found")
-                    if submission_count > 0 and str(unit.id) not in submitted_unit_ids:
+                    if unit.id not in units_with_submissions:
+                        continue
+                    logger.debug(f"Pre-save: unit {unit.id} (Title: {unit.unit_title}) has submissions")
+                    if str(unit.id) not in submitted_unit_ids:
                         raise serializers.ValidationError({
-                            "units": "You cannot Edit this Qualification because there are Learners Submissions against this Qualification"
+                            "units": SUBMISSIONS_BLOCK_MESSAGE
                         })
-                    for lo in unit.learning_outcomes.all():
-                        for ac in lo.assessment_criteria.all():
-                            submission_count = EvidenceSubmission.objects.filter(assessment_criterion=ac).count()
-                            logger.debug(f"Pre-save: Checking AC {ac.id} (Detail: {ac.ac_detail}) for submissions: {submission_count} found")
-                            if submission_count > 0:
-                                raise serializers.ValidationError({
-                                    "assessment_criteria": "You cannot Edit this Qualification because there are Learners Submissions against this Qualification"
-                                })
+                    raise serializers.ValidationError({
+                        "assessment_criteria": SUBMISSIONS_BLOCK_MESSAGE
+                    })
 
                 serializer = QualificationSerializer(
                     qualification,
@@ -212,29 +212,11 @@ def view_qualification_view(request):
         return render(request, 'view_qualification.html', {'error': 'No qualification ID provided'})
     
     try:
-        # Fetch qualification with sorted related objects
-        qualification = get_object_or_404(
-            Qual.objects.prefetch_related(
-                Prefetch(
-                    'units',
-                    queryset=Unit.objects.order_by('serial_number').prefetch_related(
-                        Prefetch(
-                            'learning_outcomes',
-                            queryset=LO.objects.order_by('serial_number').prefetch_related(
-                                Prefetch(
-                                    'assessment_criteria',
-                                    queryset=AC.objects.order_by('serial_number')
-                                )
-                            )
-                        )
-                    )
-                )
-            ),
-            id=qual_id
-        )
+        qualification = get_object_or_404(Qual, id=qual_id)
         
         context = {
             'qualification': qualification,
+            'units': qualification_structure(qualification).units,
             'full_name': request.user.get_full_name() or request.user.email,
         }
         logger.info(f"Rendering qualification {qual_id} for user {request.user.email}")
@@ -376,25 +358,26 @@ def add_learner(request):
                     password = get_random_string(length=12)
                     user.set_password(password)
                     user.save()
-                    password_to_send = password if user_created else None
                     try:
-                        send_welcome_email(
-                            user.email, business.name, password_to_send, settings.LOGIN_URL, business.name,
-                            role='Learner', qualification_title=qualification.qualification_title
+                        enqueue_email(
+                            send_welcome_email,
+                            user.email, business.name, None, settings.LOGIN_URL, business.name,
+                            role='Learner', qualification_title=qualification.qualification_title, set_password=user_created
                         )
-                        logger.info(f"Sent welcome email to {user.email}")
+                        logger.info(f"Queued welcome email to {user.email}")
                     except Exception as e:
                         logger.error(f"Failed to send welcome email to {user.email}: {str(e)}")
                         messages.warning(request, f"Learner added, but failed to send welcome email: {str(e)}")
                 else:
                     # Send notification email for new qualification
                     try:
-                        send_role_notification_email(
+                        enqueue_email(
+                            send_role_notification_email,
                             user.email, business.name, business.business_id,
                             action="Assigned as Learner",
                             role='Learner', qualification_titles=[qualification.qualification_title]
                         )
-                        logger.info(f"Sent role notification email to {user.email}")
+                        logger.info(f"Queued role notification email to {user.email}")
                     except Exception as e:
                         logger.error(f"Failed to send role notification email to {user.email}: {str(e)}")
                         messages.warning(request, f"Learner added, but failed to send role notification: {str(e)}")
@@ -402,23 +385,25 @@ def add_learner(request):
                 # Notify assessor and IQA of new learner assignment
                 if assessor:
                     try:
-                        send_role_notification_email(
+                        enqueue_email(
+                            send_role_notification_email,
                             assessor.user.email, business.name, business.business_id,
                             action="Assigned as Assessor",
                             role='Assessor', learner_name=full_name, qualification_titles=[qualification.qualification_title]
                         )
-                        logger.info(f"Sent assessor notification email to {assessor.user.email}")
+                        logger.info(f"Queued assessor notification email to {assessor.user.email}")
                     except Exception as e:
                         logger.error(f"Failed to send assessor notification email to {assessor.user.email}: {str(e)}")
                         messages.warning(request, f"Learner added, but failed to notify assessor: {str(e)}")
                 if iqa:
                     try:
-                        send_role_notification_email(
+                        enqueue_email(
+                            send_role_notification_email,
                             iqa.user.email, business.name, business.business_id,
                             action="Assigned as IQA",
                             role='IQA', learner_name=full_name, qualification_titles=[qualification.qualification_title]
                         )
-                        logger.info(f"Sent IQA notification email to {iqa.user.email}")
+                        logger.info(f"Queued IQA notification email to {iqa.user.email}")
                     except Exception as e:
                         logger.error(f"Failed to send IQA notification email to {iqa.user.email}: {str(e)}")
                         messages.warning(request, f"Learner added, but failed to notify IQA: {str(e)}")
@@ -482,14 +467,14 @@ def add_assessor(request):
                         password = get_random_string(length=12)
                         user.set_password(password)
                         user.save()
-                        password_to_send = password if user_created else None
                         qual_titles = ", ".join([qual.qualification_title for qual in new_assignments])
                         try:
-                            send_welcome_email(
-                                user.email, business.name, password_to_send, settings.LOGIN_URL, business.name,
-                                role='Assessor', qualification_title=qual_titles or "None"
+                            enqueue_email(
+                                send_welcome_email,
+                                user.email, business.name, None, settings.LOGIN_URL, business.name,
+                                role='Assessor', qualification_title=qual_titles or "None", set_password=user_created
                             )
-                            logger.info(f"Sent welcome email to {user.email}")
+                            logger.info(f"Queued welcome email to {user.email}")
                         except Exception as e:
                             logger.error(f"Failed to send welcome email to {user.email}: {str(e)}")
                             messages.warning(request, f"Assessor added, but failed to send welcome email: {str(e)}")
@@ -497,12 +482,13 @@ def add_assessor(request):
                         # Send notification email for new qualifications
                         qual_titles = [qual.qualification_title for qual in new_assignments]
                         try:
-                            send_role_notification_email(
+                            enqueue_email(
+                                send_role_notification_email,
                                 user.email, business.name, business.business_id,
                                 action="Assigned as Assessor",
                                 role='Assessor', qualification_titles=qual_titles
                             )
-                            logger.info(f"Sent role notification email to {user.email}")
+                            logger.info(f"Queued role notification email to {user.email}")
                         except Exception as e:
                             logger.error(f"Failed to send role notification email to {user.email}: {str(e)}")
                             messages.warning(request, f"Assessor added, but failed to send role notification: {str(e)}")
@@ -565,14 +551,14 @@ def add_iqa(request):
                         password = get_random_string(length=12)
                         user.set_password(password)
                         user.save()
-                        password_to_send = password if user_created else None
                         qual_titles = ", ".join([qual.qualification_title for qual in new_assignments])
                         try:
-                            send_welcome_email(
-                                user.email, business.business_id, business.name, password_to_send, settings.LOGIN_URL,
-                                sender_name=business.name, role='EQA', qualification_title=qual_titles or "None"
+                            enqueue_email(
+                                send_welcome_email,
+                                user.email, business.name, None, settings.LOGIN_URL, business.name,
+                                role='IQA', qualification_title=qual_titles or "None", set_password=user_created
                             )
-                            logger.info(f"Sent welcome email to {user.email}")
+                            logger.info(f"Queued welcome email to {user.email}")
                         except Exception as e:
                             logger.error(f"Failed to send welcome email to {user.email}: {str(e)}")
                             messages.warning(request, f"IQA added, but failed to send welcome email: {str(e)}")
@@ -580,12 +566,13 @@ def add_iqa(request):
                         # Send notification email for new qualifications
                         qual_titles = [qual.qualification_title for qual in new_assignments]
                         try:
-                            send_role_notification_email(
+                            enqueue_email(
+                                send_role_notification_email,
                                 user.email, business.name, business.business_id,
                                 action="Assigned as IQA",
                                 role='IQA', qualification_titles=qual_titles
                             )
-                            logger.info(f"Sent role notification email to {user.email}")
+                            logger.info(f"Queued role notification email to {user.email}")
                         except Exception as e:
                             logger.error(f"Failed to send role notification email to {user.email}: {str(e)}")
                             messages.warning(request, f"IQA added, but failed to send role notification: {str(e)}")
@@ -654,14 +641,14 @@ def add_eqa(request):
                         password = get_random_string(length=12)
                         user.set_password(password)
                         user.save()
-                        password_to_send = password if user_created else None
                         qual_titles = ", ".join([qual.qualification_title for qual in new_assignments])
                         try:
-                            send_welcome_email(
-                                user.email, business.name, password_to_send, settings.LOGIN_URL, business.name,
-                                role='EQA', qualification_title=qual_titles or "None"
+                            enqueue_email(
+                                send_welcome_email,
+                                user.email, business.name, None, settings.LOGIN_URL, business.name,
+                                role='EQA', qualification_title=qual_titles or "None", set_password=user_created
                             )
-                            logger.info(f"Sent welcome email to {user.email}")
+                            logger.info(f"Queued welcome email to {user.email}")
                         except Exception as e:
                             logger.error(f"Failed to send welcome email to {user.email}: {str(e)}")
                             messages.warning(request, f"EQA added, but failed to send welcome email: {str(e)}")
@@ -669,12 +656,13 @@ def add_eqa(request):
                         # Send notification email for new qualifications
                         qual_titles = [qual.qualification_title for qual in new_assignments]
                         try:
-                            send_role_notification_email(
+                            enqueue_email(
+                                send_role_notification_email,
                                 user.email, business.name, business.business_id,
                                 action="Assigned as EQA",
                                 role='EQA', qualification_titles=qual_titles
                             )
-                            logger.info(f"Sent role notification email to {user.email}")
+                            logger.info(f"Queued role notification email to {user.email}")
                         except Exception as e:
                             logger.error(f"Failed to send role notification email to {user.email}: {str(e)}")
                             messages.warning(request, f"EQA added, but failed to send role notification: {str(e)}")
@@ -1354,58 +1342,15 @@ def serve_file(request, file_id):
     if not user_business or resource_file.folder.business != user_business.business:
         raise Http404("You do not have permission to access this file.")
 
-    # Initialize boto3 client for Spaces
-    s3_client = boto3.client(
-        's3',
-        endpoint_url=settings.AWS_S3_ENDPOINT_URL,
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_S3_REGION_NAME
-    )
-
-    file_key = resource_file.file.name
-    mime_types = {
-        '.pdf': 'application/pdf',
-        '.jpg': 'image/jpeg',
-        '.jpeg': 'image/jpeg',
-        '.png': 'image/png',
-        '.mp4': 'video/mp4',
-        '.doc': 'application/msword',
-        '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-        '.ppt': 'application/vnd.ms-powerpoint',
-        '.pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
-    }
-
-    ext = os.path.splitext(file_key)[1].lower()
-    mime_type = mime_types.get(ext, mimetypes.guess_type(file_key)[0])
-    if mime_type is None:
-        mime_type = 'application/octet-stream'
+    return file_response(request, resource_file.file.name)
 
-    filename = quote(os.path.basename(file_key))
-    logger.debug(f"Serving file: {file_key}, MIME type: {mime_type}, Filename: {filename}")
 
-    try:
-        # Fetch file from Spaces
-        s3_response = s3_client.get_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=file_key)
-        file_content = s3_response['Body']
-        logger.debug(f"Fetched file {file_key} with content length: {s3_response.get('ContentLength', 'unknown')}")
-
-        # Create FileResponse
-        response = FileResponse(file_content, content_type=mime_type)
-        if ext in ['.doc', '.docx', '.ppt', '.pptx']:
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        else:
-            response['Content-Disposition'] = f'inline; filename="{filename}"'
-
-        response['Content-Length'] = str(s3_response['ContentLength'])
-        response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        response['Pragma'] = 'no-cache'
-        response['Expires'] = '0'
-
-        return response
-    except ClientError as e:
-        logger.error(f"Error fetching file {file_key} from Spaces: {str(e)}")
-        raise Http404("File not found.")
+@login_required
+def download_file(request, kind, object_id):
+    """
+    Download a learner's evidence file, workbook or document after checking access.
+    """
+    return file_response(request, learner_file(request, kind, object_id))
 
 @login_required
 def edit_folder(request, folder_id):
@@ -1435,12 +1380,11 @@ def user_dashboard(request):
         messages.error(request, "No business selected. Please select a business.")
         return redirect('users:main_page')
 
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        business = user_business.business
-    except UserBusiness.DoesNotExist:
+    user_business = request.user_business
+    if user_business is None:
         messages.error(request, "You are not associated with this business.")
         return redirect('users:main_page')
+    business = request.business
 
     role_priority = {
         'Learner': 1,
@@ -1493,10 +1437,10 @@ def user_dashboard(request):
 
     roles.sort(key=lambda x: (role_priority[x['role']], x['qualification'].qualification_title))
 
-    is_learner = Learner.objects.filter(user=user_business, is_active=True).exists()
-    is_assessor = Assessor.objects.filter(user=user_business).exists()
-    is_iqa = IQA.objects.filter(user=user_business).exists()
-    is_eqa = EQA.objects.filter(user=user_business).exists()
+    is_learner = request.roles.has_role(LEARNER)
+    is_assessor = request.roles.has_role(ASSESSOR)
+    is_iqa = request.roles.has_role(IQA_ROLE)
+    is_eqa = request.roles.has_role(EQA_ROLE)
     unread_notifications = 0
     learner_details = None
     if is_learner:
@@ -1511,11 +1455,7 @@ def user_dashboard(request):
                 'ethnicity': learner.ethnicity or 'N/A',
             }
 
-    unread_count = MessageRecipient.objects.filter(
-        recipient=user_business,
-        is_read=False,
-        message__recipients__recipient__business__business_id=business_id
-    ).count()
+    unread_count = unread_message_count(user_business)
 
     feedback_qualification_id = None
     if iqas.exists():
@@ -1550,11 +1490,10 @@ def learner_evidence_view(request, qualification_id, learner_id, ac_id=None):
     if not business_id:
         raise Http404("No business selected. Please log in again.")
 
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        business = user_business.business
-    except UserBusiness.DoesNotExist:
+    user_business = request.user_business
+    if user_business is None:
         raise Http404("You are not associated with this business.")
+    business = request.business
 
     try:
         learner = Learner.objects.get(
@@ -1568,28 +1507,11 @@ def learner_evidence_view(request, qualification_id, learner_id, ac_id=None):
         raise Http404("Invalid learner or not associated with this qualification.")
 
     # Check user roles
-    is_learner = Learner.objects.filter(
-        user=user_business,
-        qualification__id=qualification_id,
-        is_active=True
-    ).exists()
-    is_assessor = Assessor.objects.filter(
-        user=user_business,
-        qualification__id=qualification_id
-    ).exists()
-    is_iqa = IQA.objects.filter(
-        user=user_business,
-        qualification__id=qualification_id
-    ).exists()
-    is_eqa = EQA.objects.filter(
-        user=user_business,
-        qualification__id=qualification_id
-    ).exists()
-    is_admin = UserBusiness.objects.filter(
-        user=request.user,
-        business=business,
-        user_type='admin'
-    ).exists()
+    is_learner = request.roles.has_role(LEARNER, qualification_id)
+    is_assessor = request.roles.has_role(ASSESSOR, qualification_id)
+    is_iqa = request.roles.has_role(IQA_ROLE, qualification_id)
+    is_eqa = request.roles.has_role(EQA_ROLE, qualification_id)
+    is_admin = user_business.user_type == 'admin'
 
     if not (is_learner or is_assessor or is_iqa or is_eqa or is_admin):
         raise Http404("You are not authorized to view this learner's evidence.")
@@ -1625,7 +1547,7 @@ def learner_evidence_view(request, qualification_id, learner_id, ac_id=None):
         assessor_name = '-'
         if submission.status in ['ACCEPTED', 'REJECTED'] and submission.assessor:
             assessor_name = submission.assessor.user.full_name or submission.assessor.user.email
-        file_urls = [file.evidence_file.url for file in submission.files.all() if file.evidence_file]
+        file_urls = [learner_file_url('evidence', file.id) for file in submission.files.all() if file.evidence_file]
         submission_data.append({
             'file_urls': file_urls,
             'submitted_at': submission.submitted_at,
@@ -1648,7 +1570,7 @@ def learner_evidence_view(request, qualification_id, learner_id, ac_id=None):
         if workbook.status in ['ACCEPTED', 'REJECTED'] and workbook.assessor:
             assessor_name = workbook.assessor.user.full_name or workbook.assessor.user.email
         workbook_data.append({
-            'file_url': workbook.workbook_file.url if workbook.workbook_file else None,
+            'file_url': learner_file_url('workbook', workbook.id) if workbook.workbook_file else None,
             'submitted_at': workbook.submitted_at,
             'status': status,
             'assessor_name': assessor_name
@@ -1669,6 +1591,49 @@ def learner_evidence_view(request, qualification_id, learner_id, ac_id=None):
     return render(request, 'learner_evidence_view.html', context)
 
 
+@login_required
+def portfolio_export_view(request, qualification_id, learner_id):
+    """
+    Download everything a learner has submitted for a qualification (evidence, workbooks and
+    documents) as one ZIP archive with a status manifest, streamed as it is built.
+    """
+    user_business = request.user_business
+    if user_business is None:
+        raise Http404("You are not associated with this business.")
+    business = request.business
+
+    try:
+        learner = Learner.objects.select_related('qualification', 'user__user').get(
+            id=learner_id,
+            user__business=business,
+            qualification__id=qualification_id,
+            is_active=True
+        )
+    except Learner.DoesNotExist:
+        raise Http404("Invalid learner or not associated with this qualification.")
+
+    is_learner = request.roles.has_role(LEARNER, qualification_id)
+    is_assessor = request.roles.has_role(ASSESSOR, qualification_id)
+    is_iqa = request.roles.has_role(IQA_ROLE, qualification_id)
+    is_eqa = request.roles.has_role(EQA_ROLE, qualification_id)
+    is_admin = user_business.user_type == 'admin'
+
+    if not (is_learner or is_assessor or is_iqa or is_eqa or is_admin):
+        raise Http404("You are not authorized to export this learner's portfolio.")
+    if is_learner and learner.user != user_business:
+        raise Http404("You can only export your own portfolio.")
+    if is_assessor and learner.assessor != user_business:
+        raise Http404("This learner is not assigned to you.")
+    if is_iqa and learner.iqa != user_business:
+        raise Http404("This learner is not assigned to you.")
+
+    logger.info(f"User {request.user.email} exporting portfolio of learner {learner.id}")
+    response = StreamingHttpResponse(stream_portfolio(learner), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{portfolio_filename(learner)}"'
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
 @login_required
 def assessor_view(request, qualification_id):
     """
@@ -1681,11 +1646,10 @@ def assessor_view(request, qualification_id):
     if not business_id:
         raise Http404("No business selected. Please log in again.")
 
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        business = user_business.business
-    except UserBusiness.DoesNotExist:
+    user_business = request.user_business
+    if user_business is None:
         raise Http404("You are not associated with this business.")
+    business = request.business
 
     try:
         assessor = Assessor.objects.get(
@@ -1696,36 +1660,25 @@ def assessor_view(request, qualification_id):
     except Assessor.DoesNotExist:
         raise Http404("You are not an assessor for this qualification.")
 
-    learners = Learner.objects.filter(
+    learners = list(Learner.objects.filter(
         assessor=user_business,
         qualification=qualification,
         is_active=True
-    ).select_related('user__user', 'iqa__user')
+    ).select_related('user__user', 'iqa__user'))
 
     active_learners = []
     completed_learners = []
-    total_ac = AC.objects.filter(learning_outcome__unit__qualification=qualification).count()
     total_units = Unit.objects.filter(qualification=qualification).count()
+    progress_map = learner_progress_map(learners)
+    sampled_units_map = sampled_unit_counts(learners)
 
     for learner in learners:
-        accepted_ac = EvidenceSubmission.objects.filter(
-            user=learner.user,
-            assessment_criterion__learning_outcome__unit__qualification=qualification,
-            status='ACCEPTED'
-        ).count()
-        progress = (accepted_ac / total_ac * 100) if total_ac > 0 else 0
-        pending_submissions = EvidenceSubmission.objects.filter(
-            user=learner.user,
-            assessment_criterion__learning_outcome__unit__qualification=qualification,
-            status='SUBMITTED'
-        ).exists()
+        learner_progress = progress_map[learner.id]
+        progress = learner_progress.percentage
+        pending_submissions = learner_progress.has_pending
 
         # Calculate IQA Sampling Ratio
-        sampled_units = Sampling.objects.filter(
-            iqa=learner.iqa,
-            evidence_submission__user=learner.user,
-            evidence_submission__assessment_criterion__learning_outcome__unit__qualification=qualification
-        ).values('evidence_submission__assessment_criterion__learning_outcome__unit').distinct().count()
+        sampled_units = sampled_units_map[learner.id]
         sampling_ratio = (sampled_units / total_units * 100) if total_units > 0 else 0
 
         # Get IQA name
@@ -1773,13 +1726,12 @@ def assessor_feedback_view(request, qualification_id, learner_id):
         logger.error(f"No business_id in session for user {request.user.email}")
         raise Http404("No business selected. Please log in again.")
 
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        business = user_business.business
-        logger.debug(f"UserBusiness found: {user_business.user.email}, Business: {business.name}")
-    except UserBusiness.DoesNotExist:
+    user_business = request.user_business
+    if user_business is None:
         logger.error(f"UserBusiness not found for user {request.user.email}, business_id {business_id}")
         raise Http404("You are not associated with this business.")
+    business = request.business
+    logger.debug(f"UserBusiness found: {user_business.user.email}, Business: {business.name}")
 
     try:
         assessor = Assessor.objects.get(
@@ -1805,76 +1757,9 @@ def assessor_feedback_view(request, qualification_id, learner_id):
         logger.error(f"Learner not found for id {learner_id}, qualification {qualification_id}")
         raise Http404("Invalid learner or not assigned to you for this qualification.")
 
-    units = Unit.objects.filter(qualification=qualification).prefetch_related(
-        'learning_outcomes__assessment_criteria__evidence_submissions',
-        'learning_outcomes__workbook_submissions'
-    )
-
-    structured_data = []
+    structured_data, latest_submissions = build_assessor_grid(learner, qualification)
+    # Feedback forms are only built for the LO being edited
     feedback_forms = {}
-    for unit in units:
-        latest_sampling = Sampling.objects.filter(
-            evidence_submission__user=learner_user,
-            evidence_submission__assessment_criterion__learning_outcome__unit=unit
-        ).order_by('-created_at').first()
-        unit_data = {
-            'id': str(unit.id),
-            'title': unit.unit_title,
-            'number': unit.unit_number,
-            'learning_outcomes': [],
-            'has_iqa_feedback': Sampling.objects.filter(
-                evidence_submission__user=learner_user,
-                evidence_submission__assessment_criterion__learning_outcome__unit=unit
-            ).exists(),
-            'is_non_conformance': latest_sampling.outcome == 'NON_CONFORMANCE' if latest_sampling else False
-        }
-        for lo in unit.learning_outcomes.all():
-            lo_data = {
-                'detail': lo.lo_detail,
-                'id': str(lo.id),
-                'assessment_criteria': [],
-                'can_provide_feedback': False,
-                'latest_feedback': None,
-                'workbook_url': None
-            }
-            latest_submission = EvidenceSubmission.objects.filter(
-                user=learner_user,
-                assessment_criterion__learning_outcome=lo
-            ).order_by('-submitted_at').first()
-            if latest_submission and latest_submission.feedbacks.exists():
-                lo_data['latest_feedback'] = latest_submission.feedbacks.order_by('-created_at').first()
-            
-            workbook_submission = WorkbookSubmission.objects.filter(
-                user=learner_user,
-                learning_outcome=lo
-            ).order_by('-submitted_at').first()
-            if workbook_submission and workbook_submission.workbook_file:
-                lo_data['workbook_url'] = workbook_submission.workbook_file.url
-
-            for ac in lo.assessment_criteria.all():
-                submission = EvidenceSubmission.objects.filter(
-                    user=learner_user,
-                    assessment_criterion=ac
-                ).order_by('-submitted_at').first()
-                status = submission.status if submission else 'Not Submitted'
-                if status == 'REJECTED':
-                    status = 'Resubmission Required'
-                lo_data['assessment_criteria'].append({
-                    'detail': ac.ac_detail,
-                    'id': str(ac.id),
-                    'status': status,
-                    'submission_id': submission.id if submission else None,
-                    'evidence_url': reverse('qualifications:learner_evidence', args=[str(qualification_id), str(learner_id), str(ac.id)]) if submission else None
-                })
-                if submission:
-                    lo_data['can_provide_feedback'] = True
-            
-            assessment_criteria = AC.objects.filter(learning_outcome=lo)
-            form = FeedbackForm(assessment_criteria=assessment_criteria)
-            feedback_forms[str(lo.id)] = form.as_p()
-            
-            unit_data['learning_outcomes'].append(lo_data)
-        structured_data.append(unit_data)
 
     if request.method == 'POST':
         lo_id = request.POST.get('lo_id')
@@ -1888,11 +1773,8 @@ def assessor_feedback_view(request, qualification_id, learner_id):
                 logger.debug(f"Form valid, feedback_detail: {feedback_detail}")
                 with transaction.atomic():
                     feedback_saved = False
-                    for ac in lo.assessment_criteria.all():
-                        submission = EvidenceSubmission.objects.filter(
-                            user=learner_user,
-                            assessment_criterion=ac
-                        ).order_by('-submitted_at').first()
+                    for ac in assessment_criteria:
+                        submission = latest_submissions.get(ac.id)
                         if submission:
                             status_field = f'status_{ac.id}'
                             new_status = form.cleaned_data[status_field]
@@ -1912,16 +1794,8 @@ def assessor_feedback_view(request, qualification_id, learner_id):
                                     message=message
                                 )
                                 try:
-                                    if not learner_user.user.email:
-                                        raise ValueError("Learner email is empty")
-                                    send_notification_email(
-                                        recipient_email=learner_user.user.email,
-                                        learner_name=learner_user.user.full_name or learner_user.user.email,
-                                        business_name=business.name,
-                                        notification_message=message,
-                                        notification_date=notification.created_at
-                                    )
-                                    logger.info(f"Sent notification email to {learner_user.user.email} for AC: {ac.ac_detail}")
+                                    queue_notification_email(notification, business.name)
+                                    logger.info(f"Queued notification email to {learner_user.user.email} for AC: {ac.ac_detail}")
                                 except Exception as e:
                                     logger.error(f"Failed to send notification email to {learner_user.user.email}: {str(e)}")
                                     messages.warning(request, f"Feedback updated, but failed to notify learner: {str(e)}")
@@ -1933,6 +1807,7 @@ def assessor_feedback_view(request, qualification_id, learner_id):
                                 )
                                 feedback_saved = True
                                 logger.debug(f"Feedback saved for submission: {submission.id}")
+                    rebuild_learner_progress([learner], activity_at=timezone.now())
                 messages.success(request, f"Feedback and statuses updated for Learning Outcome: {lo.lo_detail}")
                 return redirect('qualifications:assessor_feedback', qualification_id=qualification_id, learner_id=learner_id)
             else:
@@ -1969,13 +1844,12 @@ def provide_feedback(request, qualification_id, learner_id, lo_id):
         logger.error(f"No business_id in session for user {request.user.email}")
         raise Http404("No business selected. Please log in again.")
 
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        business = user_business.business
-        logger.debug(f"UserBusiness found: {user_business.user.email}, Business: {business.name}")
-    except UserBusiness.DoesNotExist:
+    user_business = request.user_business
+    if user_business is None:
         logger.error(f"UserBusiness not found for user {request.user.email}, business_id {business_id}")
         raise Http404("You are not associated with this business.")
+    business = request.business
+    logger.debug(f"UserBusiness found: {user_business.user.email}, Business: {business.name}")
 
     try:
         assessor = Assessor.objects.get(
@@ -2016,12 +1890,15 @@ def provide_feedback(request, qualification_id, learner_id, lo_id):
     latest_feedback = latest_submission.feedbacks.order_by('-created_at').first() if latest_submission and latest_submission.feedbacks.exists() else None
 
     # Prepare initial statuses for ACs
+    latest_submissions = {
+        submission.assessment_criterion_id: submission
+        for submission in EvidenceSubmission.objects.filter(
+            assessment_criterion__learning_outcome=lo
+        ).latest_per_ac(learner_user)
+    }
     initial_statuses = {}
     for ac in assessment_criteria:
-        submission = EvidenceSubmission.objects.filter(
-            user=learner_user,
-            assessment_criterion=ac
-        ).order_by('-submitted_at').first()
+        submission = latest_submissions.get(ac.id)
         initial_statuses[str(ac.id)] = submission.status if submission else 'PENDING'
 
     if request.method == 'POST':
@@ -2031,11 +1908,8 @@ def provide_feedback(request, qualification_id, learner_id, lo_id):
             logger.debug(f"Form valid, feedback_detail: {feedback_detail}")
             with transaction.atomic():
                 feedback_saved = False
-                for ac in lo.assessment_criteria.all():
-                    submission = EvidenceSubmission.objects.filter(
-                        user=learner_user,
-                        assessment_criterion=ac
-                    ).order_by('-submitted_at').first()
+                for ac in assessment_criteria:
+                    submission = latest_submissions.get(ac.id)
                     if submission:
                         status_field = f'status_{ac.id}'
                         new_status = form.cleaned_data[status_field]
@@ -2055,16 +1929,8 @@ def provide_feedback(request, qualification_id, learner_id, lo_id):
                                 message=message
                             )
                             try:
-                                if not learner_user.user.email:
-                                    raise ValueError("Learner email is empty")
-                                send_notification_email(
-                                    recipient_email=learner_user.user.email,
-                                    learner_name=learner_user.user.full_name or learner_user.user.email,
-                                    business_name=business.name,
-                                    notification_message=message,
-                                    notification_date=notification.created_at
-                                )
-                                logger.info(f"Sent notification email to {learner_user.user.email} for AC: {ac.ac_detail}")
+                                queue_notification_email(notification, business.name)
+                                logger.info(f"Queued notification email to {learner_user.user.email} for AC: {ac.ac_detail}")
                             except Exception as e:
                                 logger.error(f"Failed to send notification email to {learner_user.user.email}: {str(e)}")
                                 messages.warning(request, f"Feedback updated, but failed to notify learner: {str(e)}")
@@ -2076,6 +1942,7 @@ def provide_feedback(request, qualification_id, learner_id, lo_id):
                             )
                             feedback_saved = True
                             logger.debug(f"Feedback saved for submission: {submission.id}")
+                rebuild_learner_progress([learner], activity_at=timezone.now())
             messages.success(request, f"Feedback and statuses updated for Learning Outcome: {lo.lo_detail}")
             return redirect('qualifications:assessor_feedback', qualification_id=qualification_id, learner_id=learner_id)
         else:
@@ -2107,11 +1974,10 @@ def feedback_history_view(request, qualification_id, learner_id, lo_id):
     if not business_id:
         raise Http404("No business selected. Please log in again.")
 
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        business = user_business.business
-    except UserBusiness.DoesNotExist:
+    user_business = request.user_business
+    if user_business is None:
         raise Http404("You are not associated with this business.")
+    business = request.business
 
     try:
         qualification = Qual.objects.get(id=qualification_id)
@@ -2120,28 +1986,11 @@ def feedback_history_view(request, qualification_id, learner_id, lo_id):
         raise Http404("Invalid qualification or learning outcome.")
 
     # Check user roles for access
-    is_learner = Learner.objects.filter(
-        user=user_business,
-        qualification=qualification,
-        is_active=True
-    ).exists()
-    is_assessor = Assessor.objects.filter(
-        user=user_business,
-        qualification=qualification
-    ).exists()
-    is_iqa = IQA.objects.filter(
-        user=user_business,
-        qualification=qualification
-    ).exists()
-    is_eqa = EQA.objects.filter(
-        user=user_business,
-        qualification=qualification
-    ).exists()
-    is_admin = UserBusiness.objects.filter(
-        user=request.user,
-        business=business,
-        user_type='admin'
-    ).exists()
+    is_learner = request.roles.has_role(LEARNER, qualification.id)
+    is_assessor = request.roles.has_role(ASSESSOR, qualification.id)
+    is_iqa = request.roles.has_role(IQA_ROLE, qualification.id)
+    is_eqa = request.roles.has_role(EQA_ROLE, qualification.id)
+    is_admin = user_business.user_type == 'admin'
 
     if not (is_learner or is_assessor or is_iqa or is_eqa or is_admin):
         raise Http404("You are not authorized to view this feedback history.")
@@ -2213,13 +2062,12 @@ def notification_view(request):
     if not business_id:
         raise Http404("No business selected. Please log in again.")
 
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-    except UserBusiness.DoesNotExist:
+    user_business = request.user_business
+    if user_business is None:
         raise Http404("You are not associated with this business.")
 
     # Check if the user is a Learner for any qualification
-    is_learner = Learner.objects.filter(user=user_business, is_active=True).exists()
+    is_learner = request.roles.has_role(LEARNER)
     if not is_learner:
         raise Http404("Only Learners can access the notification view.")
 
@@ -2250,21 +2098,14 @@ def iqa_view(request, qualification_id):
        if not business_id:
            raise Http404("No business selected. Please log in again.")
 
-       try:
-           user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-           business = user_business.business
-       except UserBusiness.DoesNotExist:
+       user_business = request.user_business
+       if user_business is None:
            raise Http404("You are not associated with this business.")
+       business = request.business
 
        # Check if user is IQA or EQA
-       is_iqa = IQA.objects.filter(
-           user=user_business,
-           qualification__id=qualification_id
-       ).exists()
-       is_eqa = EQA.objects.filter(
-           user=user_business,
-           qualification__id=qualification_id
-       ).exists()
+       is_iqa = request.roles.has_role(IQA_ROLE, qualification_id)
+       is_eqa = request.roles.has_role(EQA_ROLE, qualification_id)
 
        if not is_iqa:
            if is_eqa:
@@ -2313,24 +2154,17 @@ def iqa_view(request, qualification_id):
            except (ValueError, TypeError):
                pass  # Ignore invalid UUID
 
+       learners = list(learners)
        learner_data = []
-       total_ac = AC.objects.filter(learning_outcome__unit__qualification=qualification).count()
        total_units = Unit.objects.filter(qualification=qualification).count()
+       progress_map = learner_progress_map(learners)
+       sampled_units_map = sampled_unit_counts(learners, iqa=user_business)
 
        for learner in learners:
-           accepted_ac = EvidenceSubmission.objects.filter(
-               user=learner.user,
-               assessment_criterion__learning_outcome__unit__qualification=qualification,
-               status='ACCEPTED'
-           ).count()
-           progress = (accepted_ac / total_ac * 100) if total_ac > 0 else 0
+           progress = progress_map[learner.id].percentage
 
            # Calculate IQA Sampling Ratio
-           sampled_units = Sampling.objects.filter(
-               iqa=user_business,
-               evidence_submission__user=learner.user,
-               evidence_submission__assessment_criterion__learning_outcome__unit__qualification=qualification
-           ).values('evidence_submission__assessment_criterion__learning_outcome__unit').distinct().count()
+           sampled_units = sampled_units_map[learner.id]
            sampling_ratio = (sampled_units / total_units * 100) if total_units > 0 else 0
 
            # Apply progress filter
@@ -2392,11 +2226,10 @@ def iqa_feedback_history_view(request, qualification_id, learner_id):
     if not business_id:
         raise Http404("No business selected. Please log in again.")
 
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        business = user_business.business
-    except UserBusiness.DoesNotExist:
+    user_business = request.user_business
+    if user_business is None:
         raise Http404("You are not associated with this business.")
+    business = request.business
 
     try:
         learner = Learner.objects.get(
@@ -2410,19 +2243,23 @@ def iqa_feedback_history_view(request, qualification_id, learner_id):
         raise Http404("Invalid learner or not associated with this qualification.")
 
     # Check if user is IQA for the qualification
-    if not IQA.objects.filter(
-        user=user_business,
-        qualification__id=qualification_id
-    ).exists():
+    if not request.roles.has_role(IQA_ROLE, qualification_id):
         raise Http404("You are not authorized to view this learner's evidence as an IQA.")
 
     # Role-based access check
     if learner.iqa != user_business:
         raise Http404("This learner is not assigned to you.")
 
-    units = Unit.objects.filter(qualification__id=qualification_id).prefetch_related(
-        'learning_outcomes__assessment_criteria__evidence_submissions',
-        'learning_outcomes__workbook_submissions'
+    units = qualification_structure(learner.qualification_id).units
+    latest_submissions = latest_evidence_by_ac(learner_user, learner.qualification_id)
+    latest_workbooks = latest_workbook_by_lo(learner_user, learner.qualification_id)
+    feedback_lo_ids = lo_ids_with_feedback(learner_user, learner.qualification_id)
+    sampled_unit_ids = set(
+        Sampling.objects.filter(
+            iqa=user_business,
+            evidence_submission__user=learner_user,
+            evidence_submission__assessment_criterion__learning_outcome__unit__qualification=learner.qualification_id
+        ).values_list('evidence_submission__assessment_criterion__learning_outcome__unit', flat=True)
     )
 
     structured_data = []
@@ -2432,36 +2269,22 @@ def iqa_feedback_history_view(request, qualification_id, learner_id):
             'unit_title': unit.unit_title,
             'unit_number': unit.unit_number,
             'learning_outcomes': [],
-            'has_iqa_feedback': Sampling.objects.filter(
-                iqa=user_business,
-                evidence_submission__user=learner_user,
-                evidence_submission__assessment_criterion__learning_outcome__unit=unit
-            ).exists(),
+            'has_iqa_feedback': unit.id in sampled_unit_ids,
             'all_ac_accepted': True
         }
-        for lo in unit.learning_outcomes.all():
+        for lo in unit.learning_outcomes:
             lo_data = {
                 'detail': lo.lo_detail,
                 'id': str(lo.id),
-                'has_feedback': Feedback.objects.filter(
-                    evidence_submission__user=learner_user,
-                    evidence_submission__assessment_criterion__learning_outcome=lo,
-                    evidence_submission__assessment_criterion__learning_outcome__unit__qualification__id=qualification_id
-                ).exists(),
+                'has_feedback': lo.id in feedback_lo_ids,
                 'assessment_criteria': [],
                 'workbook_url': None
             }
-            workbook_submission = WorkbookSubmission.objects.filter(
-                user=learner_user,
-                learning_outcome=lo
-            ).order_by('-submitted_at').first()
+            workbook_submission = latest_workbooks.get(lo.id)
             if workbook_submission and workbook_submission.workbook_file:
-                lo_data['workbook_url'] = workbook_submission.workbook_file.url
-            for ac in lo.assessment_criteria.all():
-                submission = EvidenceSubmission.objects.filter(
-                    user=learner_user,
-                    assessment_criterion=ac
-                ).order_by('-submitted_at').first()
+                lo_data['workbook_url'] = learner_file_url('workbook', workbook_submission.id)
+            for ac in lo.assessment_criteria:
+                submission = latest_submissions.get(ac.id)
                 status = submission.status if submission else 'Not Submitted'
                 if status == 'REJECTED':
                     status = 'Resubmission Required'
@@ -2500,11 +2323,10 @@ def iqa_feedback_history(request, qualification_id, learner_id, unit_id):
     if not business_id:
         raise Http404("No business selected. Please log in again.")
 
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        business = user_business.business
-    except UserBusiness.DoesNotExist:
+    user_business = request.user_business
+    if user_business is None:
         raise Http404("You are not associated with this business.")
+    business = request.business
 
     # Check if user is a learner
     if user_business.user_type == 'learner':
@@ -2530,19 +2352,13 @@ def iqa_feedback_history(request, qualification_id, learner_id, unit_id):
         raise Http404("Invalid unit.")
 
     # Check if user is IQA, EQA, or assessor for the qualification
-    is_iqa = IQA.objects.filter(
-        user=user_business,
-        qualification__id=qualification_id
-    ).exists()
+    is_iqa = request.roles.has_role(IQA_ROLE, qualification_id)
     is_eqa = EQA.objects.filter(
         user=user_business,
         qualification__id=qualification_id,
         learners__id=learner_id
     ).exists()
-    is_assessor = Assessor.objects.filter(
-        user=user_business,
-        qualification__id=qualification_id
-    ).exists()
+    is_assessor = request.roles.has_role(ASSESSOR, qualification_id)
 
     # If not admin, verify user is IQA, EQA, or assessor and learner is assigned
     if not is_admin:
@@ -2592,21 +2408,14 @@ def iqa_feedback_to_assessor_view(request, qualification_id):
        if not business_id:
            raise Http404("No business selected. Please log in again.")
 
-       try:
-           user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-           business = user_business.business
-       except UserBusiness.DoesNotExist:
+       user_business = request.user_business
+       if user_business is None:
            raise Http404("You are not associated with this business.")
+       business = request.business
 
        # Check if user is IQA or EQA
-       is_iqa = IQA.objects.filter(
-           user=user_business,
-           qualification__id=qualification_id
-       ).exists()
-       is_eqa = EQA.objects.filter(
-           user=user_business,
-           qualification__id=qualification_id
-       ).exists()
+       is_iqa = request.roles.has_role(IQA_ROLE, qualification_id)
+       is_eqa = request.roles.has_role(EQA_ROLE, qualification_id)
 
        if not is_iqa:
            if is_eqa:
@@ -2655,21 +2464,14 @@ def iqa_feedback_to_assessor_records_view(request, qualification_id=None):
     if not business_id:
         raise Http404("No business selected. Please log in again.")
 
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        business = user_business.business
-    except UserBusiness.DoesNotExist:
+    user_business = request.user_business
+    if user_business is None:
         raise Http404("You are not associated with this business.")
+    business = request.business
 
     # Check user roles
-    is_iqa = IQA.objects.filter(user=user_business).exists() if qualification_id is None else IQA.objects.filter(
-        user=user_business,
-        qualification__id=qualification_id
-    ).exists()
-    is_assessor = Assessor.objects.filter(user=user_business).exists() if qualification_id is None else Assessor.objects.filter(
-        user=user_business,
-        qualification__id=qualification_id
-    ).exists()
+    is_iqa = request.roles.has_role(IQA_ROLE, qualification_id)
+    is_assessor = request.roles.has_role(ASSESSOR, qualification_id)
     is_admin = user_business.user_type == 'admin'
 
     if not (is_iqa or is_assessor or is_admin):
@@ -2750,14 +2552,13 @@ def doc_requirement(request):
         messages.error(request, "Business ID not found in session.")
         return redirect('login')
 
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        if user_business.user_type != 'admin':
-            messages.error(request, "You are not authorized to access this page.")
-            return redirect('login')
-    except UserBusiness.DoesNotExist:
+    user_business = request.user_business
+    if user_business is None:
         messages.error(request, "You are not associated with this business.")
         return redirect('login')
+    if user_business.user_type != 'admin':
+        messages.error(request, "You are not authorized to access this page.")
+        return redirect('login')
 
     # Get qualification
     qual_id = request.GET.get('id')
@@ -2818,11 +2619,10 @@ def iqa_feedback_view(request, qualification_id, learner_id, unit_id):
     if not business_id:
         raise Http404("No business selected. Please log in again.")
 
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        business = user_business.business
-    except UserBusiness.DoesNotExist:
+    user_business = request.user_business
+    if user_business is None:
         raise Http404("You are not associated with this business.")
+    business = request.business
 
     try:
         learner = Learner.objects.get(
@@ -2841,10 +2641,7 @@ def iqa_feedback_view(request, qualification_id, learner_id, unit_id):
         raise Http404("Invalid unit.")
 
     # Check if user is IQA for the qualification
-    if not IQA.objects.filter(
-        user=user_business,
-        qualification__id=qualification_id
-    ).exists():
+    if not request.roles.has_role(IQA_ROLE, qualification_id):
         raise Http404("You are not authorized to provide feedback as an IQA.")
 
     # Role-based access check
@@ -2852,18 +2649,14 @@ def iqa_feedback_view(request, qualification_id, learner_id, unit_id):
         raise Http404("This learner is not assigned to you.")
 
     # Check if all assessment criteria for the unit are ACCEPTED
-    all_ac_accepted = True
-    for lo in unit.learning_outcomes.all():
-        for ac in lo.assessment_criteria.all():
-            submission = EvidenceSubmission.objects.filter(
-                user=learner_user,
-                assessment_criterion=ac
-            ).order_by('-submitted_at').first()
-            if not submission or submission.status != 'ACCEPTED':
-                all_ac_accepted = False
-                break
-        if not all_ac_accepted:
-            break
+    latest_statuses = {
+        submission.assessment_criterion_id: submission.status
+        for submission in EvidenceSubmission.objects.filter(
+            assessment_criterion__learning_outcome__unit=unit
+        ).latest_per_ac(learner_user)
+    }
+    unit_ac_ids = AC.objects.filter(learning_outcome__unit=unit).values_list('id', flat=True)
+    all_ac_accepted = all(latest_statuses.get(ac_id) == 'ACCEPTED' for ac_id in unit_ac_ids)
 
     if not all_ac_accepted:
         raise Http404("Cannot provide feedback until all assessment criteria are accepted.")
@@ -2898,7 +2691,8 @@ def iqa_feedback_view(request, qualification_id, learner_id, unit_id):
                 # Send email notification to assessor if outcome is Non-Conformance
                 if form.cleaned_data['outcome'] == 'NON_CONFORMANCE' and learner.assessor:
                     try:
-                        send_non_conformance_email(
+                        enqueue_email(
+                            send_non_conformance_email,
                             recipient_email=learner.assessor.user.email,
                             iqa_name=user_business.user.full_name or user_business.user.email,
                             learner_name=learner_user.user.full_name or learner_user.user.email,
@@ -2907,7 +2701,7 @@ def iqa_feedback_view(request, qualification_id, learner_id, unit_id):
                             business_name=business.name,
                             business_id=business.business_id
                         )
-                        logger.info(f"Sent non-conformance notification to {learner.assessor.user.email}")
+                        logger.info(f"Queued non-conformance notification to {learner.assessor.user.email}")
                     except Exception as e:
                         logger.error(f"Failed to send non-conformance notification to {learner.assessor.user.email}: {str(e)}")
                         messages.warning(request, f"Feedback submitted, but failed to notify assessor: {str(e)}")
@@ -2956,15 +2750,11 @@ def submit_docs(request, qualification_id):
         messages.error(request, "Business ID not found in session.")
         return redirect('login')
 
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        business = Business.objects.get(business_id=business_id)
-    except UserBusiness.DoesNotExist:
+    user_business = request.user_business
+    if user_business is None:
         messages.error(request, "You are not associated with this business.")
         return redirect('login')
-    except Business.DoesNotExist:
-        messages.error(request, "Business not found.")
-        return redirect('login')
+    business = request.business
 
     qualification = get_object_or_404(Qual, id=qualification_id)
     try:
@@ -3059,7 +2849,8 @@ def submit_docs(request, qualification_id):
                         )
                         if not recipient_email:
                             raise ValueError("Recipient email is empty")
-                        send_document_submission_notification_email(
+                        enqueue_email(
+                            send_document_submission_notification_email,
                             assessor_email=recipient_email,
                             assessor_name=recipient_name,
                             learner_name=learner_name,
@@ -3068,7 +2859,7 @@ def submit_docs(request, qualification_id):
                             business_id=business.business_id,
                             submission_type='Document'
                         )
-                        logger.info(f"Sent document submission notification to {recipient_email}")
+                        logger.info(f"Queued document submission notification to {recipient_email}")
                     except Exception as e:
                         logger.error(f"Failed to send document submission notification to {recipient_email if recipient_email else 'unknown'}: {str(e)}")
                         messages.warning(request, f"Document submitted, but failed to notify recipient: {str(e)}")
@@ -3120,11 +2911,10 @@ def learner_view(request, qualification_id):
     if not business_id:
         raise Http404("No business selected. Please log in again.")
 
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        business = user_business.business
-    except UserBusiness.DoesNotExist:
+    user_business = request.user_business
+    if user_business is None:
         raise Http404("You are not associated with this business.")
+    business = request.business
 
     try:
         learner = Learner.objects.get(
@@ -3136,18 +2926,12 @@ def learner_view(request, qualification_id):
     except Learner.DoesNotExist:
         raise Http404("You are not a learner for this qualification.")
 
-    total_ac = AC.objects.filter(learning_outcome__unit__qualification=qualification).count()
-    accepted_ac = EvidenceSubmission.objects.filter(
-        user=user_business,
-        assessment_criterion__learning_outcome__unit__qualification=qualification,
-        status='ACCEPTED'
-    ).count()
-    completion_percentage = (accepted_ac / total_ac * 100) if total_ac > 0 else 0
-
-    units = Unit.objects.filter(qualification=qualification).prefetch_related(
-        'learning_outcomes__assessment_criteria__evidence_submissions',
-        'learning_outcomes__workbook_submissions'
-    )
+    completion_percentage = learner_progress_map([learner])[learner.id].percentage
+
+    units = qualification_structure(qualification).units
+    latest_submissions = latest_evidence_by_ac(user_business, qualification)
+    latest_workbooks = latest_workbook_by_lo(user_business, qualification)
+    feedback_lo_ids = lo_ids_with_feedback(user_business, qualification)
 
     structured_data = []
     for unit in units:
@@ -3156,37 +2940,27 @@ def learner_view(request, qualification_id):
             'number': unit.unit_number,
             'learning_outcomes': []
         }
-        for lo in unit.learning_outcomes.all():
+        for lo in unit.learning_outcomes:
             lo_data = {
                 'detail': lo.lo_detail,
                 'id': lo.id,
-                'has_feedback': Feedback.objects.filter(
-                    evidence_submission__user=user_business,
-                    evidence_submission__assessment_criterion__learning_outcome=lo,
-                    evidence_submission__assessment_criterion__learning_outcome__unit__qualification=qualification
-                ).exists(),
+                'has_feedback': lo.id in feedback_lo_ids,
                 'assessment_criteria': [],
                 'workbook_submission': None,
                 'workbook_status': 'Not Submitted',
                 'workbook_url': None,
                 'can_upload_workbook': True
             }
-            workbook_submission = WorkbookSubmission.objects.filter(
-                user=user_business,
-                learning_outcome=lo
-            ).order_by('-submitted_at').first()
+            workbook_submission = latest_workbooks.get(lo.id)
             if workbook_submission:
                 lo_data['workbook_submission'] = workbook_submission
                 lo_data['workbook_status'] = workbook_submission.status
                 if workbook_submission.status == 'REJECTED':
                     lo_data['workbook_status'] = 'Resubmission Required'
-                lo_data['workbook_url'] = workbook_submission.workbook_file.url if workbook_submission.workbook_file else None
+                lo_data['workbook_url'] = learner_file_url('workbook', workbook_submission.id) if workbook_submission.workbook_file else None
                 lo_data['can_upload_workbook'] = workbook_submission.status not in ['ACCEPTED', 'REJECTED']
-            for ac in lo.assessment_criteria.all():
-                submission = EvidenceSubmission.objects.filter(
-                    user=user_business,
-                    assessment_criterion=ac
-                ).order_by('-submitted_at').first()
+            for ac in lo.assessment_criteria:
+                submission = latest_submissions.get(ac.id)
                 status = submission.status if submission else 'Not Submitted'
                 if status == 'REJECTED':
                     status = 'Resubmission Required'
@@ -3215,14 +2989,18 @@ def learner_view(request, qualification_id):
                         user=user_business,
                         assessment_criterion=ac
                     ).order_by('-submitted_at').first()
+                    # Files sent straight to storage arrive as upload tokens instead of request.FILES
+                    uploaded_keys = claim_uploads(user_business, 'evidence', request.POST.getlist('evidence_uploads'))
+                    evidence_files = request.FILES.getlist('evidence_files') + uploaded_keys
                     
                     with transaction.atomic():
+                        record_claims(uploaded_keys)
                         if latest_submission and latest_submission.status == 'SUBMITTED':
                             latest_submission.evidence_detail = form.cleaned_data['evidence_detail']
                             latest_submission.save()
-                            if request.FILES.getlist('evidence_files'):
+                            if evidence_files:
                                 latest_submission.files.all().delete()
-                                for file in request.FILES.getlist('evidence_files'):
+                                for file in evidence_files:
                                     EvidenceFile.objects.create(
                                         evidence_submission=latest_submission,
                                         evidence_file=file
@@ -3235,12 +3013,13 @@ def learner_view(request, qualification_id):
                                 evidence_detail=form.cleaned_data['evidence_detail'],
                                 status='SUBMITTED'
                             )
-                            for file in request.FILES.getlist('evidence_files'):
+                            for file in evidence_files:
                                 EvidenceFile.objects.create(
                                     evidence_submission=submission,
                                     evidence_file=file
                                 )
                             messages.success(request, "Evidence submitted successfully.")
+                        rebuild_learner_progress([learner], activity_at=timezone.now())
 
                         # Send notification email to assessor or admin synchronously
                         recipient_email = None
@@ -3268,7 +3047,8 @@ def learner_view(request, qualification_id):
                             )
                             if not recipient_email:
                                 raise ValueError("Recipient email is empty")
-                            send_document_submission_notification_email(
+                            enqueue_email(
+                                send_document_submission_notification_email,
                                 assessor_email=recipient_email,
                                 assessor_name=recipient_name,
                                 learner_name=learner_name,
@@ -3277,7 +3057,7 @@ def learner_view(request, qualification_id):
                                 business_id=business.business_id,
                                 submission_type='Evidence'
                             )
-                            logger.info(f"Sent evidence submission notification to {recipient_email}")
+                            logger.info(f"Queued evidence submission notification to {recipient_email}")
                         except Exception as e:
                             logger.error(f"Failed to send evidence submission notification to {recipient_email if recipient_email else 'unknown'}: {str(e)}")
                             messages.warning(request, f"Evidence submitted, but failed to notify recipient: {str(e)}")
@@ -3285,6 +3065,8 @@ def learner_view(request, qualification_id):
                         return redirect('qualifications:learner_view', qualification_id=qualification_id)
                 except AC.DoesNotExist:
                     messages.error(request, "Invalid assessment criterion.")
+                except ValidationError as e:
+                    messages.error(request, e.messages[0])
                 except Exception as e:
                     messages.error(request, f"Error submitting evidence: {str(e)}")
             else:
@@ -3302,10 +3084,16 @@ def learner_view(request, qualification_id):
                         user=user_business,
                         learning_outcome=lo
                     ).order_by('-submitted_at').first()
+                    workbook_file = form.cleaned_data['workbook_file']
+                    uploaded_keys = [] if workbook_file else claim_uploads(
+                        user_business, 'workbook', [request.POST['workbook_upload']]
+                    )
+                    workbook_file = workbook_file or uploaded_keys[0]
                     
                     with transaction.atomic():
+                        record_claims(uploaded_keys)
                         if latest_submission and latest_submission.status == 'SUBMITTED':
-                            latest_submission.workbook_file = form.cleaned_data['workbook_file']
+                            latest_submission.workbook_file = workbook_file
                             latest_submission.submitted_at = timezone.now()
                             latest_submission.save()
                             messages.success(request, "Workbook updated successfully.")
@@ -3313,7 +3101,7 @@ def learner_view(request, qualification_id):
                             submission = WorkbookSubmission.objects.create(
                                 user=user_business,
                                 learning_outcome=lo,
-                                workbook_file=form.cleaned_data['workbook_file'],
+                                workbook_file=workbook_file,
                                 status='SUBMITTED'
                             )
                             messages.success(request, "Workbook submitted successfully.")
@@ -3344,7 +3132,8 @@ def learner_view(request, qualification_id):
                             )
                             if not recipient_email:
                                 raise ValueError("Recipient email is empty")
-                            send_document_submission_notification_email(
+                            enqueue_email(
+                                send_document_submission_notification_email,
                                 assessor_email=recipient_email,
                                 assessor_name=recipient_name,
                                 learner_name=learner_name,
@@ -3353,7 +3142,7 @@ def learner_view(request, qualification_id):
                                 business_id=business.business_id,
                                 submission_type='Workbook'
                             )
-                            logger.info(f"Sent workbook submission notification to {recipient_email}")
+                            logger.info(f"Queued workbook submission notification to {recipient_email}")
                         except Exception as e:
                             logger.error(f"Failed to send workbook submission notification to {recipient_email if recipient_email else 'unknown'}: {str(e)}")
                             messages.warning(request, f"Workbook submitted, but failed to notify recipient: {str(e)}")
@@ -3361,6 +3150,8 @@ def learner_view(request, qualification_id):
                         return redirect('qualifications:learner_view', qualification_id=qualification_id)
                 except LO.DoesNotExist:
                     messages.error(request, "Invalid learning outcome.")
+                except ValidationError as e:
+                    messages.error(request, e.messages[0])
                 except Exception as e:
                     messages.error(request, f"Error submitting workbook: {str(e)}")
             else:
@@ -3376,10 +3167,114 @@ def learner_view(request, qualification_id):
         'structured_data': structured_data,
         'form': form,
         'learner': learner,
+        'direct_uploads': direct_uploads_enabled(),
     }
 
     return render(request, 'learner_view.html', context)
 
+
+@login_required
+@require_POST
+def direct_upload_view(request, qualification_id):
+    """
+    Presign a browser upload of one evidence or workbook file straight to storage. The returned
+    token goes back with the learner_view submission form in place of the file itself.
+    """
+    if not direct_uploads_enabled():
+        raise Http404("Direct uploads are disabled.")
+    if not request.roles.has_role(LEARNER, qualification_id):
+        raise Http404("You are not a learner for this qualification.")
+    try:
+        size = int(request.POST.get('size', 0))
+        upload = start_upload(request.user_business, request.POST.get('kind'), request.POST.get('filename', ''), size)
+    except (ValueError, ValidationError) as e:
+        error = e.messages[0] if isinstance(e, ValidationError) else "Invalid file size."
+        return JsonResponse({'error': error}, status=400)
+    return JsonResponse(upload)
+
+
+def _chunked_upload_json(upload):
+    return {
+        'upload_id': str(upload.id),
+        'status': upload.status,
+        'chunk_size': upload.chunk_size,
+        'chunk_count': upload.chunk_count,
+        'received': received_chunks(upload),
+    }
+
+
+def _owned_chunked_upload(request, upload_id):
+    if request.user_business is None:
+        raise Http404("Upload not found.")
+    return get_object_or_404(
+        ChunkedUpload.objects.select_related('user__business', 'assessment_criterion'),
+        id=upload_id, user=request.user_business
+    )
+
+
+@login_required
+@require_POST
+def chunked_upload_start(request, qualification_id):
+    """
+    Open a resumable evidence upload: POST ac_id, filename and size; then send each chunk to
+    chunked_upload_chunk and finish with chunked_upload_complete.
+    """
+    learner = Learner.objects.filter(
+        user=request.user_business, qualification__id=qualification_id, is_active=True
+    ).first() if request.user_business else None
+    if learner is None:
+        raise Http404("You are not a learner for this qualification.")
+    ac = get_object_or_404(AC, id=request.POST.get('ac_id'), learning_outcome__unit__qualification__id=qualification_id)
+    try:
+        upload = start_chunked_upload(learner, ac, request.POST.get('filename', ''), int(request.POST.get('size', 0)))
+    except ValueError:
+        return JsonResponse({'error': "Invalid file size."}, status=400)
+    except ValidationError as e:
+        return JsonResponse({'error': e.messages[0]}, status=400)
+    return JsonResponse(_chunked_upload_json(upload), status=201)
+
+
+@login_required
+def chunked_upload_status(request, upload_id):
+    """
+    Report which chunks the server holds, so an interrupted upload can resume with the rest.
+    """
+    return JsonResponse(_chunked_upload_json(_owned_chunked_upload(request, upload_id)))
+
+
+@login_required
+@require_POST
+def chunked_upload_chunk(request, upload_id, index):
+    upload = _owned_chunked_upload(request, upload_id)
+    chunk = request.FILES.get('chunk')
+    if chunk is None:
+        return JsonResponse({'error': "No chunk received."}, status=400)
+    try:
+        store_chunk(upload, index, chunk)
+    except ValidationError as e:
+        return JsonResponse({'error': e.messages[0]}, status=400)
+    return JsonResponse({'index': index, 'received': True})
+
+
+@login_required
+@require_POST
+def chunked_upload_complete(request, upload_id):
+    upload = _owned_chunked_upload(request, upload_id)
+    learner = get_object_or_404(
+        Learner.objects.select_related('qualification', 'assessor__user', 'user__user'),
+        user=upload.user, qualification__id=upload.assessment_criterion.learning_outcome.unit.qualification_id, is_active=True
+    )
+    try:
+        evidence = complete_chunked_upload(upload, learner, request.POST.get('evidence_detail', ''))
+    except ValidationError as e:
+        return JsonResponse({'error': e.messages[0]}, status=400)
+    return JsonResponse({
+        'upload_id': str(upload.id),
+        'evidence_file_id': str(evidence.id),
+        'submission_id': str(evidence.evidence_submission_id),
+        'file_url': learner_file_url('evidence', evidence.id),
+    })
+
 @login_required
 def doc_check(request, qualification_id, learner_id):
     """
@@ -3395,15 +3290,11 @@ def doc_check(request, qualification_id, learner_id):
         messages.error(request, "Business ID not found in session.")
         return redirect('login')
 
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        business = Business.objects.get(business_id=business_id)
-    except UserBusiness.DoesNotExist:
+    user_business = request.user_business
+    if user_business is None:
         messages.error(request, "You are not associated with this business.")
         return redirect('login')
-    except Business.DoesNotExist:
-        messages.error(request, "Business not found.")
-        return redirect('login')
+    business = request.business
 
     qualification = get_object_or_404(Qual, id=qualification_id)
     try:
@@ -3445,14 +3336,8 @@ def doc_check(request, qualification_id, learner_id):
                         message=message
                     )
                     try:
-                        send_notification_email(
-                            recipient_email=learner.user.user.email,
-                            learner_name=learner.user.user.full_name or learner.user.user.email,
-                            business_name=business.name,
-                            notification_message=message,
-                            notification_date=notification.created_at
-                        )
-                        logger.info(f"Sent notification email to {learner.user.user.email}")
+                        queue_notification_email(notification, business.name)
+                        logger.info(f"Queued notification email to {learner.user.user.email}")
                     except Exception as e:
                         logger.error(f"Failed to send notification email to {learner.user.user.email}: {str(e)}")
                         messages.warning(request, f"Document updated, but failed to notify learner: {str(e)}")
@@ -3517,12 +3402,11 @@ def iqa_submitted_docs(request, qualification_id, learner_id):
         messages.error(request, "No business selected. Please log in again.")
         return redirect('login')
 
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        business = user_business.business
-    except UserBusiness.DoesNotExist:
+    user_business = request.user_business
+    if user_business is None:
         messages.error(request, "You are not associated with this business.")
         return redirect('login')
+    business = request.business
 
     qualification = get_object_or_404(Qual, id=qualification_id)
     try:
@@ -3532,7 +3416,7 @@ def iqa_submitted_docs(request, qualification_id, learner_id):
         return redirect('qualifications:iqa_view', qualification_id=qualification_id)
 
     # Check if user is IQA for the qualification and learner
-    if not IQA.objects.filter(user=user_business, qualification=qualification).exists():
+    if not request.roles.has_role(IQA_ROLE, qualification.id):
         messages.error(request, "You are not an IQA for this qualification.")
         return redirect('qualifications:iqa_view', qualification_id=qualification_id)
     if learner.iqa != user_business:
@@ -3614,13 +3498,12 @@ def eqa_view(request, qualification_id, learner_id):
     if not business_id:
         raise Http404("No business selected. Please log in again.")
 
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        business = user_business.business
-    except UserBusiness.DoesNotExist:
+    user_business = request.user_business
+    if user_business is None:
         raise Http404("You are not associated with this business.")
+    business = request.business
 
-    is_admin = UserBusiness.objects.filter(user=request.user, business=business, user_type='admin').exists()
+    is_admin = user_business.user_type == 'admin'
     eqa = None
     try:
         eqa = EQA.objects.get(
@@ -3647,10 +3530,11 @@ def eqa_view(request, qualification_id, learner_id):
     if not is_admin and not (eqa and eqa.learners.filter(id=learner_id).exists()):
         raise Http404("This learner is not assigned to you.")
 
-    units = Unit.objects.filter(qualification__id=qualification_id).prefetch_related(
-        'learning_outcomes__assessment_criteria__evidence_submissions',
-        'learning_outcomes__workbook_submissions'
-    )
+    units = qualification_structure(qualification).units
+    latest_submissions = latest_evidence_by_ac(learner_user, qualification)
+    latest_workbooks = latest_workbook_by_lo(learner_user, qualification)
+    feedback_lo_ids = lo_ids_with_feedback(learner_user, qualification)
+    sampled_unit_ids = set(latest_sampling_outcome_by_unit(learner_user, qualification))
 
     structured_data = []
     for unit in units:
@@ -3659,35 +3543,22 @@ def eqa_view(request, qualification_id, learner_id):
             'unit_title': unit.unit_title,
             'unit_number': unit.unit_number,
             'learning_outcomes': [],
-            'has_iqa_feedback': Sampling.objects.filter(
-                evidence_submission__user=learner_user,
-                evidence_submission__assessment_criterion__learning_outcome__unit=unit
-            ).exists(),
+            'has_iqa_feedback': unit.id in sampled_unit_ids,
             'all_ac_accepted': True
         }
-        for lo in unit.learning_outcomes.all():
+        for lo in unit.learning_outcomes:
             lo_data = {
                 'detail': lo.lo_detail,
                 'id': str(lo.id),
-                'has_feedback': Feedback.objects.filter(
-                    evidence_submission__user=learner_user,
-                    evidence_submission__assessment_criterion__learning_outcome=lo,
-                    evidence_submission__assessment_criterion__learning_outcome__unit__qualification__id=qualification_id
-                ).exists(),
+                'has_feedback': lo.id in feedback_lo_ids,
                 'assessment_criteria': [],
                 'workbook_url': None
             }
-            workbook_submission = WorkbookSubmission.objects.filter(
-                user=learner_user,
-                learning_outcome=lo
-            ).order_by('-submitted_at').first()
+            workbook_submission = latest_workbooks.get(lo.id)
             if workbook_submission and workbook_submission.workbook_file:
-                lo_data['workbook_url'] = workbook_submission.workbook_file.url
-            for ac in lo.assessment_criteria.all():
-                submission = EvidenceSubmission.objects.filter(
-                    user=learner_user,
-                    assessment_criterion=ac
-                ).order_by('-submitted_at').first()
+                lo_data['workbook_url'] = learner_file_url('workbook', workbook_submission.id)
+            for ac in lo.assessment_criteria:
+                submission = latest_submissions.get(ac.id)
                 status = submission.status if submission else 'Not Submitted'
                 if status == 'REJECTED':
                     status = 'Resubmission Required'
@@ -3726,11 +3597,10 @@ def eqa_learner_list(request, qualification_id):
        if not business_id:
            raise Http404("No business selected. Please log in again.")
 
-       try:
-           user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-           business = user_business.business
-       except UserBusiness.DoesNotExist:
+       user_business = request.user_business
+       if user_business is None:
            raise Http404("You are not associated with this business.")
+       business = request.business
 
        try:
            eqa = EQA.objects.get(
@@ -3754,28 +3624,21 @@ def eqa_learner_list(request, qualification_id):
        if assessor_id and assessor_id != 'all':
            learners = learners.filter(assessor__id=assessor_id)
 
+       learners = list(learners)
        learner_data = []
-       total_ac = AC.objects.filter(learning_outcome__unit__qualification=qualification).count()
        total_units = Unit.objects.filter(qualification=qualification).count()
+       progress_map = learner_progress_map(learners)
+       sampled_units_map = sampled_unit_counts(learners)
 
        for learner in learners:
-           accepted_ac = EvidenceSubmission.objects.filter(
-               user=learner.user,
-               assessment_criterion__learning_outcome__unit__qualification=qualification,
-               status='ACCEPTED'
-           ).count()
-           progress = (accepted_ac / total_ac * 100) if total_ac > 0 else 0
+           progress = progress_map[learner.id].percentage
 
            if progress_min and float(progress_min) > progress:
                continue
            if progress_max and float(progress_max) < progress:
                continue
 
-           sampled_units = Sampling.objects.filter(
-               iqa=learner.iqa,
-               evidence_submission__user=learner.user,
-               evidence_submission__assessment_criterion__learning_outcome__unit__qualification=qualification
-           ).values('evidence_submission__assessment_criterion__learning_outcome__unit').distinct().count()
+           sampled_units = sampled_units_map[learner.id]
            sampling_ratio = (sampled_units / total_units * 100) if total_units > 0 else 0
 
            assessor_name = (
@@ -3865,23 +3728,15 @@ def learners_list(request, user_business_id, role_type, qualification_id):
             messages.error(request, "User is not an EQA for this qualification.")
             return redirect('qualifications:current_users')
 
+    learners = list(learners)
     learner_data = []
-    total_ac = AC.objects.filter(learning_outcome__unit__qualification=qualification).count()
     total_units = Unit.objects.filter(qualification=qualification).count()
+    progress_map = learner_progress_map(learners)
+    sampled_units_map = sampled_unit_counts(learners)
 
     for learner in learners:
-        accepted_ac = EvidenceSubmission.objects.filter(
-            user=learner.user,
-            assessment_criterion__learning_outcome__unit__qualification=qualification,
-            status='ACCEPTED'
-        ).count()
-        progress = (accepted_ac / total_ac * 100) if total_ac > 0 else 0
-
-        sampled_units = Sampling.objects.filter(
-            iqa=learner.iqa,
-            evidence_submission__user=learner.user,
-            evidence_submission__assessment_criterion__learning_outcome__unit__qualification=qualification
-        ).values('evidence_submission__assessment_criterion__learning_outcome__unit').distinct().count()
+        progress = progress_map[learner.id].percentage
+        sampled_units = sampled_units_map[learner.id]
         sampling_ratio = (sampled_units / total_units * 100) if total_units > 0 else 0
 
         learner_data.append({
@@ -3921,13 +3776,12 @@ def iqa_sub_doc_for_eqa(request, qualification_id, learner_id):
     if not business_id:
         raise Http404("No business selected. Please log in again.")
 
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        business = user_business.business
-    except UserBusiness.DoesNotExist:
+    user_business = request.user_business
+    if user_business is None:
         raise Http404("You are not associated with this business.")
+    business = request.business
 
-    is_admin = UserBusiness.objects.filter(user=request.user, business=business, user_type='admin').exists()
+    is_admin = user_business.user_type == 'admin'
     eqa = None
     try:
         eqa = EQA.objects.get(
@@ -4132,11 +3986,10 @@ def learner_resources_view(request, qualification_id):
     if not business_id:
         raise Http404("No business selected. Please log in again.")
 
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        business = user_business.business
-    except UserBusiness.DoesNotExist:
+    user_business = request.user_business
+    if user_business is None:
         raise Http404("You are not associated with this business.")
+    business = request.business
 
     try:
         learner = Learner.objects.get(
@@ -4174,11 +4027,10 @@ def assessor_resources_view(request, qualification_id):
     if not business_id:
         raise Http404("No business selected. Please log in again.")
 
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        business = user_business.business
-    except UserBusiness.DoesNotExist:
+    user_business = request.user_business
+    if user_business is None:
         raise Http404("You are not associated with this business.")
+    business = request.business
 
     try:
         assessor = Assessor.objects.get(
@@ -4215,11 +4067,10 @@ def iqa_resources_view(request, qualification_id):
     if not business_id:
         raise Http404("No business selected. Please log in again.")
 
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        business = user_business.business
-    except UserBusiness.DoesNotExist:
+    user_business = request.user_business
+    if user_business is None:
         raise Http404("You are not associated with this business.")
+    business = request.business
 
     try:
         iqa = IQA.objects.get(
@@ -4257,17 +4108,13 @@ def eqa_resources_view(request, qualification_id):
     if not business_id:
         raise Http404("No business selected. Please log in again.")
 
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        business = user_business.business
-    except UserBusiness.DoesNotExist:
+    user_business = request.user_business
+    if user_business is None:
         raise Http404("You are not associated with this business.")
+    business = request.business
 
     is_admin = user_business.user_type == 'admin'
-    is_eqa = EQA.objects.filter(
-        user=user_business,
-        qualification__id=qualification_id
-    ).exists()
+    is_eqa = request.roles.has_role(EQA_ROLE, qualification_id)
 
     if not (is_eqa or is_admin):
         raise Http404("You are not an EQA or admin for this qualification.")
@@ -4300,38 +4147,13 @@ def get_user_business(request):
         logger.error("Business ID not found in session")
         messages.error(request, "Business ID not found in session.")
         return None, None, redirect('login')
-    
-    try:
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        business = Business.objects.get(business_id=business_id)
-        return user_business, business, None
-    except UserBusiness.DoesNotExist:
+
+    user_business = request.user_business
+    if user_business is None:
         logger.error(f"UserBusiness not found for user {request.user.email} and business {business_id}")
         messages.error(request, "You are not authorized to access messages.")
         return None, None, redirect('login')
-    except UserBusiness.MultipleObjectsReturned:
-        user_business = UserBusiness.objects.filter(user=request.user, business__business_id=business_id).first()
-        if not user_business:
-            logger.error(f"No valid UserBusiness found for user {request.user.email} and business {business_id}")
-            messages.error(request, "You are not authorized to access messages for this business.")
-            return None, None, redirect('login')
-        business = Business.objects.get(business_id=business_id)
-        return user_business, business, None
-
-def process_threads(messages, user_business):
-    threads = {}
-    for message in messages:
-        subject = message.subject
-        if subject not in threads:
-            threads[subject] = {
-                'latest_message': message,
-                'unread_count': MessageRecipient.objects.filter(
-                    message__subject=subject,
-                    recipient=user_business,
-                    is_read=False
-                ).count() if user_business in message.recipients.all() else 0
-            }
-    return threads
+    return user_business, request.business, None
 
 @login_required
 def inbox_view(request):
@@ -4344,18 +4166,10 @@ def inbox_view(request):
     if redirect_response:
         return redirect_response
 
-    received_messages = Message.objects.filter(
-        recipients__recipient=user_business
-    ).prefetch_related('recipients').distinct().order_by('-sent_at')
-    logger.debug(f"Received messages count for user {user_business.user.email}: {received_messages.count()}")
-
-    threads = process_threads(received_messages, user_business)
-    logger.debug(f"Threads created: {len(threads)}")
+    threads, next_cursor = mailbox_page(user_business, 'inbox', request.GET.get('cursor'))
+    logger.debug(f"Inbox page for user {user_business.user.email}: {len(threads)} threads")
 
-    unread_count = MessageRecipient.objects.filter(
-        recipient=user_business,
-        is_read=False
-    ).count()
+    unread_count = unread_message_count(user_business)
     logger.debug(f"Unread messages count: {unread_count}")
 
     is_admin = user_business.user_type == 'admin'
@@ -4367,10 +4181,7 @@ def inbox_view(request):
         'unread_count': unread_count,
         'business_id': business.business_id,
         'is_admin': is_admin,
-        'debug_messages': {
-            'received_count': received_messages.count(),
-            'thread_count': len(threads)
-        }
+        'next_cursor': next_cursor,
     })
 
 @login_required
@@ -4384,18 +4195,10 @@ def sent_messages_view(request):
     if redirect_response:
         return redirect_response
 
-    sent_messages = Message.objects.filter(
-        sender=user_business
-    ).prefetch_related('recipients').distinct().order_by('-sent_at')
-    logger.debug(f"Sent messages count for user {user_business.user.email}: {sent_messages.count()}")
-
-    threads = process_threads(sent_messages, user_business)
-    logger.debug(f"Threads created: {len(threads)}")
+    threads, next_cursor = mailbox_page(user_business, 'sent', request.GET.get('cursor'))
+    logger.debug(f"Sent page for user {user_business.user.email}: {len(threads)} threads")
 
-    unread_count = MessageRecipient.objects.filter(
-        recipient=user_business,
-        is_read=False
-    ).count()
+    unread_count = unread_message_count(user_business)
     logger.debug(f"Unread messages count: {unread_count}")
 
     is_admin = user_business.user_type == 'admin'
@@ -4407,37 +4210,71 @@ def sent_messages_view(request):
         'unread_count': unread_count,
         'business_id': business.business_id,
         'is_admin': is_admin,
-        'debug_messages': {
-            'sent_count': sent_messages.count(),
-            'thread_count': len(threads)
-        }
+        'next_cursor': next_cursor,
     })
 
 
+@login_required
+def mailbox_api(request, mailbox):
+    """
+    JSON page of the inbox or sent threads. Pass the returned next_cursor back as ?cursor= to
+    fetch the following page; it is null on the last page.
+    """
+    if mailbox not in MAILBOXES:
+        raise Http404("Unknown mailbox.")
+    user_business = request.user_business
+    if user_business is None:
+        return JsonResponse({'error': 'User or business not found'}, status=403)
+
+    threads, next_cursor = mailbox_page(user_business, mailbox, request.GET.get('cursor'))
+    time_field, message_field = MAILBOXES[mailbox]
+    results = []
+    for participant in threads:
+        message = getattr(participant, message_field)
+        entry = {
+            'thread_id': str(participant.thread_id),
+            'subject': participant.thread.subject,
+            'last_message_at': getattr(participant, time_field).isoformat(),
+            'unread_count': participant.unread_count,
+            'url': reverse('qualifications:message_thread', args=[participant.thread_id]),
+        }
+        if mailbox == 'inbox':
+            entry['from'] = (message.sender.user.full_name or message.sender.user.email) if message else None
+        else:
+            entry['to'] = [
+                recipient.recipient.user.full_name or recipient.recipient.user.email
+                for recipient in message.recipients.all()
+            ] if message else []
+        results.append(entry)
+    return JsonResponse({'threads': results, 'next_cursor': next_cursor})
+
+
 @login_required
 def compose_message_view(request):
-    try:
-        business_id = request.session.get('business_id')
-        logger.debug(f"Session business_id: {business_id}")
-        if not business_id:
-            messages.error(request, "Business ID not found in session.")
-            return redirect('login')
-        user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-        business = Business.objects.get(business_id=business_id)
-    except Exception as e:
-        messages.error(request, f"You are not authorized to send messages. Error: {str(e)}")
+    business_id = request.session.get('business_id')
+    logger.debug(f"Session business_id: {business_id}")
+    if not business_id:
+        messages.error(request, "Business ID not found in session.")
+        return redirect('login')
+    user_business = request.user_business
+    if user_business is None:
+        messages.error(request, "You are not authorized to send messages.")
         return redirect('login')
+    business = request.business
 
-    is_eqa = EQA.objects.filter(user=user_business).exists()
+    is_eqa = request.roles.has_role(EQA_ROLE)
     is_reply = request.GET.get('reply', '') == 'true'
     reply_subject = request.GET.get('subject', '')
 
-# NEW: Fetch subject from message if thread_id is passed
+    reply_thread = None
     thread_id = request.GET.get('thread_id')
-    if thread_id and not reply_subject:
-        main_message = Message.objects.filter(id=thread_id).first()
-        if main_message:
-            reply_subject = main_message.subject
+    if thread_id:
+        try:
+            reply_thread = participant_thread(user_business, thread_id)
+        except ValidationError:
+            reply_thread = None
+        if reply_thread and not reply_subject:
+            reply_subject = reply_thread.subject
     reply_recipient_ids = request.GET.getlist('recipient')
     reply_qualification_id = request.GET.get('qualification')
 
@@ -4455,12 +4292,8 @@ def compose_message_view(request):
             logger.debug(f"Reply recipients: {[r.user.full_name or r.user.email for r in reply_recipients]}")
     else:
         if user_business.user_type != 'admin':
-            learner_qual_ids = Learner.objects.filter(user=user_business, qualification__business=business).values_list('qualification__id', flat=True)
-            assessor_qual_ids = Assessor.objects.filter(user=user_business, qualification__business=business).values_list('qualification__id', flat=True)
-            iqa_qual_ids = IQA.objects.filter(user=user_business, qualification__business=business).values_list('qualification__id', flat=True)
-            eqa_qual_ids = EQA.objects.filter(user=user_business, qualification__business=business).values_list('qualification__id', flat=True)
-            qual_ids = set(learner_qual_ids) | set(assessor_qual_ids) | set(iqa_qual_ids) | set(eqa_qual_ids)
-            qualification_queryset = Qual.objects.filter(id__in=qual_ids, business=business)
+            # Every qualification the user holds a role on, from the request's role map
+            qualification_queryset = Qual.objects.filter(id__in=list(request.roles.as_dict()), business=business)
         else:
             qualification_queryset = Qual.objects.filter(business=business)
         logger.debug(f"Qualification queryset count: {qualification_queryset.count() if qualification_queryset else 0}")
@@ -4480,47 +4313,38 @@ def compose_message_view(request):
         logger.debug(f"Form data: {request.POST}")
         if form.is_valid():
             logger.debug("Form is valid")
-            message = Message.objects.create(
-                sender=user_business,
-                subject=form.cleaned_data['subject'],
-                body=form.cleaned_data['body'],
-                attachment=form.cleaned_data['attachment'],
-                qualification=form.cleaned_data['qualification'] or reply_qualification
-            )
-            recipients = form.cleaned_data['recipients']
-            for recipient in recipients:
-                MessageRecipient.objects.create(
-                    message=message,
-                    recipient=recipient
+            qualification = form.cleaned_data['qualification'] or reply_qualification
+            recipients = list(form.cleaned_data['recipients'].select_related('user'))
+            with transaction.atomic():
+                thread = reply_thread if is_reply and reply_thread else start_thread(business, form.cleaned_data['subject'], qualification)
+                message = Message.objects.create(
+                    thread=thread,
+                    sender=user_business,
+                    subject=form.cleaned_data['subject'],
+                    body=form.cleaned_data['body'],
+                    attachment=form.cleaned_data['attachment'],
+                    qualification=qualification
                 )
-                # Send email notification to recipient
-                try:
-                    # Determine sender's role based on qualification
-                    sender_role = "Admin" if user_business.user_type == 'admin' else "User"
-                    if message.qualification:
-                        if Learner.objects.filter(user=user_business, qualification=message.qualification).exists():
-                            sender_role = "Learner"
-                        elif Assessor.objects.filter(user=user_business, qualification=message.qualification).exists():
-                            sender_role = "Assessor"
-                        elif IQA.objects.filter(user=user_business, qualification=message.qualification).exists():
-                            sender_role = "IQA"
-                        elif EQA.objects.filter(user=user_business, qualification=message.qualification).exists():
-                            sender_role = "EQA"
-                    
-                    send_message_notification_email(
-                        recipient_email=recipient.user.email,
-                        recipient_name=recipient.user.full_name or recipient.user.email,
-                        sender_name=user_business.user.full_name or user_business.user.email,
-                        sender_role=sender_role,
-                        business_name=business.name,
-                        message_subject=message.subject,
-                        message_sent_at=message.sent_at or timezone.now(),
-                        fail_silently=True  # Avoid breaking message sending if email fails
-                    )
-                    logger.debug(f"Sent notification email to {recipient.user.email}")
-                except Exception as e:
-                    logger.error(f"Failed to send notification email to {recipient.user.email}: {str(e)}")
-            
+                deliver_message(message, recipients)
+
+                # Determine sender's role based on qualification
+                sender_role = "Admin" if user_business.user_type == 'admin' else "User"
+                if qualification:
+                    sender_role = request.roles.label_for(qualification.id, sender_role)
+                sender_name = user_business.user.full_name or user_business.user.email
+                enqueue_email_batch(send_message_notification_email, [
+                    {
+                        'recipient_email': recipient.user.email,
+                        'recipient_name': recipient.user.full_name or recipient.user.email,
+                        'sender_name': sender_name,
+                        'sender_role': sender_role,
+                        'business_name': business.name,
+                        'message_subject': message.subject,
+                        'message_sent_at': message.sent_at,
+                    } for recipient in recipients
+                ])
+            logger.debug(f"Queued notification emails for {len(recipients)} recipients")
+
             messages.success(request, "Message sent successfully.")
             return redirect('qualifications:inbox')
         else:
@@ -4549,54 +4373,42 @@ def compose_message_view(request):
 
 @login_required
 def message_thread_view(request, thread_id):
-    try:
-        user_business = UserBusiness.objects.get(
-            user=request.user,
-            business__business_id=request.session.get('business_id')
-        )
-        business_id = request.session.get('business_id')
-        if not business_id:
-            messages.error(request, "Business ID not found in session.")
-            return redirect('login')
-    except UserBusiness.DoesNotExist:
+    business_id = request.session.get('business_id')
+    if not business_id:
+        messages.error(request, "Business ID not found in session.")
+        return redirect('login')
+    user_business = request.user_business
+    if user_business is None:
         messages.error(request, "You are not authorized to view messages.")
         return redirect('login')
 
-    # Step 1: Get the message using thread_id
-    main_message = get_object_or_404(Message, id=thread_id)
-
-    # Step 2: Use the subject to fetch the whole thread
-    messages_query = Message.objects.filter(
-        subject=main_message.subject
-    ).filter(
-        Q(sender=user_business) | Q(recipients__recipient=user_business)
-    ).prefetch_related('recipients').distinct().order_by('sent_at')
-
-
-    if not messages_query.exists():
+    thread = participant_thread(user_business, thread_id)
+    if thread is None:
+        # Links sent before threads existed point at a message id
+        message = Message.objects.filter(id=thread_id, thread__isnull=False).only('thread_id').first()
+        if message and participant_thread(user_business, message.thread_id):
+            return redirect('qualifications:message_thread', thread_id=message.thread_id)
         messages.error(request, "Message thread not found.")
         return redirect('qualifications:inbox')
 
-    # Step 3: Mark all messages in thread as read for this user
-    MessageRecipient.objects.filter(
-        message__subject=main_message.subject,
-        recipient=user_business,
-        is_read=False
-    ).update(is_read=True, read_at=timezone.now())
+    thread_messages = list(thread.messages.filter(
+        Q(sender=user_business) | Q(recipients__recipient=user_business)
+    ).select_related('sender__user', 'qualification').prefetch_related(
+        Prefetch('recipients', queryset=MessageRecipient.objects.select_related('recipient__user'))
+    ).distinct().order_by('sent_at'))
 
-    unread_count = MessageRecipient.objects.filter(
-        recipient=user_business,
-        is_read=False
-    ).count()
+    mark_thread_read(thread, user_business, timezone.now())
+    unread_count = unread_message_count(user_business)
 
     return render(request, 'message_thread.html', {
-        'messages': messages_query,
-        'subject': main_message.subject,  # display subject
+        'messages': thread_messages,
+        'thread': thread,
+        'subject': thread.subject,
         'user_business': user_business,
         'full_name': user_business.user.full_name or request.user.email,
         'unread_count': unread_count,
         'business_id': business_id,
-        'last_message': messages_query.last()
+        'last_message': thread_messages[-1] if thread_messages else None
     })
 
 
@@ -4613,9 +4425,7 @@ def mark_message_read_view(request):
                 is_read=False
             ).first()
             if recipient:
-                recipient.is_read = True
-                recipient.read_at = timezone.now()
-                recipient.save()
+                mark_recipient_read(recipient, timezone.now())
             return JsonResponse({'success': True})
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
@@ -4643,113 +4453,12 @@ def get_recipients_by_qualification(request):
             logger.error(f"Qualification {qualification_id} not found for business {business.business_id}")
             return JsonResponse({'error': 'Qualification not found'}, status=404)
 
-        recipients = []
-        if user_business.user_type == 'admin':
-            # Admins see all learners, assessors, IQAs, and EQAs
-            assessors = UserBusiness.objects.filter(
-                assessor_assignments__qualification_id=qualification_id,
-                business=business
-            ).distinct()
-            learners = UserBusiness.objects.filter(
-                learner_assignments__qualification_id=qualification_id,
-                business=business
-            ).distinct()
-            iqas = UserBusiness.objects.filter(
-                iqa_assignments__qualification_id=qualification_id,
-                business=business
-            ).distinct()
-            eqas = UserBusiness.objects.filter(
-                eqa_assignments__qualification_id=qualification_id,
-                business=business
-            ).distinct()
-            recipients = list(assessors) + list(learners) + list(iqas) + list(eqas)
-            recipients = [r for r in recipients if r.id != user_business.id]
-            logger.debug(f"Admin recipients - Assessors: {assessors.count()}, Learners: {learners.count()}, IQAs: {iqas.count()}, EQAs: {eqas.count()}")
-        elif EQA.objects.filter(user=user_business, qualification_id=qualification_id).exists():
-            # EQAs only see admin users
-            recipients = list(UserBusiness.objects.filter(
-                user_type='admin',
-                business=business
-            ).distinct())
-            logger.debug(f"EQA recipients - Admins: {len(recipients)}")
-        elif IQA.objects.filter(user=user_business, qualification_id=qualification_id).exists():
-            # IQAs see assigned learners, their assessors, and admins
-            learners = UserBusiness.objects.filter(
-                learner_assignments__qualification_id=qualification_id,
-                learner_assignments__iqa=user_business,
-                business=business
-            ).distinct()
-            learner_ids = Learner.objects.filter(
-                qualification_id=qualification_id,
-                iqa=user_business,
-                user__business=business,
-                assessor__isnull=False
-            ).values_list('assessor__id', flat=True).distinct()
-            assessors = UserBusiness.objects.filter(
-                id__in=learner_ids,
-                business=business
-            ).distinct()
-            admins = UserBusiness.objects.filter(
-                user_type='admin',
-                business=business
-            ).distinct()
-            recipients = list(learners) + list(assessors) + list(admins)
-            logger.debug(f"IQA recipients - Learners: {learners.count()}, Assessors: {assessors.count()}, Admins: {admins.count()}")
-        elif Learner.objects.filter(user=user_business, qualification_id=qualification_id).exists():
-            # Learners see their assigned assessor and admins
-            learner = Learner.objects.get(user=user_business, qualification_id=qualification_id)
-            recipients = []
-            if learner.assessor:
-                recipients.append(learner.assessor)
-            else:
-                logger.warning(f"No assessor assigned to learner {user_business.user.email} for qualification {qualification_id}")
-            if learner.iqa:
-                recipients.append(learner.iqa)
-            else:
-                logger.warning(f"No IQA assigned to learner {user_business.user.email} for qualification {qualification_id}")
-            admins = UserBusiness.objects.filter(
-                user_type='admin',
-                business=business
-            ).distinct()
-            recipients.extend(admins)
-            logger.debug(f"Learner recipients - Assessor: {1 if learner.assessor else 0}, IQA: {1 if learner.iqa else 0}, Admins: {admins.count()}")
-        elif Assessor.objects.filter(user=user_business, qualification_id=qualification_id).exists():
-            # Assessors see assigned learners, their IQAs, and admins
-            learners = UserBusiness.objects.filter(
-                learner_assignments__assessor=user_business,
-                learner_assignments__qualification_id=qualification_id,
-                business=business
-            ).distinct()
-            learner_ids = Learner.objects.filter(
-                qualification_id=qualification_id,
-                assessor=user_business,
-                user__business=business,
-                iqa__isnull=False
-            ).values_list('iqa__id', flat=True).distinct()
-            iqas = UserBusiness.objects.filter(
-                id__in=learner_ids,
-                business=business
-            ).distinct()
-            admins = UserBusiness.objects.filter(
-                user_type='admin',
-                business=business
-            ).distinct()
-            recipients = list(learners) + list(iqas) + list(admins)
-            logger.debug(f"Assessor recipients - Learners: {learners.count()}, IQAs: {iqas.count()}, Admins: {admins.count()}")
-
         recipient_data = [
             {
                 'id': str(r.id),
                 'name': r.user.full_name or r.user.email,
-                'role': (
-                    "Admin" if r.user_type == 'admin' else
-                    "Learner" if Learner.objects.filter(user=r, qualification_id=qualification_id).exists() else
-                    "Assessor" if Assessor.objects.filter(user=r, qualification_id=qualification_id).exists() else
-                    "IQA" if IQA.objects.filter(user=r, qualification_id=qualification_id).exists() else
-                    "EQA" if EQA.objects.filter(user=r, qualification_id=qualification_id).exists() else
-                    "User"
-                )
-            } for r in recipients
+                'role': r.role_label
+            } for r in recipients_for_qualification(user_business, qualification.id, request.roles)
         ]
         logger.debug(f"Final recipients count: {len(recipient_data)}")
         if not recipient_data:
@@ -4762,27 +4471,3 @@ def get_recipients_by_qualification(request):
     except Exception as e:
         logger.error(f"Error in get_recipients_by_qualification: {str(e)}\n{traceback.format_exc()}")
         return JsonResponse({'error': f'Failed to load recipients: {str(e)}'}, status=500)
-    
-def user_context(request):
-    context = {
-        'full_name': '',
-        'business': None,
-        'unread_count': 0,
-    }
-    
-    if request.user.is_authenticated and not isinstance(request.user, AnonymousUser):
-        context['full_name'] = request.user.full_name or request.user.email
-        business_id = request.session.get('business_id')
-        if business_id:
-            try:
-                user_business = UserBusiness.objects.get(user=request.user, business__business_id=business_id)
-                context['business'] = user_business.business
-                context['unread_count'] = MessageRecipient.objects.filter(
-                    recipient=user_business,
-                    is_read=False,
-                    message__recipients__recipient__business__business_id=business_id
-                ).count()
-            except UserBusiness.DoesNotExist:
-                pass
-    
-    return context
\ No newline at end of file
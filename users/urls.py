@@ -22,6 +22,7 @@ urlpatterns = [
     path('add_logo/', views.add_logo_view, name='add_logo'),
     path('password-reset-redirect/<str:uidb64>/<str:token>/', views.password_reset_redirect, name='password_reset_redirect'),
     path('superadmin/assign/<uuid:qual_id>/', views.assign_qualification, name='assign_qualification'),
+    path('superadmin/assign/jobs/<uuid:job_id>/', views.qualification_copy_job, name='qualification_copy_job'),
     path('superadmin/dashboard/', views.superadmin_qualifications_dashboard, name='superadmin_qualifications_dashboard'),
     path('main/', views.main_page, name='main_page'),
     path('select_business/', views.select_business, name='select_business'),
@@ -17,7 +17,6 @@ from django.contrib.auth.decorators import login_required
 from django.utils.encoding import force_bytes, force_str
 from django.template.loader import render_to_string
 from django.template import TemplateDoesNotExist
-from email.mime.image import MIMEImage
 from django.http import JsonResponse
 import os
 from rest_framework_simplejwt.views import TokenObtainPairView
@@ -26,8 +25,11 @@ from django.contrib.auth import logout
 from qualifications.models import Learner, Assessor, IQA, EQA  # Added imports
 from django.utils import timezone
 from django.contrib.postgres.aggregates import StringAgg
-from qualifications.models import Learner, Qual, AC, EvidenceSubmission, MessageRecipient
-from AssessEEZ.email_utils import send_welcome_email
+from qualifications.models import Learner, Qual, QualificationCopyJob
+from qualifications.copy_jobs import start_copy_job
+from qualifications.progress import learner_progress_map
+from qualifications.messaging import unread_message_count
+from AssessEEZ.email_utils import compose, send_welcome_email
 import logging
 from django.contrib.auth.decorators import user_passes_test
 from django import forms
@@ -71,8 +73,6 @@ def forgot_password_view(request):
     return render(request, 'forgot_password.html', {'form': form})
 
 def send_reset_password_email(user_email, reset_link, business_id=None, business_name=None):
-    subject = 'Password Reset Request'
-    from_email = settings.DEFAULT_FROM_EMAIL
     recipient_list = [user_email]
 
     business_id = business_id if business_id is not None else 'N/A'
@@ -81,12 +81,12 @@ def send_reset_password_email(user_email, reset_link, business_id=None, business
     logger.debug(f"Context for email: user_email={user_email}, business_id={business_id}, business_name={business_name}")
 
     try:
-        html_message = render_to_string('password_reset_email.html', {
+        email = compose('password_reset', {
             'user': CustomUser.objects.get(email=user_email),
             'redirect_url': reset_link,
             'business_id': business_id,
             'business_name': business_name,
-        })
+        }, recipient_list)
     except TemplateDoesNotExist as e:
         logger.error(f"Template error: Template 'password_reset_email.html' not found - {str(e)}")
         raise
@@ -94,29 +94,6 @@ def send_reset_password_email(user_email, reset_link, business_id=None, business
         logger.error(f"Template rendering error: {str(e)}")
         raise
 
-    message = f'Hello,\n\nYou have requested a password reset for your {business_name} account. Click the link below to reset your password:\n{reset_link}\n\nIf you didn\'t request this, please ignore this email.\n\nBest regards,\nAssessEEZ Team'
-
-    email = EmailMessage(
-        subject=subject,
-        body=message,
-        from_email=from_email,
-        to=recipient_list,
-    )
-    email.content_subtype = 'html'
-    email.body = html_message
-
-    logo_path = os.path.join(settings.BASE_DIR, 'static', 'images', 'assesseez_logo.png')
-    logger.debug(f"Attempting to attach logo from: {logo_path}")
-    try:
-        with open(logo_path, 'rb') as f:
-            logo_data = f.read()
-        logo = MIMEImage(logo_data)
-        logo.add_header('Content-ID', '<assesseez_logo>')
-        logo.add_header('Content-Disposition', 'inline', filename='assesseez_logo.png')
-        email.attach(logo)
-    except FileNotFoundError as e:
-        logger.error(f"Logo file not found at {logo_path}: {str(e)}")
-
     try:
         result = email.send(fail_silently=False)
         logger.info(f"Password reset email sent to {user_email}: {result}")
@@ -272,15 +249,12 @@ def admin_dashboard(request):
         is_active=True
     ).select_related('user__user', 'qualification', 'assessor__user', 'iqa__user')
 
+    learners = list(learners)
+    progress_map = learner_progress_map(learners)
+
     learner_data = []
     for learner in learners:
-        total_ac = AC.objects.filter(learning_outcome__unit__qualification=learner.qualification).count()
-        accepted_ac = EvidenceSubmission.objects.filter(
-            user=learner.user,
-            assessment_criterion__learning_outcome__unit__qualification=learner.qualification,
-            status='ACCEPTED'
-        ).count()
-        progress = (accepted_ac / total_ac * 100) if total_ac > 0 else 0
+        progress = progress_map[learner.id].percentage
 
         learner_data.append({
             'full_name': learner.user.user.full_name or learner.user.user.email,
@@ -294,11 +268,7 @@ def admin_dashboard(request):
             'created_at': learner.created_at.isoformat() if learner.created_at else '',
         })
 
-    unread_count = MessageRecipient.objects.filter(
-        recipient=user_business,
-        is_read=False,
-        message__recipients__recipient__business__business_id=business_id
-    ).count()
+    unread_count = unread_message_count(user_business)
 
     context = {
         'business': business,
@@ -653,29 +623,29 @@ def assign_qualification(request, qual_id):
     if request.method == 'POST':
         form = AssignQualificationForm(request.POST)
         if form.is_valid():
-            selected_businesses = form.cleaned_data['businesses']
+            selected_businesses = list(form.cleaned_data['businesses'])
+            existing = set(Qual.objects.filter(
+                qualification_number=qualification.qualification_number,
+                business__in=selected_businesses
+            ).values_list('business_id', flat=True))
+            targets = []
             for business in selected_businesses:
-                if Qual.objects.filter(
-                    qualification_number=qualification.qualification_number,
-                    business=business
-                ).exists():
+                if business.business_id in existing:
                     messages.warning(
                         request,
                         f"Qualification '{qualification.qualification_title}' already exists for business {business.business_id}."
                     )
                     continue
-                try:
-                    qualification.copy_to_business(business)
-                    messages.success(
-                        request,
-                        f"Qualification '{qualification.qualification_title}' assigned to business {business.business_id}."
-                    )
-                except Exception as e:
-                    messages.error(
-                        request,
-                        f"Failed to assign qualification to {business.business_id}: {str(e)}"
-                    )
-            return redirect('users:superadmin_qualifications_dashboard')
+                targets.append(business)
+            if not targets:
+                return redirect('users:superadmin_qualifications_dashboard')
+            # Large qualifications into many businesses take a while; copy them off the request
+            job = start_copy_job(qualification, targets, requested_by=request.user)
+            messages.success(
+                request,
+                f"Assigning qualification '{qualification.qualification_title}' to {len(targets)} business(es)."
+            )
+            return redirect('users:qualification_copy_job', job_id=job.id)
     else:
         form = AssignQualificationForm()
     return render(request, 'assign_qualification.html', {
@@ -683,6 +653,26 @@ def assign_qualification(request, qual_id):
         'form': form
     })
 
+
+@user_passes_test(is_superuser)
+def qualification_copy_job(request, job_id):
+    """
+    Progress of a background qualification assignment; as JSON with ?format=json.
+    """
+    job = get_object_or_404(QualificationCopyJob.objects.select_related('qualification'), id=job_id)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'status': job.status,
+            'completed': job.completed,
+            'total': job.total,
+            'copied_to': job.copied_to,
+            'error': job.last_error,
+        })
+    return render(request, 'qualification_copy_job.html', {
+        'job': job,
+        'businesses': job.businesses.order_by('business_id'),
+    })
+
 class QualificationSearchForm(forms.Form):
     query = forms.CharField(
         max_length=100,